@@ -0,0 +1,200 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Resultados de un request, tal como los reporta el fetcher
+OUTCOME_OK = "ok"
+OUTCOME_THROTTLED = "throttled"  # 429
+OUTCOME_SERVER_ERROR = "server_error"  # 5xx
+OUTCOME_TIMEOUT = "timeout"  # timeout o error de conexión
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+class AdaptiveConcurrency:
+    """
+    Controlador AIMD del número de requests en vuelo:
+    - cada `window` requests mira el p95 de latencia y la tasa de 429/5xx/timeouts,
+    - si el servidor va bien, sube el límite en +increase (aumento aditivo),
+    - si se degrada, lo multiplica por `decrease` (reducción multiplicativa),
+    - ante un 429 o varios errores seguidos, pausa a todos los workers
+      (backoff global, respetando Retry-After si viene).
+
+    Las decisiones se imprimen y, si hay log_path, se agregan como JSON por
+    línea. Se escriben fuera del lock y sin propagar errores de I/O: el log
+    nunca hace fallar (ni frena) un request.
+    """
+
+    def __init__(
+        self,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        initial: int | None = None,
+        window: int = 20,
+        target_p95: float = 2.0,
+        max_error_rate: float = 0.05,
+        increase: int = 1,
+        decrease: float = 0.5,
+        pause_seconds: float = 5.0,
+        log_path: str | None = None,
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = min(self.max_limit, max(self.min_limit, initial or self.min_limit))
+        self.window = window
+        self.target_p95 = target_p95
+        self.max_error_rate = max_error_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.pause_seconds = pause_seconds
+        self.log_path = log_path
+        if log_path and os.path.dirname(log_path):
+            try:
+                os.makedirs(os.path.dirname(log_path), exist_ok=True)
+            except OSError as e:
+                self._disable_log(e)
+
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._latencies: deque = deque(maxlen=window)
+        self._outcomes: deque = deque(maxlen=window)
+        self._since_decision = 0
+        self._decisions: list = []  # registradas bajo el lock, se escriben al salir
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        """
+        Espera un cupo dentro del límite actual (y a que termine una pausa global).
+        """
+        with self._cond:
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                if self._in_flight < self.limit:
+                    self._in_flight += 1
+                    return
+                self._cond.wait()
+
+    def release(self, latency: float, outcome: str, retry_after: float | None = None) -> None:
+        """
+        Libera el cupo y registra la latencia y el resultado del request.
+        """
+        with self._cond:
+            self._in_flight -= 1
+            self._latencies.append(latency)
+            self._outcomes.append(outcome)
+            self._since_decision += 1
+
+            if outcome == OUTCOME_THROTTLED:
+                # El servidor pidió bajar el ritmo: reducción inmediata + pausa global
+                # (una sola reducción por ráfaga de 429, el resto solo extiende la pausa)
+                pause = retry_after or self.pause_seconds
+                if time.monotonic() - self._last_decrease < pause:
+                    self._paused_until = max(self._paused_until, time.monotonic() + pause)
+                else:
+                    self._decrease("429", pause=pause)
+            elif self._since_decision >= self.window:
+                self._decide()
+            self._cond.notify_all()
+            decisions, self._decisions = self._decisions, []
+        for record in decisions:
+            self._write_log(record)
+
+    def slot(self):
+        """
+        Context manager: `with controller.slot() as s: ...; s.outcome = ...`.
+        """
+        return _Slot(self)
+
+    def _error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        errors = sum(1 for o in self._outcomes if o != OUTCOME_OK)
+        return errors / len(self._outcomes)
+
+    def _decide(self) -> None:
+        p95 = percentile(self._latencies, 95)
+        error_rate = self._error_rate()
+        if error_rate > self.max_error_rate:
+            self._decrease("errores {:.0%}".format(error_rate), pause=self.pause_seconds)
+        elif p95 > self.target_p95:
+            self._decrease("p95 {:.2f}s".format(p95))
+        elif self.limit < self.max_limit:
+            old = self.limit
+            self.limit = min(self.max_limit, self.limit + self.increase)
+            self._log("aumento", old, p95, error_rate)
+        self._since_decision = 0
+
+    def _decrease(self, reason: str, pause: float = 0.0) -> None:
+        old = self.limit
+        self.limit = max(self.min_limit, int(self.limit * self.decrease))
+        now = time.monotonic()
+        if pause:
+            self._paused_until = max(self._paused_until, now + pause)
+        self._last_decrease = now
+        self._since_decision = 0
+        self._log("reducción ({})".format(reason), old, percentile(self._latencies, 95), self._error_rate(), pause)
+
+    def _log(self, action: str, old: int, p95: float, error_rate: float, pause: float = 0.0) -> None:
+        # Con el lock tomado: solo se arma el registro (ver _write_log)
+        self._decisions.append({
+            "ts": time.time(),
+            "action": action,
+            "from": old,
+            "to": self.limit,
+            "p50": percentile(self._latencies, 50),
+            "p95": p95,
+            "error_rate": error_rate,
+            "pause": pause,
+        })
+
+    def _write_log(self, record: dict) -> None:
+        print("[AIMD] {}: en vuelo {} → {} | p50={:.2f}s p95={:.2f}s errores={:.0%}{}".format(
+            record["action"],
+            record["from"],
+            record["to"],
+            record["p50"],
+            record["p95"],
+            record["error_rate"],
+            " | pausa global {:.1f}s".format(record["pause"]) if record["pause"] else "",
+        ))
+        log_path = self.log_path
+        if log_path:
+            try:
+                with open(log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+            except OSError as e:
+                self._disable_log(e)
+
+    def _disable_log(self, error: OSError) -> None:
+        print("⚠ No se pudo escribir el log AIMD {} ({}): se sigue sin log".format(self.log_path, error))
+        self.log_path = None
+
+
+class _Slot:
+    def __init__(self, controller: AdaptiveConcurrency):
+        self.controller = controller
+        self.outcome = OUTCOME_OK
+        self.retry_after = None
+
+    def __enter__(self):
+        self.controller.acquire()
+        self._start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self.outcome == OUTCOME_OK:
+            self.outcome = OUTCOME_TIMEOUT
+        self.controller.release(time.monotonic() - self._start, self.outcome, self.retry_after)
+        return False
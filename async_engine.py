@@ -0,0 +1,233 @@
+import asyncio
+import os
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+try:
+    import aiohttp
+except ImportError:  # el motor async es opcional
+    aiohttp = None
+
+from http_cache import CACHE_MISS
+from http_session import DEFAULT_HEADERS, RETRY_STATUSES, parse_retry_after
+from metrics import STAGE_FETCH, get_metrics
+from proyectoMPlvl2 import build_price_row, record_parse_timings, timed_parse_product_prices
+from rate_limiter import TokenBucket
+from streaming_upsert import UNCHANGED
+
+
+class AsyncProductFetcher:
+    """
+    Descarga fichas de producto sobre un único event loop:
+    - semáforo para limitar requests en vuelo,
+    - token bucket global de requests/segundo,
+    - reintentos con backoff con jitter (respeta Retry-After),
+    - contadores por código de estado.
+    """
+
+    def __init__(
+        self,
+        session,
+        concurrency: int = 200,
+        requests_per_second: float = 20.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        timeout: float = 15,
+    ):
+        self.session = session
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(requests_per_second)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.counts: Counter = Counter()
+
+    async def get(self, url: str, headers: dict | None = None):
+        """
+        Retorna (status, cuerpo, headers, charset). El cuerpo (bytes) es None
+        si la respuesta no fue 200; charset es el del Content-Type (o None).
+        Relanza el último error de red si se agotan los reintentos.
+        """
+        last_exc = None
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            await self.bucket.acquire_async()
+            try:
+                async with self.semaphore:
+                    async with self.session.get(url, headers=headers, timeout=self.timeout) as resp:
+                        self.counts[resp.status] += 1
+                        if resp.status == 200:
+                            return resp.status, await resp.read(), resp.headers, resp.charset
+                        if resp.status not in RETRY_STATUSES or attempt == self.max_retries:
+                            return resp.status, None, resp.headers, resp.charset
+                        retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                        last_exc = None
+            except asyncio.TimeoutError as e:
+                self.counts["timeout"] += 1
+                last_exc = e
+            except aiohttp.ClientError as e:
+                self.counts["connection_error"] += 1
+                last_exc = e
+
+            if attempt == self.max_retries:
+                break
+            self.counts["retry"] += 1
+            if retry_after is None:
+                retry_after = random.uniform(
+                    0, min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                )
+            await asyncio.sleep(min(self.backoff_max, retry_after))
+
+        raise last_exc
+
+
+async def _process_row(row, fetcher, loop, parse_pool, cache, history, total_count):
+    """
+    Versión async de process_one_product: retorna la fila para
+    cm_precios_minimos, UNCHANGED (ficha sin cambios) o None (error o sin
+    precios).
+    """
+    producto_id_csv = row.get("id_producto")
+    print("[{}/{}] ID: {} | {}...".format(
+        row.get("_index", 0), total_count, producto_id_csv,
+        row.get("nombre_producto", "")[:30],
+    ))
+    link = row.get("link_producto", "")
+    metrics = get_metrics()
+    try:
+        headers = cache.conditional_headers(link) if cache is not None else None
+        with metrics.time(STAGE_FETCH):
+            status, body, resp_headers, charset = await fetcher.get(link, headers=headers)
+        # El hash del cuerpo y la escritura de la caché van a un hilo: en el
+        # event loop frenarían todas las descargas en vuelo
+        if cache is not None and status in (200, 304):
+            if await loop.run_in_executor(None, cache.check, link, status, body) != CACHE_MISS:
+                print(" = Sin cambios para ID {} (caché)".format(producto_id_csv))
+                metrics.count("sin_cambios")
+                if history is not None:
+                    history.record(producto_id_csv, None)
+                return UNCHANGED
+        if body is None:
+            print(" ⚠ Error HTTP {} para ID {}".format(status, producto_id_csv))
+            metrics.count("error_http")
+            return None
+        # El parseo (regex/JSON) va a un pool para no frenar el event loop;
+        # los tiempos de extracción y cálculo vuelven con el resultado
+        html = body.decode(charset or "utf-8", errors="replace")
+        precios_region, extract_s, compute_s = await loop.run_in_executor(
+            parse_pool, timed_parse_product_prices, html
+        )
+        del html
+        record_parse_timings(metrics, extract_s, compute_s)
+        row_data = build_price_row(row, precios_region)
+        metrics.count("con_precio" if row_data is not None else "sin_precio")
+        if row_data is not None:
+            if cache is not None:
+                await loop.run_in_executor(None, partial(
+                    cache.put,
+                    link,
+                    body,
+                    etag=resp_headers.get("ETag"),
+                    last_modified=resp_headers.get("Last-Modified"),
+                ))
+            if history is not None:
+                history.record(producto_id_csv, row_data["precio_minimo_global"])
+        return row_data
+    except Exception as e:
+        print(" ✗ Error procesando ID {}: {}".format(producto_id_csv, e))
+        metrics.count("error")
+        return None
+
+
+async def _process_rows(rows, total_count, sink, concurrency, requests_per_second, parse_pool, cache, history, deadline):
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency)
+    async with aiohttp.ClientSession(headers=DEFAULT_HEADERS, connector=connector) as session:
+        fetcher = AsyncProductFetcher(
+            session,
+            concurrency=concurrency,
+            requests_per_second=requests_per_second,
+        )
+
+        async def worker():
+            while True:
+                row = await queue.get()
+                try:
+                    if row is None:
+                        return
+                    row_data = await _process_row(
+                        row, fetcher, loop, parse_pool, cache, history, total_count
+                    )
+                    # El sink puede hacer un upsert bloqueante: fuera del event loop
+                    await loop.run_in_executor(None, sink.add, row.get("id_producto"), row_data)
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        # rows puede ser un generador que consulta Supabase por páginas
+        # (iter_productos): se avanza en un hilo propio para no bloquear el
+        # event loop ni competir con los upserts del sink por el executor
+        row_iter = iter(rows)
+        with ThreadPoolExecutor(max_workers=1) as producer:
+            submitted = 0
+            while True:
+                if deadline is not None and time.monotonic() >= deadline:
+                    print("⏱ Presupuesto de tiempo agotado: {} productos quedan para la próxima corrida".format(
+                        total_count - submitted
+                    ))
+                    break
+                row = await loop.run_in_executor(producer, next, row_iter, None)
+                if row is None:
+                    break
+                sink.submitted(row.get("id_producto"))
+                await queue.put(row)
+                submitted += 1
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+
+    return dict(fetcher.counts)
+
+
+def run_async_engine(
+    rows,
+    total_count,
+    sink,
+    concurrency=200,
+    requests_per_second=20.0,
+    parse_workers=None,
+    cache=None,
+    history=None,
+    deadline=None,
+):
+    """
+    Motor alternativo para process_products_with_prices: cientos de fichas
+    en vuelo sobre un solo event loop, con el parseo en un ProcessPoolExecutor.
+    Cada resultado pasa al `sink` (BatchUpserter) apenas termina.
+    Retorna los contadores HTTP.
+    """
+    if aiohttp is None:
+        raise RuntimeError("El motor async requiere aiohttp (pip install aiohttp).")
+
+    parse_workers = parse_workers or os.cpu_count() or 1
+    start = time.monotonic()
+    with ProcessPoolExecutor(max_workers=parse_workers) as parse_pool:
+        counts = asyncio.run(
+            _process_rows(
+                rows, total_count, sink, concurrency, requests_per_second, parse_pool,
+                cache, history, deadline,
+            )
+        )
+    elapsed = time.monotonic() - start
+    if elapsed > 0 and total_count:
+        print("✓ Motor async: {} productos en {:.1f}s ({:.2f} productos/s)".format(
+            total_count, elapsed, total_count / elapsed
+        ))
+    return counts
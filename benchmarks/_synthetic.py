@@ -0,0 +1,94 @@
+import json
+import random
+
+REGIONES = [
+    "Región de Arica y Parinacota",
+    "Región de Tarapacá",
+    "Región de Antofagasta",
+    "Región de Atacama",
+    "Región de Coquimbo",
+    "Región de Valparaíso",
+    "Región Metropolitana de Santiago",
+    "Región del Libertador General Bernardo O'Higgins",
+    "Región del Maule",
+    "Región de Ñuble",
+    "Región del Biobío",
+    "Región de La Araucanía",
+    "Región de Los Ríos",
+    "Región de Los Lagos",
+    "Región de Aysén del General Carlos Ibáñez del Campo",
+    "Región de Magallanes y de la Antártica Chilena",
+]
+
+
+def make_product_page(product_id="1000", n_providers=50, n_regions=16, seed=0, padding_kb=200):
+    """
+    Genera una ficha de producto sintética con la misma forma que las reales:
+    region_names, productId, jsonResult y offerPrices embebidos en un <script>.
+    """
+    rnd = random.Random(seed)
+    region_ids = [str(i + 1) for i in range(n_regions)]
+    region_names = {rid: REGIONES[i % len(REGIONES)] for i, rid in enumerate(region_ids)}
+
+    json_result = {}
+    offer_prices = {}
+    for rid in region_ids:
+        providers = {}
+        for p in range(n_providers):
+            pid = str(5000 + p)
+            price = rnd.randint(1000, 90000)
+            providers[pid] = {"price": "{:,}.00".format(price), "seller": "Proveedor {}".format(pid)}
+            if rnd.random() < 0.2:
+                offer_prices.setdefault(pid, {}).setdefault(product_id, {})[rid] = {
+                    "special_price": "{:,}.00".format(int(price * 0.9))
+                }
+        json_result[rid] = providers
+
+    config = {
+        "productId": product_id,
+        "region_names": region_names,
+        "jsonResult": json_result,
+        "offerPrices": offer_prices,
+    }
+    filler = "<div class=\"filler\">{}</div>\n".format("x" * 1000) * padding_kb
+    return (
+        "<html><head><title>Producto {pid}</title></head><body>\n{filler}"
+        "<script type=\"text/x-magento-init\">{cfg}</script>\n{filler}</body></html>"
+    ).format(pid=product_id, filler=filler, cfg=json.dumps(config, ensure_ascii=False))
+
+
+def make_listing_page(page_num=1, per_page=25, total=5000, seed=0):
+    """
+    Genera una página de listado sintética con la estructura del sitio:
+    toolbar con el total y <li class="item product product-item"> por producto.
+    """
+    rnd = random.Random(seed + page_num)
+    items = []
+    for i in range(per_page):
+        pid = 1000000 + (page_num - 1) * per_page + i
+        items.append(
+            '<li class="item product product-item">\n'
+            '  <div class="product-item-info">\n'
+            '    <div class="product-id-top"> ID {pid} </div>\n'
+            '    <strong class="product name product-item-name">\n'
+            '      <a class="product-item-link" href="https://conveniomarco2.mercadopublico.cl/alimentos2/p-{pid}.html">\n'
+            '        Producto &amp; alimento {pid} <span>1 kg</span>\n'
+            '      </a>\n'
+            '    </strong>\n'
+            '    <div class="sellers-count"><span>{sellers}</span> proveedores</div>\n'
+            '    <div class="price-box"><span class="price">$ {price}</span></div>\n'
+            '  </div>\n'
+            '</li>'.format(pid=pid, sellers=rnd.randint(1, 120), price=rnd.randint(1000, 90000))
+        )
+    return (
+        "<!doctype html><html><head><meta charset=\"utf-8\"><title>Alimentos</title></head><body>"
+        "<div class=\"toolbar\"><p class=\"toolbar-amount\">Items "
+        "<span class=\"toolbar-number\">{first}</span>-<span class=\"toolbar-number\">{total}</span>"
+        "</p></div>\n<ol class=\"products list items product-items\">\n{items}\n</ol>"
+        "<footer>{filler}</footer></body></html>"
+    ).format(
+        first=(page_num - 1) * per_page + 1,
+        total=total,
+        items="\n".join(items),
+        filler="<div class=\"menu\"><a href=\"#\">enlace</a></div>" * 400,
+    )
@@ -0,0 +1,178 @@
+"""
+Benchmark de carga a cm_precios_minimos: filas/segundo de cada modo.
+
+- rest: upsert REST secuencial en chunks fijos (como siempre),
+- bulk: upsert REST en paralelo con chunks auto-ajustados,
+- copy: COPY a tabla temporal + INSERT ... ON CONFLICT (solo con --db-url).
+
+Con --db-url los modos REST también escriben en ese Postgres, emulando lo que
+hace PostgREST con cada request (INSERT ... SELECT FROM
+json_populate_recordset(...) ON CONFLICT DO UPDATE, un round-trip por lote).
+Sin --db-url usan el Supabase falso con latencia simulada.
+
+Uso:
+    python -m benchmarks.bench_bulk_load --rows 50000 --db-url postgresql://localhost/cm
+    python -m benchmarks.bench_bulk_load --rows 20000 --write-latency 0.15
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import threading
+import time
+
+from benchmarks._synthetic import REGIONES
+from benchmarks.fake_supabase import FakeResponse, FakeSupabase
+from bulk_loader import ConcurrentRestLoader, PostgresCopyLoader, RestLoader
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), os.pardir, "sql", "esquema_local.sql")
+
+
+def make_price_rows(n, seed=0):
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n):
+        precios = {region: rnd.randint(1000, 90000) for region in rnd.sample(REGIONES, rnd.randint(1, len(REGIONES)))}
+        mejor = min(precios, key=precios.get)
+        rows.append({
+            "id_producto": str(1000000 + i),
+            "nombre_producto": "Producto {} alimento".format(i),
+            "numero_proveedores": rnd.randint(1, 120),
+            "link_producto": "https://conveniomarco2.mercadopublico.cl/alimentos2/p-{}.html".format(1000000 + i),
+            "precio_minimo_global": precios[mejor],
+            "region_mejor_precio": mejor,
+            "precios_region": precios,
+        })
+    return rows
+
+
+class PostgresRestEmulator:
+    """
+    Cliente con la interfaz de supabase-py (table().upsert().execute()) que
+    ejecuta cada lote como lo haría PostgREST: el lote viaja como un JSON y
+    se inserta con json_populate_recordset + ON CONFLICT DO UPDATE.
+    Una conexión por thread.
+    """
+
+    def __init__(self, db_url, write_latency=0.0):
+        import psycopg
+
+        self._psycopg = psycopg
+        self.db_url = db_url
+        self.write_latency = write_latency
+        self._local = threading.local()
+        self._conns = []
+        self._lock = threading.Lock()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._psycopg.connect(self.db_url, autocommit=True)
+            with self._lock:
+                self._conns.append(conn)
+        return conn
+
+    def table(self, name):
+        client = self
+
+        class _Upsert:
+            def upsert(self, rows, on_conflict="id"):
+                self._rows, self._key = rows, on_conflict
+                return self
+
+            def execute(self):
+                return client._upsert(name, self._rows, self._key)
+
+        return _Upsert()
+
+    def _upsert(self, table, rows, key):
+        from psycopg import sql
+
+        if self.write_latency:
+            time.sleep(self.write_latency)  # red hasta la API
+        columns = list(rows[0])
+        cols = sql.SQL(", ").join(map(sql.Identifier, columns))
+        updates = sql.SQL(", ").join(
+            sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(c)) for c in columns if c != key
+        )
+        statement = sql.SQL(
+            "INSERT INTO {t} ({cols}) SELECT {cols} FROM json_populate_recordset(NULL::{t}, %s) "
+            "ON CONFLICT ({key}) DO UPDATE SET {updates}"
+        ).format(t=sql.Identifier(table), cols=cols, key=sql.Identifier(key), updates=updates)
+        self._conn().execute(statement, (json.dumps(rows, ensure_ascii=False),))
+        return FakeResponse(rows)
+
+    def close(self):
+        with self._lock:
+            for conn in self._conns:
+                conn.close()
+
+
+def reset_table(db_url):
+    import psycopg
+
+    with psycopg.connect(db_url, autocommit=True) as conn:
+        with open(SCHEMA_PATH, encoding="utf-8") as f:
+            conn.execute(f.read())
+        conn.execute("TRUNCATE cm_precios_minimos")
+
+
+def run_mode(label, loader, rows, db_url):
+    if db_url:
+        reset_table(db_url)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Primera pasada inserta, la segunda actualiza (caso típico diario)
+        loader.write(rows)
+        loader.write(rows)
+    elapsed = time.perf_counter() - start
+    loader.close()
+    chunk = getattr(loader, "chunk_size", None)
+    return label, 2 * len(rows), elapsed, loader.requests, chunk
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--db-url", default=os.environ.get("CM_DB_URL"), help="Postgres local para medir de verdad")
+    parser.add_argument("--write-latency", type=float, default=0.1, help="latencia de red por request REST (s)")
+    parser.add_argument("--row-latency", type=float, default=0.00005, help="costo por fila del Supabase falso (s)")
+    parser.add_argument("--concurrency", type=int, default=4, help="lotes en paralelo del modo bulk")
+    args = parser.parse_args()
+
+    rows = make_price_rows(args.rows)
+    table = "cm_precios_minimos"
+
+    def client():
+        if args.db_url:
+            return PostgresRestEmulator(args.db_url, args.write_latency)
+        return FakeSupabase(write_latency=args.write_latency, row_latency=args.row_latency)
+
+    results = []
+    rest_client = client()
+    results.append(run_mode("rest (200/lote)", RestLoader(rest_client, table, chunk_size=200), rows, args.db_url))
+    bulk_client = client()
+    results.append(run_mode(
+        "bulk ({} en paralelo)".format(args.concurrency),
+        ConcurrentRestLoader(bulk_client, table, max_concurrency=args.concurrency),
+        rows,
+        args.db_url,
+    ))
+    for c in (rest_client, bulk_client):
+        if hasattr(c, "close"):
+            c.close()
+    if args.db_url:
+        results.append(run_mode("copy", PostgresCopyLoader(args.db_url, table), rows, args.db_url))
+
+    print("Filas: {} x 2 pasadas | destino: {}".format(args.rows, "Postgres local" if args.db_url else "Supabase falso"))
+    print("{:<24} {:>9} {:>10} {:>10} {:>12} {:>14}".format("modo", "filas", "segundos", "requests", "lote final", "filas/s"))
+    for label, n, elapsed, requests, chunk in results:
+        print("{:<24} {:>9} {:>10.2f} {:>10} {:>12} {:>14.0f}".format(
+            label, n, elapsed, requests, chunk if chunk is not None else "-", n / elapsed
+        ))
+
+
+if __name__ == "__main__":
+    main()
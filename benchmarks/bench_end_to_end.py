@@ -0,0 +1,301 @@
+"""
+Benchmark de punta a punta, sin red: corre proyectoMP.main (listado) y
+process_products_with_prices (fichas) contra un corpus grabado servido por
+benchmarks.replay, con un Supabase falso en memoria.
+
+Reporta por etapa: throughput, latencia p50/p95/p99 de los requests (tal como
+los ve el scraper, con reintentos), tiempo de CPU y pico de memoria (RSS).
+
+Grabar un corpus real (una vez, contra el sitio; las fichas se graban con el
+motor threads, que es el que usa HttpFetcher):
+    CM_RECORD_CORPUS=corpus.zip python proyectoMP.py
+    CM_RECORD_CORPUS=corpus.zip python proyectoMPlvl2.py
+
+Uso:
+    python -m benchmarks.bench_end_to_end --corpus corpus.zip --latency 0.3 --jitter 0.2
+    python -m benchmarks.bench_end_to_end --synthetic 500 --error-rate 0.02
+    python -m benchmarks.bench_end_to_end --synthetic 300 --listing-rps 2 --pipeline
+"""
+import argparse
+import contextlib
+import functools
+import io
+import os
+import resource
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+from adaptive_concurrency import percentile
+from benchmarks import replay
+from benchmarks._synthetic import make_listing_page, make_product_page
+from benchmarks.fake_supabase import FakeSupabase
+from corpus import CorpusWriter, request_key
+from metrics import get_metrics
+
+SITE_ORIGIN = "https://conveniomarco2.mercadopublico.cl"
+
+
+def build_synthetic_corpus(path, n_products, n_providers=30, padding_kb=50):
+    """
+    Corpus sintético con la forma del sitio: páginas del listado (25 por
+    página) y una ficha por producto.
+    """
+    import proyectoMP
+
+    per_page = 25
+    pages = (n_products + per_page - 1) // per_page
+    with CorpusWriter(path) as writer:
+        for page in range(1, pages + 1):
+            html = make_listing_page(page, per_page=per_page, total=n_products)
+            url = SITE_ORIGIN + request_key(proyectoMP.listing_url(page))
+            writer.record(url, 200, {"Content-Type": "text/html; charset=UTF-8"}, html.encode("utf-8"))
+            for i in range(per_page):
+                pid = 1000000 + (page - 1) * per_page + i
+                body = make_product_page(str(pid), n_providers=n_providers, seed=pid, padding_kb=padding_kb)
+                writer.record(
+                    "{}/alimentos2/p-{}.html".format(SITE_ORIGIN, pid),
+                    200,
+                    {"Content-Type": "text/html; charset=UTF-8"},
+                    body.encode("utf-8"),
+                )
+
+
+class LatencyProbe:
+    """
+    Mide la latencia de cada GET de los scrapers (HttpFetcher y el motor
+    async), envolviendo sus métodos get mientras está activo.
+    """
+
+    def __init__(self):
+        self.samples: list = []
+        self._lock = threading.Lock()
+        self._patched = []
+
+    def _add(self, elapsed):
+        with self._lock:
+            self.samples.append(elapsed)
+
+    def __enter__(self):
+        import http_session
+
+        original_get = http_session.HttpFetcher.get
+
+        @functools.wraps(original_get)
+        def timed_get(fetcher, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original_get(fetcher, *args, **kwargs)
+            finally:
+                self._add(time.perf_counter() - start)
+
+        self._patch(http_session.HttpFetcher, "get", timed_get)
+
+        try:
+            import async_engine
+        except ImportError:
+            return self
+        original_async_get = async_engine.AsyncProductFetcher.get
+
+        @functools.wraps(original_async_get)
+        async def timed_async_get(fetcher, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await original_async_get(fetcher, *args, **kwargs)
+            finally:
+                self._add(time.perf_counter() - start)
+
+        self._patch(async_engine.AsyncProductFetcher, "get", timed_async_get)
+        return self
+
+    def _patch(self, owner, name, value):
+        self._patched.append((owner, name, getattr(owner, name)))
+        setattr(owner, name, value)
+
+    def __exit__(self, *exc):
+        for owner, name, value in reversed(self._patched):
+            setattr(owner, name, value)
+        return False
+
+
+def _reset_peak_rss() -> bool:
+    # Linux: escribir "5" en clear_refs reinicia VmHWM (pico de RSS)
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _cpu_seconds() -> float:
+    # Incluye los procesos hijos ya terminados (el pool de parseo del motor async)
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def measure(label, units, fn, verbose=False):
+    """
+    Corre fn() y retorna sus métricas. `units` es una función que recibe el
+    resultado y retorna cuántas unidades (páginas, productos) se procesaron.
+    """
+    import http_session
+
+    http_session._fetcher = None  # cada etapa arma su propio pool
+    _reset_peak_rss()
+    cpu_start = _cpu_seconds()
+    start = time.perf_counter()
+    with LatencyProbe() as probe:
+        output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            result = fn()
+    elapsed = time.perf_counter() - start
+    count = units(result)
+    stage_metrics = get_metrics()
+    return {
+        "metricas": (stage_metrics, stage_metrics.snapshot()),
+        "etapa": label,
+        "unidades": count,
+        "segundos": elapsed,
+        "por_segundo": count / elapsed if elapsed > 0 else 0.0,
+        "requests": len(probe.samples),
+        "p50": percentile(probe.samples, 50),
+        "p95": percentile(probe.samples, 95),
+        "p99": percentile(probe.samples, 99),
+        "cpu": _cpu_seconds() - cpu_start,
+        "rss_mb": _peak_rss_mb(),
+    }
+
+
+def print_report(results):
+    header = "{:<10} {:>8} {:>9} {:>10} {:>9} {:>8} {:>8} {:>8} {:>8} {:>9}"
+    row = "{:<10} {:>8} {:>9.2f} {:>10.2f} {:>9} {:>8.3f} {:>8.3f} {:>8.3f} {:>8.2f} {:>9.1f}"
+    print(header.format("etapa", "unidades", "segundos", "unid/s", "requests",
+                        "p50 s", "p95 s", "p99 s", "CPU s", "RSS MB"))
+    for r in results:
+        print(row.format(r["etapa"], r["unidades"], r["segundos"], r["por_segundo"], r["requests"],
+                         r["p50"], r["p95"], r["p99"], r["cpu"], r["rss_mb"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", help="corpus .zip grabado con CM_RECORD_CORPUS")
+    parser.add_argument("--synthetic", type=int, default=300, help="productos del corpus sintético si no hay --corpus")
+    parser.add_argument("--latency", type=float, default=0.2, help="latencia fija por request (s)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="latencia extra aleatoria, 0..jitter (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fracción de 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fracción de 429")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fracción de conexiones cortadas")
+    parser.add_argument("--write-latency", type=float, default=0.05, help="latencia simulada de cada upsert (s)")
+    parser.add_argument("--listing-rps", type=float, default=1000.0, help="req/s del listado")
+    parser.add_argument("--listing-in-flight", type=int, default=8, help="páginas del listado en vuelo")
+    parser.add_argument("--engine", choices=["threads", "async"], default="threads")
+    parser.add_argument("--workers", type=int, default=8, help="threads del motor threads")
+    parser.add_argument("--async-concurrency", type=int, default=200)
+    parser.add_argument("--async-rps", type=float, default=1000.0)
+    parser.add_argument("--pipeline", action="store_true",
+                        help="medir también pipeline.py (listado + fichas en una sola corrida)")
+    parser.add_argument("--compute-workers", type=int, default=2, help="threads de cálculo de pipeline.py")
+    parser.add_argument("--verbose", action="store_true", help="mostrar la salida de los scrapers")
+    args = parser.parse_args()
+
+    import proyectoMP
+    import proyectoMPlvl2
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_path = args.corpus
+        if not corpus_path:
+            corpus_path = os.path.join(tmp, "corpus.zip")
+            with contextlib.redirect_stdout(io.StringIO()):
+                build_synthetic_corpus(corpus_path, args.synthetic)
+
+        process, origin = replay.start_in_subprocess(
+            corpus_path,
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            throttle_rate=args.throttle_rate,
+            drop_rate=args.drop_rate,
+            retry_after=0.5,
+        )
+        try:
+            supabase = FakeSupabase(write_latency=args.write_latency)
+            proyectoMP.get_supabase_client = lambda: supabase
+            proyectoMPlvl2.get_supabase_client = lambda: supabase
+            proyectoMP.base_url = origin + urlsplit(proyectoMP.base_url).path
+
+            print("Corpus: {} | servidor: {} | latencia {}s + 0..{}s | errores 503 {:.0%} 429 {:.0%} cortes {:.0%}".format(
+                args.corpus or "sintético ({} productos)".format(args.synthetic),
+                origin, args.latency, args.jitter, args.error_rate, args.throttle_rate, args.drop_rate,
+            ))
+
+            results = [
+                measure(
+                    "listado",
+                    lambda _: len(supabase.rows("cm_productos")),
+                    lambda: proyectoMP.main(args.listing_rps, args.listing_in_flight),
+                    args.verbose,
+                ),
+                measure(
+                    "fichas",
+                    lambda saved: saved,
+                    lambda: proyectoMPlvl2.process_products_with_prices(
+                        max_products=10 ** 9,
+                        max_workers=args.workers,
+                        engine=args.engine,
+                        async_concurrency=args.async_concurrency,
+                        async_rps=args.async_rps,
+                    ),
+                    args.verbose,
+                ),
+            ]
+            if args.pipeline:
+                import pipeline
+
+                pipeline_supabase = FakeSupabase(write_latency=args.write_latency)
+                pipeline.get_supabase_client = lambda: pipeline_supabase
+                results.append(measure(
+                    "pipeline",
+                    lambda saved: saved,
+                    lambda: pipeline.run_pipeline(
+                        listing_rps=args.listing_rps,
+                        listing_in_flight=args.listing_in_flight,
+                        detail_workers=args.workers,
+                        compute_workers=args.compute_workers,
+                        changed_ids_path=None,
+                    ),
+                    args.verbose,
+                ))
+        finally:
+            process.terminate()
+            process.join()
+
+    print_report(results)
+    for r in results:
+        stage_metrics, snapshot = r["metricas"]
+        stage_metrics.print_summary(snapshot)
+    print("Upserts: {} llamadas, {} filas (cm_productos: {}, cm_precios_minimos: {})".format(
+        supabase.upsert_calls,
+        supabase.rows_written,
+        len(supabase.rows("cm_productos")),
+        len(supabase.rows("cm_precios_minimos")),
+    ))
+
+
+if __name__ == "__main__":
+    main()
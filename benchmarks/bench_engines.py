@@ -0,0 +1,134 @@
+"""
+Benchmark lado a lado: motor de threads vs motor async de proyectoMPlvl2.
+
+Sirve un corpus de fichas guardadas (*.html) desde un servidor HTTP local con
+latencia simulada y mide productos/segundo de cada motor.
+
+Uso:
+    python -m benchmarks.bench_engines --corpus ruta/a/fichas --latency 0.3
+    python -m benchmarks.bench_engines --synthetic 300
+"""
+import argparse
+import contextlib
+import glob
+import io
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks._synthetic import make_product_page
+
+
+def load_corpus(corpus_dir, synthetic):
+    if corpus_dir:
+        pages = []
+        for path in sorted(glob.glob(os.path.join(corpus_dir, "*.html"))):
+            with open(path, "rb") as f:
+                pages.append(f.read())
+        return pages
+    return [
+        make_product_page(str(1000 + i), n_providers=30, seed=i, padding_kb=50).encode("utf-8")
+        for i in range(synthetic)
+    ]
+
+
+def start_server(pages, latency):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(latency)
+            try:
+                body = pages[int(self.path.rsplit("/", 1)[-1]) % len(pages)]
+            except ValueError:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    ThreadingHTTPServer.request_queue_size = 1024
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_rows(server, n):
+    host, port = server.server_address
+    return [
+        {
+            "_index": i + 1,
+            "id_producto": str(1000 + i),
+            "nombre_producto": "Producto {}".format(i),
+            "numero_proveedores": 10,
+            "link_producto": "http://{}:{}/producto/{}".format(host, port, i),
+        }
+        for i in range(n)
+    ]
+
+
+class CountingSink:
+    """
+    Sink en memoria con la interfaz de BatchUpserter (sin Supabase).
+    """
+
+    def __init__(self):
+        self.saved = 0
+
+    def submitted(self, id_producto):
+        pass
+
+    def add(self, id_producto, row_data):
+        if row_data is not None:
+            self.saved += 1
+
+
+def run(label, fn):
+    sink = CountingSink()
+    start = time.monotonic()
+    with contextlib.redirect_stdout(io.StringIO()):
+        stats = fn(sink)
+    elapsed = time.monotonic() - start
+    return label, sink.saved, elapsed, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", help="directorio con fichas guardadas (*.html)")
+    parser.add_argument("--synthetic", type=int, default=200, help="fichas sintéticas si no hay corpus")
+    parser.add_argument("--latency", type=float, default=0.3, help="latencia simulada por request (s)")
+    parser.add_argument("--workers", type=int, default=8, help="threads del motor threads")
+    parser.add_argument("--concurrency", type=int, default=200, help="requests en vuelo del motor async")
+    parser.add_argument("--rps", type=float, default=1000.0, help="límite de req/s del motor async")
+    args = parser.parse_args()
+
+    from async_engine import run_async_engine
+    from proyectoMPlvl2 import run_thread_engine
+
+    pages = load_corpus(args.corpus, args.synthetic)
+    server = start_server(pages, args.latency)
+    rows = make_rows(server, len(pages))
+    print("Corpus: {} fichas | latencia simulada: {}s".format(len(pages), args.latency))
+
+    results = [
+        run("threads ({} workers)".format(args.workers),
+            lambda sink: run_thread_engine(rows, len(rows), sink, args.workers)),
+        run("async ({} en vuelo)".format(args.concurrency),
+            lambda sink: run_async_engine(rows, len(rows), sink, args.concurrency, args.rps)),
+    ]
+    server.shutdown()
+
+    print("{:<24} {:>8} {:>10} {:>14}".format("motor", "ok", "segundos", "productos/s"))
+    for label, ok, elapsed, stats in results:
+        print("{:<24} {:>8} {:>10.2f} {:>14.2f}".format(label, ok, elapsed, len(rows) / elapsed))
+
+
+if __name__ == "__main__":
+    main()
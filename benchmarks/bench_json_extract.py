@@ -0,0 +1,124 @@
+"""
+Micro-benchmark del extractor de JSON embebido en fichas de producto.
+
+Compara, por página, el extractor original (cuatro búsquedas con bucle
+carácter a carácter + .replace) contra extract_json_objects (una pasada +
+json raw_decode), y verifica que ambos retornen lo mismo.
+
+Uso:
+    python -m benchmarks.bench_json_extract --corpus ruta/a/fichas
+    python -m benchmarks.bench_json_extract --synthetic 20
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+from benchmarks._synthetic import make_product_page
+
+
+def legacy_extract_json_object_by_key(html_content, key_name):
+    # Copia del extractor original, como línea base
+    idx_key = html_content.find(key_name)
+    if idx_key == -1:
+        idx_key = html_content.find('"{}"'.format(key_name))
+    if idx_key == -1:
+        return None
+
+    idx_open_brace = html_content.find("{", idx_key)
+    if idx_open_brace == -1:
+        return None
+
+    brace_count = 0
+    idx_end_brace = -1
+    search_limit = min(idx_open_brace + 500000, len(html_content))
+
+    for i in range(idx_open_brace, search_limit):
+        if html_content[i] == "{":
+            brace_count += 1
+        elif html_content[i] == "}":
+            brace_count -= 1
+        if brace_count == 0:
+            idx_end_brace = i + 1
+            break
+
+    if idx_end_brace != -1:
+        json_str = html_content[idx_open_brace:idx_end_brace]
+        try:
+            json_str_clean = (
+                json_str.replace("\n", "")
+                .replace("\r", "")
+                .replace('\\"', '"')
+            )
+            return json.loads(json_str_clean)
+        except json.JSONDecodeError:
+            try:
+                return json.loads(json_str.replace("'", '"'))
+            except Exception:
+                pass
+
+    return None
+
+
+def load_pages(corpus_dir, synthetic):
+    if corpus_dir:
+        pages = []
+        for path in sorted(glob.glob(os.path.join(corpus_dir, "*.html"))):
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                pages.append(f.read())
+        return pages
+    return [
+        make_product_page(str(1000 + i), n_providers=40, seed=i, padding_kb=100)
+        for i in range(synthetic)
+    ]
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", help="directorio con fichas guardadas (*.html)")
+    parser.add_argument("--synthetic", type=int, default=20, help="fichas sintéticas si no hay corpus")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    from proyectoMPlvl2 import PRODUCT_JSON_KEYS, extract_json_objects
+
+    pages = load_pages(args.corpus, args.synthetic)
+    print("Páginas: {} | tamaño medio: {:.0f} KB".format(
+        len(pages), sum(len(p) for p in pages) / max(1, len(pages)) / 1024
+    ))
+
+    total_before = total_after = 0.0
+    mismatches = 0
+    for html in pages:
+        before = {k: legacy_extract_json_object_by_key(html, k) for k in PRODUCT_JSON_KEYS}
+        after = extract_json_objects(html, PRODUCT_JSON_KEYS)
+        if before != after:
+            mismatches += 1
+
+        total_before += best_of(
+            lambda: [legacy_extract_json_object_by_key(html, k) for k in PRODUCT_JSON_KEYS],
+            args.repeat,
+        )
+        total_after += best_of(lambda: extract_json_objects(html, PRODUCT_JSON_KEYS), args.repeat)
+
+    n = max(1, len(pages))
+    print("{:<28} {:>12}".format("extractor", "ms/página"))
+    print("{:<28} {:>12.3f}".format("original (4 búsquedas)", total_before / n * 1000))
+    print("{:<28} {:>12.3f}".format("una pasada + raw_decode", total_after / n * 1000))
+    if total_after > 0:
+        print("Aceleración: {:.1f}x".format(total_before / total_after))
+    print("Páginas con resultados distintos: {}".format(mismatches))
+
+
+if __name__ == "__main__":
+    main()
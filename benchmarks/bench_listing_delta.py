@@ -0,0 +1,117 @@
+"""
+Simulación del modo delta del listado: cuántas páginas descarga
+listing_delta.delta_crawl frente al recorrido completo, y si el listado que
+reconstruye coincide con el real.
+
+Parte de un catálogo sintético ordenado por nombre, aplica cambios (altas y
+bajas en una zona, en varias zonas, renombres, o sin cambios) y compara
+huellas (ID, nombre...) con el listado real. Los incorrectos son cambios en
+páginas que el delta no descargó y que no corren el listado (zonas con
+tantas altas como bajas, renombres sueltos; ver delta_crawl): se pierden
+hasta el recorrido completo periódico. "borra de más" cuenta las corridas
+que habrían borrado un producto que sigue en el listado.
+
+Uso:
+    python -m benchmarks.bench_listing_delta --products 10000 --trials 200
+"""
+import argparse
+import os
+import random
+import tempfile
+
+from listing_delta import PAGE_SIZE, ListingIndex, delta_crawl, product_digests
+
+
+def make_catalog(n, rnd):
+    names = sorted("producto {:08d}".format(rnd.randrange(10 ** 8)) for _ in range(n))
+    return [(name, str(1000000 + i)) for i, name in enumerate(names)]
+
+
+def mutate(catalog, rnd, zones, changes, next_id, renames=0):
+    catalog = list(catalog)
+    for _ in range(renames):
+        # Mismo lugar en el orden, otro nombre
+        pos = rnd.randrange(len(catalog))
+        catalog[pos] = (catalog[pos][0] + " (nuevo)", catalog[pos][1])
+    for _ in range(zones):
+        center = rnd.randrange(len(catalog))
+        for _ in range(changes):
+            if rnd.random() < 0.6:
+                # Alta con un nombre cercano al centro de la zona
+                name = catalog[min(center, len(catalog) - 1)][0] + " {:03d}".format(rnd.randrange(1000))
+                catalog.append((name, str(next_id)))
+                next_id += 1
+            elif len(catalog) > 1:
+                del catalog[min(center + rnd.randrange(-3, 4), len(catalog) - 1)]
+        catalog.sort()
+    return catalog, next_id
+
+
+def as_products(catalog):
+    return [
+        {"ID_Producto": id_producto, "Nombre_Producto": name, "Pagina": pos // PAGE_SIZE + 1}
+        for pos, (name, id_producto) in enumerate(catalog)
+    ]
+
+
+def as_pages(catalog):
+    pages = {}
+    for product in as_products(catalog):
+        pages.setdefault(product["Pagina"], []).append(product)
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--trials", type=int, default=200)
+    parser.add_argument("--verify-pages", type=int, default=3)
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    total_pages = (args.products + PAGE_SIZE - 1) // PAGE_SIZE
+    print("Catálogo: {} productos ({} páginas por recorrido completo)".format(args.products, total_pages))
+    print("{:<26} {:>8} {:>12} {:>12} {:>10} {:>12}".format(
+        "escenario", "delta", "completo", "págs. media", "correctos", "borra de más"
+    ))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = os.path.join(tmp, "indice.json")
+        for label, zones, changes, renames in (
+            ("sin cambios", 0, 0, 0),
+            ("1 zona, 1 cambio", 1, 1, 0),
+            ("1 zona, 10 cambios", 1, 10, 0),
+            ("3 zonas, 2 cambios", 3, 2, 0),
+            ("1 zona + 1 renombre", 1, 1, 1),
+        ):
+            resolved = fallbacks = correct = fetched = overdeleted = 0
+            for trial in range(args.trials):
+                base = make_catalog(args.products, rnd)
+                index = ListingIndex(index_path)
+                index.save(as_products(base))
+                new, _ = mutate(base, rnd, zones, changes, next_id=9000000, renames=renames)
+                pages = as_pages(new)
+                result = delta_crawl(
+                    index,
+                    len(new),
+                    lambda wanted: {p: pages.get(p, []) for p in wanted},
+                    verify_pages=args.verify_pages,
+                    rng=random.Random(trial),
+                )
+                if result is None:
+                    fallbacks += 1
+                    fetched += total_pages
+                    correct += 1  # el recorrido completo siempre queda bien
+                    continue
+                resolved += 1
+                fetched += result.pages_fetched
+                correct += result.digests == product_digests(as_products(new))
+                current = {id_producto for _, id_producto in new}
+                overdeleted += any(id_producto in current for id_producto in result.deletes)
+            print("{:<26} {:>8} {:>12} {:>12.1f} {:>9}/{} {:>12}".format(
+                label, resolved, fallbacks, fetched / args.trials, correct, args.trials, overdeleted
+            ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Paridad y benchmark de los backends del parser de listado.
+
+Verifica que todos los backends instalados (selectolax, lxml, bs4) produzcan
+exactamente los mismos registros y el mismo total sobre un corpus de páginas
+guardadas, y reporta páginas/segundo de cada uno. Sale con código 1 si hay
+diferencias.
+
+Uso:
+    python -m benchmarks.bench_listing_parser --corpus ruta/a/listados
+    python -m benchmarks.bench_listing_parser --synthetic 50
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+from benchmarks._synthetic import make_listing_page
+
+
+def load_pages(corpus_dir, synthetic):
+    if corpus_dir:
+        pages = []
+        for path in sorted(glob.glob(os.path.join(corpus_dir, "*.html"))):
+            with open(path, "rb") as f:
+                pages.append(f.read())
+        return pages
+    return [make_listing_page(p).encode("utf-8") for p in range(1, synthetic + 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", help="directorio con páginas de listado guardadas (*.html)")
+    parser.add_argument("--synthetic", type=int, default=50, help="páginas sintéticas si no hay corpus")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    from listing_parser import BACKENDS, available_backends
+
+    pages = load_pages(args.corpus, args.synthetic)
+    backends = available_backends()
+    print("Páginas: {} | backends instalados: {}".format(len(pages), ", ".join(backends)))
+
+    # Paridad: cada backend contra el original (bs4) o, si no está, contra el primero
+    reference = "bs4" if "bs4" in backends else backends[0]
+    mismatches = 0
+    for page_num, content in enumerate(pages, start=1):
+        expected = (
+            BACKENDS[reference][0](content, page_num),
+            BACKENDS[reference][1](content),
+        )
+        for name in backends:
+            got = (BACKENDS[name][0](content, page_num), BACKENDS[name][1](content))
+            if got != expected:
+                mismatches += 1
+                print("✗ Página {}: {} difiere de {}".format(page_num, name, reference))
+
+    print("{:<12} {:>14}".format("backend", "páginas/s"))
+    for name in backends:
+        parse_listing = BACKENDS[name][0]
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for page_num, content in enumerate(pages, start=1):
+                parse_listing(content, page_num)
+            best = min(best, time.perf_counter() - start)
+        print("{:<12} {:>14.1f}".format(name, len(pages) / best if best > 0 else 0.0))
+
+    if mismatches:
+        print("✗ {} diferencias de paridad".format(mismatches))
+        sys.exit(1)
+    print("✓ Paridad OK: todos los backends producen los mismos registros")
+
+
+if __name__ == "__main__":
+    main()
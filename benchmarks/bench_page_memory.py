@@ -0,0 +1,106 @@
+"""
+Memoria de la etapa de fichas: lectura completa (response.content +
+response.text) frente a lectura en streaming (page_stream), con y sin caché
+HTTP.
+
+Cada modo corre en su propio proceso (spawn) contra el mismo corpus servido
+por benchmarks.replay, así el pico de RSS de uno no contamina al otro. El
+listado se corre antes de reiniciar el pico: lo que se reporta es solo la
+etapa de fichas. También verifica que ambos modos guarden las mismas filas.
+
+Uso:
+    python -m benchmarks.bench_page_memory --synthetic 200 --padding-kb 1500
+    python -m benchmarks.bench_page_memory --corpus corpus.zip --workers 16
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import tempfile
+from urllib.parse import urlsplit
+
+from benchmarks import replay
+from benchmarks.bench_end_to_end import build_synthetic_corpus, measure
+
+
+def _run_mode(origin, stream, workers, cache_dir, result_queue):
+    import proyectoMP
+    import proyectoMPlvl2
+    from benchmarks.fake_supabase import FakeSupabase
+
+    supabase = FakeSupabase()
+    proyectoMP.get_supabase_client = lambda: supabase
+    proyectoMPlvl2.get_supabase_client = lambda: supabase
+    proyectoMP.base_url = origin + urlsplit(proyectoMP.base_url).path
+    with contextlib.redirect_stdout(io.StringIO()):
+        proyectoMP.main(1000.0, 8)
+
+    result = measure(
+        "stream" if stream else "completa",
+        lambda saved: saved,
+        lambda: proyectoMPlvl2.process_products_with_prices(
+            max_products=10 ** 9,
+            max_workers=workers,
+            cache_dir=cache_dir,
+            stream_pages=stream,
+        ),
+    )
+    result.pop("metricas")
+    precios = {row["id_producto"]: row["precios_region"] for row in supabase.rows("cm_precios_minimos")}
+    result_queue.put((result, precios))
+
+
+def run_mode(origin, stream, workers, cache_dir):
+    ctx = multiprocessing.get_context("spawn")
+    result_queue = ctx.Queue()
+    process = ctx.Process(target=_run_mode, args=(origin, stream, workers, cache_dir, result_queue))
+    process.start()
+    result = result_queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", help="corpus .zip grabado con CM_RECORD_CORPUS")
+    parser.add_argument("--synthetic", type=int, default=200, help="productos del corpus sintético si no hay --corpus")
+    parser.add_argument("--providers", type=int, default=60, help="proveedores por región en las fichas sintéticas")
+    parser.add_argument("--padding-kb", type=int, default=1500, help="HTML de relleno por ficha sintética (KB)")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05, help="latencia fija por request (s)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_path = args.corpus
+        if not corpus_path:
+            corpus_path = os.path.join(tmp, "corpus.zip")
+            with contextlib.redirect_stdout(io.StringIO()):
+                build_synthetic_corpus(corpus_path, args.synthetic, args.providers, args.padding_kb)
+
+        process, origin = replay.start_in_subprocess(corpus_path, latency=args.latency)
+        try:
+            print("Corpus: {} | {} workers".format(
+                args.corpus or "sintético ({} fichas de ~{} KB)".format(args.synthetic, args.padding_kb), args.workers
+            ))
+            print("{:<10} {:<8} {:>8} {:>9} {:>8} {:>11}".format("lectura", "caché", "fichas", "segundos", "CPU s", "RSS pico MB"))
+            reference = None
+            for use_cache in (False, True):
+                for stream in (False, True):
+                    cache_dir = os.path.join(tmp, "cache-{}-{}".format(int(use_cache), int(stream))) if use_cache else None
+                    result, precios = run_mode(origin, stream, args.workers, cache_dir)
+                    print("{:<10} {:<8} {:>8} {:>9.2f} {:>8.2f} {:>11.1f}".format(
+                        result["etapa"], "sí" if use_cache else "no", result["unidades"],
+                        result["segundos"], result["cpu"], result["rss_mb"],
+                    ))
+                    if reference is None:
+                        reference = precios
+                    elif precios != reference:
+                        print("  ✗ Los precios guardados no coinciden con la lectura completa sin caché")
+        finally:
+            process.terminate()
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark del historial de precios en Parquet: consultas con filtros
+(particiones por fecha + estadísticas de row group) contra cargar todas las
+capturas y filtrar en pandas.
+
+Genera D días × N productos × 16 regiones sintéticos en un directorio temporal.
+
+Uso:
+    python -m benchmarks.bench_price_history --days 30 --products 20000
+"""
+import argparse
+import datetime
+import random
+import resource
+import tempfile
+import time
+
+import pyarrow.dataset as ds
+
+from price_history import PARTITIONING, PriceHistory, PriceHistoryWriter
+
+REGIONS = ["Region_{:02d}".format(i) for i in range(16)]
+
+
+def build_history(root, days, products, seed=0):
+    rnd = random.Random(seed)
+    base = {str(1000000 + i): rnd.randint(1000, 500000) for i in range(products)}
+    start = datetime.date(2026, 1, 1)
+    for d in range(days):
+        writer = PriceHistoryWriter(root, start + datetime.timedelta(days=d))
+        writer.captured_at += d * 86400
+        rows = []
+        for id_producto, precio in base.items():
+            precios = {r: int(precio * rnd.uniform(0.9, 1.1)) for r in REGIONS}
+            mejor = min(precios, key=precios.get)
+            rows.append({
+                "id_producto": id_producto,
+                "precios_region": precios,
+                "precio_minimo_global": precios[mejor],
+                "region_mejor_precio": mejor,
+            })
+            if len(rows) == 1000:
+                writer.append(rows)
+                rows = []
+        writer.append(rows)
+        writer.close()
+    return start, list(base)
+
+
+def timed(fn, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--products", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        t0 = time.perf_counter()
+        start, ids = build_history(root, args.days, args.products)
+        print("Historial: {} días × {} productos × {} regiones ({:.1f}s en escribir)".format(
+            args.days, args.products, len(REGIONS), time.perf_counter() - t0
+        ))
+        history = PriceHistory(root)
+        target = ids[len(ids) // 2]
+        since = start + datetime.timedelta(days=args.days - 7)
+
+        def full_scan_series():
+            df = ds.dataset(root, format="parquet", partitioning=PARTITIONING).to_table().to_pandas()
+            return df[(df.id_producto == target) & (df.region == REGIONS[3])]
+
+        print("{:<40} {:>10} {:>8}".format("consulta", "ms", "filas"))
+        for label, fn in (
+            ("serie producto×región (filtros)", lambda: history.price_series(target, REGIONS[3])),
+            ("serie producto×región (todo a pandas)", full_scan_series),
+            ("serie mínimo global", lambda: history.price_series(target)),
+            ("biggest_movers últimos 7 días", lambda: history.biggest_movers(since)),
+            ("biggest_movers 7 días, una región", lambda: history.biggest_movers(since, REGIONS[0])),
+        ):
+            elapsed, result = timed(fn)
+            print("{:<40} {:>10.1f} {:>8}".format(label, elapsed * 1000, len(result)))
+        print("RSS máximo: {:.0f} MB".format(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Benchmark del índice de precios por región (price_index.PriceIndex).
+
+Arma un catálogo sintético con la forma de cm_precios_minimos (precios por
+región como los de get_minimum_price_by_region_with_offers), y mide:
+- la construcción en lotes de 200 (como la alimenta BatchUpserter),
+- la actualización incremental de una fracción de productos frente a
+  reconstruir el índice completo,
+- la latencia p50/p99 de cada consulta en el índice, contra recorrer las
+  filas (lo que haría un consumidor sin índice), verificando que den lo mismo,
+- la misma consulta por la API HTTP local (PriceIndexServer).
+
+Uso:
+    python -m benchmarks.bench_price_index --products 50000 --queries 500
+"""
+import argparse
+import heapq
+import json
+import random
+import time
+import urllib.parse
+import urllib.request
+
+from adaptive_concurrency import percentile
+from benchmarks._synthetic import REGIONES
+from price_index import PriceIndex, PriceIndexServer, name_tokens, region_key
+
+PALABRAS = (
+    "arroz grado 1 azucar blanca aceite vegetal harina panadera fideos spaghetti leche entera polvo cafe "
+    "molido te negro atun lomitos agua mineral detergente liquido papel higienico toalla cloro gel jabon "
+    "lapiz pasta grafito cuaderno universitario resma carta oficio toner negro cartucho color guantes nitrilo "
+    "mascarilla quirurgica alcohol desinfectante jeringa aguja bolsa basura"
+).split()
+
+
+def make_rows(n, rnd, start_id=1000000):
+    rows = []
+    for i in range(n):
+        nombre = " ".join(rnd.sample(PALABRAS, 4)) + " {} {}".format(rnd.choice((250, 500, 1000)), rnd.choice(("g", "kg", "ml", "un")))
+        base = rnd.randint(500, 200000)
+        regiones = rnd.sample(REGIONES, rnd.randint(1, len(REGIONES)))
+        rows.append({
+            "id_producto": str(start_id + i),
+            "nombre_producto": nombre,
+            "link_producto": "https://conveniomarco2.mercadopublico.cl/p-{}.html".format(start_id + i),
+            "precios_region": {r: int(base * rnd.uniform(0.8, 1.4)) for r in regiones},
+        })
+    return rows
+
+
+def scan_cheapest(rows, region, max_price, query, limit):
+    # Sin índice: recorrer todas las filas
+    key = region_key(region)
+    tokens = name_tokens(query) if query else set()
+    found = []
+    for row in rows:
+        if tokens and not tokens <= name_tokens(row["nombre_producto"]):
+            continue
+        for name, precio in row["precios_region"].items():
+            if region_key(name) == key and (max_price is None or precio <= max_price):
+                found.append((precio, row["id_producto"]))
+    return [i for _, i in heapq.nsmallest(limit, found)]
+
+
+def timed(fn, samples):
+    start = time.perf_counter()
+    result = fn()
+    samples.append(time.perf_counter() - start)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--products", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=500, help="consultas por tipo")
+    parser.add_argument("--scan-queries", type=int, default=20, help="consultas con el recorrido sin índice")
+    parser.add_argument("--update-fraction", type=float, default=0.02, help="fracción de productos que cambia")
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    rows = make_rows(args.products, rnd)
+    print("Catálogo: {} productos, {} regiones".format(len(rows), len(REGIONES)))
+
+    index = PriceIndex()
+    start = time.perf_counter()
+    for i in range(0, len(rows), 200):
+        index.append(rows[i : i + 200])
+    build_s = time.perf_counter() - start
+    print("Construcción en lotes de 200: {:.2f}s ({:.1f} µs/producto)".format(build_s, build_s / len(rows) * 1e6))
+
+    changed = rnd.sample(rows, max(1, int(len(rows) * args.update_fraction)))
+    for row in changed:
+        row["precios_region"] = {r: int(p * rnd.uniform(0.9, 1.1)) for r, p in row["precios_region"].items()}
+    start = time.perf_counter()
+    index.append(changed)
+    update_s = time.perf_counter() - start
+    start = time.perf_counter()
+    rebuilt = PriceIndex()
+    rebuilt.append(rows)
+    rebuild_s = time.perf_counter() - start
+    print("Actualización de {} productos: {:.1f} ms incremental vs {:.0f} ms reconstruyendo".format(
+        len(changed), update_s * 1000, rebuild_s * 1000
+    ))
+
+    queries = []
+    for _ in range(args.queries):
+        queries.append((rnd.choice(REGIONES), rnd.choice((None, 5000, 20000, 100000)),
+                        rnd.choice((None, None, rnd.choice(PALABRAS), " ".join(rnd.sample(PALABRAS, 2)))), 20))
+
+    mismatches = 0
+    scan_samples = []
+    for region, max_price, query, limit in queries[: args.scan_queries]:
+        expected = timed(lambda: scan_cheapest(rows, region, max_price, query, limit), scan_samples)
+        got = [r["id_producto"] for r in index.cheapest(region, max_price, None, query, limit)]
+        # Con precios empatados el orden entre IDs puede variar: se comparan precios
+        if sorted(got) != sorted(expected) and [index.product(i)["precios_region"] for i in got] != [
+            index.product(i)["precios_region"] for i in expected
+        ]:
+            mismatches += 1
+
+    results = {}
+    for label, fn in (
+        ("baratos", lambda q: index.cheapest(q[0], q[1], None, None, q[3])),
+        ("baratos+texto", lambda q: index.cheapest(q[0], q[1], None, q[2] or "arroz", q[3])),
+        ("diferencias", lambda q: index.biggest_spreads(q[3])),
+        ("buscar", lambda q: index.search(q[2] or "arroz", q[3])),
+    ):
+        samples = []
+        for q in queries:
+            timed(lambda: fn(q), samples)
+        results[label] = samples
+
+    server = PriceIndexServer(index).start()
+    http_samples = []
+    try:
+        for region, max_price, query, limit in queries:
+            params = {"region": region, "limit": limit}
+            if max_price is not None:
+                params["max"] = max_price
+            url = "{}/baratos?{}".format(server.origin, urllib.parse.urlencode(params))
+            timed(lambda: json.load(urllib.request.urlopen(url)), http_samples)
+    finally:
+        server.shutdown()
+    results["HTTP /baratos"] = http_samples
+
+    print("{:<16} {:>10} {:>10} {:>10}".format("consulta", "p50 ms", "p99 ms", "máx ms"))
+    for label, samples in results.items():
+        print("{:<16} {:>10.3f} {:>10.3f} {:>10.3f}".format(
+            label, percentile(samples, 50) * 1000, percentile(samples, 99) * 1000, max(samples) * 1000
+        ))
+    print("{:<16} {:>10.3f} {:>10.3f} {:>10.3f}".format(
+        "recorrido", percentile(scan_samples, 50) * 1000, percentile(scan_samples, 99) * 1000, max(scan_samples) * 1000
+    ))
+    print("Consultas distintas al recorrido sin índice: {}/{}".format(mismatches, min(args.scan_queries, len(queries))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Micro-benchmark del cálculo de precio mínimo por región.
+
+Compara el cálculo original (dicts anidados, cuatro .get() por proveedor en
+offerPrices, parseo de cada precio y lista temporal por región) contra
+price_model.min_price_by_region (ofertas aplanadas, regiones internadas,
+precios parseados una vez), y verifica que ambos retornen lo mismo.
+
+Uso:
+    python -m benchmarks.bench_price_model --providers 100,300,600 --products 50
+"""
+import argparse
+import json
+import random
+import time
+
+from benchmarks._synthetic import make_product_page
+from price_model import min_price_by_region
+from proyectoMPlvl2 import PRODUCT_JSON_KEYS, extract_json_objects, extract_product_id
+
+
+def legacy_clean_price_value(value):
+    # Copia del parseo original, como línea base
+    if not value:
+        return 0
+    try:
+        if isinstance(value, str):
+            clean_val = value.replace(",", "").replace("$", "").strip()
+            if not clean_val:
+                return 0
+            return int(float(clean_val))
+        else:
+            return int(float(value))
+    except (ValueError, TypeError):
+        return 0
+
+
+def legacy_min_prices(json_prices, offer_prices, product_id, region_names_map):
+    # Copia del cálculo original, como línea base
+    if not json_prices:
+        return {}
+    precios_finales = {}
+    for region_id, providers in json_prices.items():
+        nombre_region_real = region_names_map.get(region_id, "Region_ID_{}".format(region_id))
+        if not isinstance(providers, dict):
+            continue
+        lista_precios = []
+        for provider_id, data in providers.items():
+            if not isinstance(data, dict):
+                continue
+            price_final = legacy_clean_price_value(data.get("price", "0"))
+            if offer_prices and product_id:
+                try:
+                    provider_offers = offer_prices.get(str(provider_id))
+                    if provider_offers:
+                        product_offers = provider_offers.get(str(product_id))
+                        if product_offers:
+                            region_offer = product_offers.get(str(region_id))
+                            if region_offer:
+                                special_price_raw = region_offer.get("special_price")
+                                if special_price_raw:
+                                    special_price = legacy_clean_price_value(special_price_raw)
+                                    if special_price > 0:
+                                        price_final = special_price
+                except Exception:
+                    pass
+            if price_final > 0:
+                lista_precios.append(price_final)
+        if lista_precios:
+            precios_finales[nombre_region_real] = min(lista_precios)
+    return precios_finales
+
+
+def make_inputs(n_products, n_providers):
+    inputs = []
+    for i in range(n_products):
+        html = make_product_page(str(2000 + i), n_providers=n_providers, seed=i, padding_kb=0)
+        blobs = extract_json_objects(html, PRODUCT_JSON_KEYS)
+        # Ofertas de otros productos también (el sitio trae offerPrices de toda la ficha)
+        offers = blobs["offerPrices"] or {}
+        rnd = random.Random(i)
+        for pid in list(offers)[: len(offers) // 2]:
+            offers[pid][str(rnd.randint(1, 10 ** 6))] = {"1": {"special_price": "1,000.00"}}
+        inputs.append((blobs["jsonResult"], offers, extract_product_id(html), blobs["region_names"] or {}))
+    # Copia independiente para que ninguno de los dos se beneficie del otro
+    return inputs, json.loads(json.dumps(inputs))
+
+
+def bench(fn, inputs, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = [fn(*args) for args in inputs]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--providers", default="100,300,600", help="proveedores por región")
+    parser.add_argument("--products", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print("{:>12} {:>10} {:>14} {:>14} {:>9} {:>8}".format(
+        "proveedores", "fichas", "original ms", "compilado ms", "speedup", "iguales"
+    ))
+    for n_providers in (int(x) for x in args.providers.split(",")):
+        inputs, inputs_copy = make_inputs(args.products, n_providers)
+        legacy_s, legacy_out = bench(legacy_min_prices, inputs, args.repeat)
+        new_s, new_out = bench(min_price_by_region, inputs_copy, args.repeat)
+        same = sum(1 for a, b in zip(legacy_out, new_out) if a == b)
+        print("{:>12} {:>10} {:>14.2f} {:>14.2f} {:>8.1f}x {:>8}".format(
+            n_providers,
+            args.products,
+            legacy_s / args.products * 1000,
+            new_s / args.products * 1000,
+            legacy_s / new_s if new_s else 0.0,
+            "{}/{}".format(same, args.products),
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark de la conversión listado → registros de cm_productos.
+
+Compara el camino original (DataFrame + iterrows) con build_product_records
+(columnar; registros armados con tolist() por columna) sobre filas sintéticas con duplicados, y
+reporta tiempo y memoria pico (tracemalloc) por tamaño.
+
+Uso:
+    python -m benchmarks.bench_records --sizes 10000 100000 1000000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+
+def make_listing_rows(n, dup_rate=0.01, seed=0):
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n):
+        pid = i if rnd.random() > dup_rate else rnd.randrange(max(1, i))
+        rows.append(
+            {
+                "ID_Producto": str(1000000 + pid),
+                "Nombre_Producto": " Producto alimenticio {} ".format(pid),
+                "Numero_Proveedores": str(rnd.randint(0, 120)) if rnd.random() > 0.05 else "",
+                "Link_Producto": "https://conveniomarco2.mercadopublico.cl/alimentos2/p-{}.html".format(pid),
+                "Pagina": i // 25 + 1,
+            }
+        )
+    return rows
+
+
+def legacy_records(all_products):
+    # Copia del camino original, como línea base
+    import pandas as pd
+
+    df = pd.DataFrame(all_products)
+    df["Numero_Proveedores"] = (
+        pd.to_numeric(df["Numero_Proveedores"], errors="coerce")
+        .fillna(0)
+        .astype(int)
+    )
+    df["Pagina"] = pd.to_numeric(df["Pagina"], errors="coerce").fillna(0).astype(int)
+    registros = []
+    for _, row in df.iterrows():
+        registros.append(
+            {
+                "id_producto": str(row["ID_Producto"]),
+                "nombre_producto": row["Nombre_Producto"],
+                "numero_proveedores": int(row["Numero_Proveedores"]),
+                "link_producto": row["Link_Producto"],
+                "pagina": int(row["Pagina"]),
+            }
+        )
+    return df, registros
+
+
+def measure(fn, rows):
+    tracemalloc.start()
+    start = time.perf_counter()
+    _, registros = fn(rows)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / (1024 * 1024), len(registros)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument(
+        "--legacy-max",
+        type=int,
+        default=100000,
+        help="no correr iterrows por encima de este tamaño (tarda minutos)",
+    )
+    args = parser.parse_args()
+
+    from proyectoMP import build_product_records
+
+    print("{:>9} {:<12} {:>10} {:>12} {:>10}".format("filas", "camino", "segundos", "pico MB", "registros"))
+    for n in args.sizes:
+        rows = make_listing_rows(n)
+        candidates = [("columnar", build_product_records)]
+        if n <= args.legacy_max:
+            candidates.insert(0, ("iterrows", legacy_records))
+        for label, fn in candidates:
+            elapsed, peak_mb, count = measure(fn, rows)
+            print("{:>9} {:<12} {:>10.3f} {:>12.1f} {:>10}".format(n, label, elapsed, peak_mb, count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark del refresco de cm_precios_region en un Postgres local:
+reconstrucción completa vs refresco solo de los productos cambiados.
+
+Carga N productos sintéticos en cm_precios_minimos (por COPY), instala la
+función incremental de sql/refrescar_cm_precios_region.sql (la completa y la
+tabla vienen del esquema local, sql/esquema_local.sql) y mide cada variante.
+
+Uso:
+    python -m benchmarks.bench_refresh_region --db-url postgresql://localhost/cm --products 100000
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import time
+
+from benchmarks.bench_bulk_load import SCHEMA_PATH, make_price_rows
+from bulk_loader import PostgresCopyLoader
+
+REFRESH_SQL = os.path.join(os.path.dirname(__file__), os.pardir, "sql", "refrescar_cm_precios_region.sql")
+
+
+def setup(db_url, products):
+    import psycopg
+
+    with psycopg.connect(db_url, autocommit=True) as conn:
+        for path in (SCHEMA_PATH, REFRESH_SQL):
+            with open(path, encoding="utf-8") as f:
+                conn.execute(f.read())
+        conn.execute("TRUNCATE cm_precios_minimos, cm_precios_region")
+    loader = PostgresCopyLoader(db_url, "cm_precios_minimos")
+    with contextlib.redirect_stdout(io.StringIO()):
+        loader.write(make_price_rows(products))
+    loader.close()
+    with psycopg.connect(db_url, autocommit=True) as conn:
+        conn.execute("ANALYZE cm_precios_minimos")
+
+
+def timed(conn, statement, params=(), repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = conn.execute(statement, params).fetchone()[0]
+        conn.commit()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--db-url", default=os.environ.get("CM_DB_URL"), required=os.environ.get("CM_DB_URL") is None)
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--changed", default="10,100,1000,5000,20000", help="tamaños del set de cambiados")
+    args = parser.parse_args()
+
+    import psycopg
+
+    print("Cargando {} productos sintéticos...".format(args.products))
+    setup(args.db_url, args.products)
+
+    rnd = random.Random(0)
+    all_ids = [str(1000000 + i) for i in range(args.products)]
+    with psycopg.connect(args.db_url) as conn:
+        full_s, full_rows = timed(conn, "SELECT refrescar_cm_precios_region()")
+        conn.execute("ANALYZE cm_precios_region")
+        conn.commit()
+        print("{:<28} {:>10} {:>12} {:>10}".format("variante", "segundos", "filas", "vs completo"))
+        print("{:<28} {:>10.3f} {:>12} {:>10}".format("completo", full_s, full_rows, "1.0x"))
+        for n in (int(x) for x in args.changed.split(",")):
+            if n > args.products:
+                continue
+            ids = rnd.sample(all_ids, n)
+            elapsed, rows = timed(conn, "SELECT refrescar_cm_precios_region_ids(%s)", (ids,))
+            print("{:<28} {:>10.3f} {:>12} {:>9.1f}x".format(
+                "incremental ({} ids)".format(n), elapsed, rows, full_s / elapsed if elapsed else 0.0
+            ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Tiempo de arranque de los puntos de entrada, con `python -X importtime`.
+
+Para cada módulo (proyectoMP, proyectoMPlvl2, refresh_precios_region,
+pipeline, cm_cli) importa en un intérprete nuevo, varias veces, y reporta la
+mediana del tiempo acumulado de importación, el tiempo total del proceso y
+los paquetes que más pesan. Con --against REF mide lo mismo sobre otra
+versión del repo (git archive a un directorio temporal), para comparar el
+arranque en frío antes y después.
+
+Uso:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --against HEAD~1 --repeat 7
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+ENTRY_POINTS = ("proyectoMP", "proyectoMPlvl2", "refresh_precios_region", "pipeline", "cm_cli")
+# Dependencias pesadas que se quieren fuera del arranque
+HEAVY = ("pandas", "supabase", "psycopg", "pyarrow", "bs4")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr: str) -> dict:
+    """
+    {módulo: microsegundos acumulados} de la salida de -X importtime.
+    """
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        try:
+            times[name.strip()] = int(cumulative)
+        except ValueError:  # encabezado
+            continue
+    return times
+
+
+def measure_import(module: str, cwd: str) -> tuple[float, float, dict]:
+    """
+    Importa module en un intérprete nuevo. Retorna (segundos de importación
+    del módulo, segundos del proceso completo, {módulo: µs}).
+    """
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        cwd=cwd, env=env, capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    times = parse_importtime(result.stderr)
+    return times.get(module, 0) / 1e6, elapsed, times
+
+
+def profile(cwd: str, repeat: int) -> dict:
+    # Una importación de calentamiento compila los .pyc del árbol (quedan fuera de la medición)
+    subprocess.run([sys.executable, "-m", "compileall", "-q", cwd], capture_output=True)
+    results = {}
+    for module in ENTRY_POINTS:
+        if not os.path.exists(os.path.join(cwd, module + ".py")) and not os.path.isdir(os.path.join(cwd, module)):
+            continue
+        samples = []
+        try:
+            for _ in range(repeat):
+                samples.append(measure_import(module, cwd))
+        except RuntimeError as e:
+            print("⚠ {}: {}".format(module, e))
+            continue
+        times = samples[-1][2]
+        results[module] = {
+            "importacion": statistics.median(s[0] for s in samples),
+            "proceso": statistics.median(s[1] for s in samples),
+            "pesados": [name for name in HEAVY if name in times],
+        }
+    return results
+
+
+def print_profile(label: str, results: dict, baseline: dict | None = None) -> None:
+    print("\n" + label)
+    print("{:<24} {:>12} {:>11} {:>10}  {}".format("módulo", "import ms", "proceso ms", "vs base", "dependencias pesadas"))
+    for module, r in results.items():
+        versus = ""
+        if baseline and module in baseline:
+            versus = "{:.1f}x".format(baseline[module]["proceso"] / r["proceso"])
+        print("{:<24} {:>12.1f} {:>11.1f} {:>10}  {}".format(
+            module, r["importacion"] * 1000, r["proceso"] * 1000, versus, ", ".join(r["pesados"]) or "-"
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="importaciones por módulo (se toma la mediana)")
+    parser.add_argument("--against", help="referencia de git a comparar (p. ej. HEAD~1)")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.against:
+        with tempfile.TemporaryDirectory() as tmp:
+            archive = subprocess.run(
+                ["git", "archive", "--format=tar", args.against], cwd=ROOT, capture_output=True, check=True
+            ).stdout
+            tar_path = os.path.join(tmp, "arbol.tar")
+            with open(tar_path, "wb") as f:
+                f.write(archive)
+            tree = os.path.join(tmp, "arbol")
+            with tarfile.open(tar_path) as tar:
+                tar.extractall(tree, filter="data")
+            baseline = profile(tree, args.repeat)
+        print_profile("Base ({})".format(args.against), baseline)
+
+    print_profile("Árbol actual", profile(ROOT, args.repeat), baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Cliente de Supabase falso, en memoria, para correr los scrapers sin red.
+
+Implementa solo la parte de la API que usan los scripts:
+table().select(cols, count=).order().limit().gt().execute(),
+table().upsert(filas, on_conflict=).execute(), table().delete().in_().execute()
+y rpc(nombre, params).execute().
+"""
+import threading
+import time
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class _Query:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self._columns = None
+        self._count = None
+        self._order = None
+        self._limit = None
+        self._filters = []
+        self._upsert = None
+        self._delete = False
+
+    def select(self, columns="*", count=None):
+        self._columns = None if columns == "*" else [c.strip() for c in columns.split(",")]
+        self._count = count
+        return self
+
+    def order(self, column, desc=False):
+        self._order = (column, desc)
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def gt(self, column, value):
+        self._filters.append(lambda row: row.get(column) is not None and row[column] > value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self._filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def delete(self):
+        self._delete = True
+        return self
+
+    def upsert(self, rows, on_conflict="id"):
+        self._upsert = (rows, on_conflict)
+        return self
+
+    def execute(self):
+        if self._upsert is not None:
+            rows, key = self._upsert
+            return FakeResponse(self.client._upsert(self.table, rows, key))
+        if self._delete:
+            return FakeResponse(self.client._delete(self))
+        return self.client._select(self)
+
+
+class FakeSupabase:
+    """
+    Tablas en memoria (dict por clave de conflicto). Thread-safe.
+    write_latency simula la latencia de cada upsert y row_latency el costo
+    extra por fila (serializar, transferir, escribir).
+    """
+
+    def __init__(self, write_latency: float = 0.0, row_latency: float = 0.0):
+        self.write_latency = write_latency
+        self.row_latency = row_latency
+        self.tables: dict = {}
+        self.upsert_calls = 0
+        self.rows_written = 0
+        self.rpc_calls: list = []
+        self._lock = threading.Lock()
+
+    def table(self, name):
+        return _Query(self, name)
+
+    def rpc(self, name, params=None):
+        self.rpc_calls.append((name, params))
+        return _Query(self, None)
+
+    def rows(self, table) -> list[dict]:
+        with self._lock:
+            return list(self.tables.get(table, {}).values())
+
+    def _upsert(self, table, rows, key):
+        if self.write_latency or self.row_latency:
+            time.sleep(self.write_latency + self.row_latency * len(rows))
+        with self._lock:
+            stored = self.tables.setdefault(table, {})
+            for row in rows:
+                stored.setdefault(row[key], {}).update(row)
+            self.upsert_calls += 1
+            self.rows_written += len(rows)
+        return rows
+
+    def _delete(self, query):
+        with self._lock:
+            stored = self.tables.get(query.table, {})
+            deleted = {k: row for k, row in stored.items() if all(keep(row) for keep in query._filters)}
+            for key in deleted:
+                del stored[key]
+        return list(deleted.values())
+
+    def _select(self, query):
+        if query.table is None:
+            return FakeResponse(None)
+        with self._lock:
+            rows = list(self.tables.get(query.table, {}).values())
+        for keep in query._filters:
+            rows = [row for row in rows if keep(row)]
+        total = len(rows)
+        if query._order is not None:
+            column, desc = query._order
+            rows.sort(key=lambda row: row.get(column), reverse=desc)
+        if query._limit is not None:
+            rows = rows[: query._limit]
+        if query._columns is not None:
+            rows = [{c: row.get(c) for c in query._columns} for row in rows]
+        return FakeResponse(rows, total if query._count else None)
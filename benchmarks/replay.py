@@ -0,0 +1,199 @@
+"""
+Servidor HTTP local que reproduce un corpus grabado (corpus.CorpusWriter).
+
+Responde cada path+query con la respuesta grabada, reescribiendo el origen
+del sitio (https://conveniomarco2.mercadopublico.cl) por el origen local para
+que los links del listado apunten al mismo servidor. Permite simular
+latencia, jitter y errores (503, 429 y conexiones cortadas).
+
+Uso:
+    python -m benchmarks.replay corpus.zip --port 8765 --latency 0.3 --jitter 0.2
+    CM_BASE_URL=http://127.0.0.1:8765/alimentos2/alimentos python proyectoMP.py
+"""
+import argparse
+import multiprocessing
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from corpus import CorpusReader
+
+
+class ReplayServer:
+    """
+    - latency: segundos fijos por request.
+    - jitter: segundos extra aleatorios, uniformes entre 0 y jitter.
+    - error_rate: fracción de requests que responden 503.
+    - throttle_rate: fracción que responde 429 con Retry-After: retry_after.
+    - drop_rate: fracción en que se corta la conexión sin responder.
+    """
+
+    def __init__(
+        self,
+        corpus_path: str,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        drop_rate: float = 0.0,
+        retry_after: float = 1.0,
+        seed: int | None = None,
+    ):
+        self.corpus = CorpusReader(corpus_path)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.drop_rate = drop_rate
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._bodies: dict = {}
+        self._bodies_lock = threading.Lock()
+
+        ThreadingHTTPServer.request_queue_size = 1024
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.origin = "http://{}:{}".format(*self.httpd.server_address[:2])
+        # Origen grabado -> origen local (también en su forma escapada en JSON)
+        self._rewrites = []
+        for origin in sorted(self.corpus.origins()):
+            for old, new in ((origin, self.origin), (origin.replace("/", "\\/"), self.origin.replace("/", "\\/"))):
+                self._rewrites.append((old.encode("utf-8"), new.encode("utf-8")))
+
+    def _roll(self) -> tuple[float, str | None]:
+        with self._random_lock:
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            r = self._random.random()
+        if r < self.drop_rate:
+            return delay, "drop"
+        r -= self.drop_rate
+        if r < self.error_rate:
+            return delay, "503"
+        r -= self.error_rate
+        if r < self.throttle_rate:
+            return delay, "429"
+        return delay, None
+
+    def _body(self, key: str):
+        with self._bodies_lock:
+            cached = self._bodies.get(key)
+        if cached is not None:
+            return cached
+        found = self.corpus.get(key)
+        if found is None:
+            return None
+        status, headers, body = found
+        for old, new in self._rewrites:
+            body = body.replace(old, new)
+        cached = (status, headers, body)
+        with self._bodies_lock:
+            self._bodies[key] = cached
+        return cached
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                delay, fault = server._roll()
+                if delay:
+                    time.sleep(delay)
+                if fault == "drop":
+                    self.close_connection = True
+                    return
+                if fault is not None:
+                    self.send_response(int(fault))
+                    if fault == "429":
+                        self.send_header("Retry-After", str(server.retry_after))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+
+                found = server._body(self.path)
+                if found is None:
+                    self.send_error(404)
+                    return
+                status, headers, body = found
+                self.send_response(status)
+                self.send_header("Content-Type", headers.get("Content-Type", "text/html; charset=utf-8"))
+                for name in ("ETag", "Last-Modified"):
+                    if name in headers:
+                        self.send_header(name, headers[name])
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _serve(corpus_path, options, ready):
+    server = ReplayServer(corpus_path, **options)
+    ready.put(server.origin)
+    server.serve_forever()
+
+
+def start_in_subprocess(corpus_path: str, **options):
+    """
+    Levanta el servidor en otro proceso (para que su CPU y memoria no se
+    mezclen con las del scraper medido). Retorna (proceso, origen).
+    """
+    ctx = multiprocessing.get_context("spawn")
+    ready = ctx.Queue()
+    process = ctx.Process(target=_serve, args=(corpus_path, options, ready), daemon=True)
+    process.start()
+    return process, ready.get(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que reproduce un corpus grabado")
+    parser.add_argument("corpus", help="corpus .zip grabado con CM_RECORD_CORPUS")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="latencia fija por request (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latencia extra aleatoria, 0..jitter (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fracción de 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="fracción de 429")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fracción de conexiones cortadas")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After de los 429 (s)")
+    args = parser.parse_args()
+
+    server = ReplayServer(
+        args.corpus,
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        drop_rate=args.drop_rate,
+        retry_after=args.retry_after,
+    )
+    print("✓ Reproduciendo {} respuestas en {}".format(len(server.corpus.manifest), server.origin))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+import contextlib
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import STAGE_UPSERT, get_metrics
+
+# Driver de Postgres opcional (solo para el camino COPY con --db-url). Se
+# importa al crear el primer PostgresCopyLoader, no al cargar el módulo.
+psycopg = None
+sql = None
+
+
+def _load_psycopg():
+    global psycopg, sql
+    if psycopg is None:
+        try:
+            import psycopg as _psycopg
+            from psycopg import sql as _sql
+        except ImportError:
+            raise RuntimeError("La carga por COPY requiere psycopg (pip install 'psycopg[binary]').") from None
+        psycopg, sql = _psycopg, _sql
+
+
+def dedupe_last(rows: list[dict], key: str) -> list[dict]:
+    """
+    Deja una fila por clave (la última), conservando el orden de llegada.
+    Un mismo INSERT ... ON CONFLICT no puede tocar dos veces la misma fila.
+    """
+    by_key = {}
+    for row in rows:
+        by_key[row[key]] = row
+    if len(by_key) == len(rows):
+        return rows
+    return list(by_key.values())
+
+
+class _LoaderStats:
+    def __init__(self):
+        self.rows_written = 0
+        self.requests = 0
+        self.seconds = 0.0
+        self._stats_lock = threading.Lock()
+
+    def _account(self, rows: int, seconds: float, requests: int = 1) -> None:
+        with self._stats_lock:
+            self.rows_written += rows
+            self.requests += requests
+            self.seconds += seconds
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "modo": self.mode,
+                "filas": self.rows_written,
+                "requests": self.requests,
+                "segundos": self.seconds,
+                "filas_por_segundo": self.rows_written / self.seconds if self.seconds > 0 else 0.0,
+            }
+
+    def print_stats(self) -> None:
+        s = self.stats()
+        if s["filas"]:
+            print("✓ Carga {}: {} filas en {} requests, {:.1f}s ({:.0f} filas/s)".format(
+                s["modo"], s["filas"], s["requests"], s["segundos"], s["filas_por_segundo"]
+            ))
+
+    def close(self) -> None:
+        pass
+
+
+class RestLoader(_LoaderStats):
+    """
+    Upsert por la API REST de Supabase, un lote tras otro, en chunks fijos
+    (el comportamiento de siempre de los scripts).
+    """
+
+    mode = "rest"
+
+    def __init__(self, supabase, table: str, on_conflict: str = "id_producto", chunk_size: int = 500):
+        super().__init__()
+        self.supabase = supabase
+        self.table = table
+        self.on_conflict = on_conflict
+        self.chunk_size = chunk_size
+
+    def _upsert(self, chunk: list[dict]) -> None:
+        self.supabase.table(self.table).upsert(chunk, on_conflict=self.on_conflict).execute()
+
+    def write(self, rows: list[dict]) -> int:
+        rows = dedupe_last(rows, self.on_conflict)
+        for i in range(0, len(rows), self.chunk_size):
+            chunk = rows[i : i + self.chunk_size]
+            start = time.perf_counter()
+            with get_metrics().time(STAGE_UPSERT):
+                self._upsert(chunk)
+            self._account(len(chunk), time.perf_counter() - start)
+        return len(rows)
+
+    def delete(self, keys: list) -> int:
+        """
+        Borra las filas cuya clave (on_conflict) está en keys, en chunks.
+        """
+        for i in range(0, len(keys), self.chunk_size):
+            chunk = keys[i : i + self.chunk_size]
+            with get_metrics().time(STAGE_UPSERT):
+                self.supabase.table(self.table).delete().in_(self.on_conflict, chunk).execute()
+        return len(keys)
+
+
+class ConcurrentRestLoader(RestLoader):
+    """
+    Upsert REST en paralelo (max_concurrency lotes a la vez) con el tamaño del
+    lote auto-ajustado: busca que cada request tarde ~target_seconds,
+    entre min_chunk y max_chunk. Si un lote falla se parte en dos y se
+    reintenta (hasta max_retries veces), por si el problema era el tamaño
+    (timeout del gateway, límite del body).
+    """
+
+    mode = "bulk"
+
+    def __init__(
+        self,
+        supabase,
+        table: str,
+        on_conflict: str = "id_producto",
+        chunk_size: int = 200,
+        max_concurrency: int = 4,
+        min_chunk: int = 50,
+        max_chunk: int = 5000,
+        target_seconds: float = 1.0,
+        max_retries: int = 3,
+    ):
+        super().__init__(supabase, table, on_conflict, chunk_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_chunk = min_chunk
+        self.max_chunk = max(min_chunk, max_chunk)
+        self.target_seconds = target_seconds
+        self.max_retries = max_retries
+        self._tune_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency)
+
+    def _tune(self, rows: int, seconds: float) -> None:
+        if seconds <= 0:
+            return
+        with self._tune_lock:
+            # Ajuste proporcional, a lo más x2 o /2 por lote para no oscilar
+            wanted = rows * self.target_seconds / seconds
+            wanted = min(self.chunk_size * 2, max(self.chunk_size / 2, wanted))
+            self.chunk_size = int(min(self.max_chunk, max(self.min_chunk, wanted)))
+
+    def _send(self, chunk: list[dict], attempt: int = 0) -> int:
+        start = time.perf_counter()
+        try:
+            with get_metrics().time(STAGE_UPSERT):
+                self._upsert(chunk)
+        except Exception as e:
+            if attempt >= self.max_retries:
+                raise
+            with self._tune_lock:
+                self.chunk_size = max(self.min_chunk, self.chunk_size // 2)
+            print("⚠ Lote de {} filas falló en {} ({}), se reintenta en dos partes".format(
+                len(chunk), self.table, e
+            ))
+            if len(chunk) == 1:
+                return self._send(chunk, attempt + 1)
+            half = len(chunk) // 2
+            return self._send(chunk[:half], attempt + 1) + self._send(chunk[half:], attempt + 1)
+        elapsed = time.perf_counter() - start
+        self._account(len(chunk), elapsed)
+        self._tune(len(chunk), elapsed)
+        return len(chunk)
+
+    def write(self, rows: list[dict]) -> int:
+        rows = dedupe_last(rows, self.on_conflict)
+        start = time.perf_counter()
+        pending = set()
+        written = 0
+        pos = 0
+        while pos < len(rows):
+            # Ventana acotada: el tamaño se lee en cada corte, así los lotes
+            # que ya volvieron ajustan el de los siguientes
+            if len(pending) >= self.max_concurrency:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                written += sum(f.result() for f in done)
+            size = self.chunk_size
+            pending.add(self._pool.submit(self._send, rows[pos : pos + size]))
+            pos += size
+        written += sum(f.result() for f in pending)
+        # Los lotes se solapan: cuenta el reloj de write(), no la suma de lotes
+        with self._stats_lock:
+            self.seconds += time.perf_counter() - start
+        return written
+
+    def _account(self, rows: int, seconds: float, requests: int = 1) -> None:
+        with self._stats_lock:
+            self.rows_written += rows
+            self.requests += requests
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
+
+
+class PostgresCopyLoader(_LoaderStats):
+    """
+    Carga directa a Postgres (con la URL de la base, p. ej. la de Supabase):
+    COPY a una tabla temporal y un solo INSERT ... SELECT DISTINCT ON ...
+    ON CONFLICT DO UPDATE por lote, en una transacción. Sin JSON por fila
+    ni round-trip por chunk.
+    """
+
+    mode = "copy"
+
+    def __init__(self, db_url: str, table: str, on_conflict: str = "id_producto", columns: list[str] | None = None):
+        _load_psycopg()
+        super().__init__()
+        self.table = table
+        self.on_conflict = on_conflict
+        self.columns = columns
+        self._conn = psycopg.connect(db_url, autocommit=False)
+        self._conn_lock = threading.Lock()
+
+    def _merge_statement(self, columns: list[str]):
+        cols = sql.SQL(", ").join(map(sql.Identifier, columns))
+        updates = sql.SQL(", ").join(
+            sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(c)) for c in columns if c != self.on_conflict
+        )
+        return sql.SQL(
+            "INSERT INTO {table} ({cols}) "
+            "SELECT DISTINCT ON ({key}) {cols} FROM _carga ORDER BY {key}, _orden DESC "
+            "ON CONFLICT ({key}) DO UPDATE SET {updates}"
+        ).format(
+            table=sql.Identifier(self.table),
+            cols=cols,
+            key=sql.Identifier(self.on_conflict),
+            updates=updates,
+        )
+
+    def write(self, rows: list[dict]) -> int:
+        if not rows:
+            return 0
+        columns = self.columns or list(rows[0])
+        cols = sql.SQL(", ").join(map(sql.Identifier, columns))
+        start = time.perf_counter()
+        with self._conn_lock, get_metrics().time(STAGE_UPSERT), self._transaction() as cur:
+            cur.execute(
+                sql.SQL(
+                    "CREATE TEMP TABLE _carga ON COMMIT DROP AS "
+                    "SELECT {cols} FROM {table} WITH NO DATA"
+                ).format(cols=cols, table=sql.Identifier(self.table))
+            )
+            cur.execute("ALTER TABLE _carga ADD COLUMN _orden bigint")
+            copy_cols = sql.SQL(", ").join(map(sql.Identifier, columns + ["_orden"]))
+            with cur.copy(sql.SQL("COPY _carga ({}) FROM STDIN").format(copy_cols)) as copy:
+                for orden, row in enumerate(rows):
+                    values = []
+                    for c in columns:
+                        value = row.get(c)
+                        # jsonb (precios_region) viaja como texto JSON
+                        if isinstance(value, (dict, list)):
+                            value = json.dumps(value, ensure_ascii=False)
+                        values.append(value)
+                    values.append(orden)
+                    copy.write_row(values)
+            cur.execute(self._merge_statement(columns))
+        self._account(len(rows), time.perf_counter() - start)
+        return len(rows)
+
+    def delete(self, keys: list) -> int:
+        """
+        Borra las filas cuya clave (on_conflict) está en keys, en una sola sentencia.
+        """
+        if not keys:
+            return 0
+        statement = sql.SQL("DELETE FROM {} WHERE {} = ANY(%s)").format(
+            sql.Identifier(self.table), sql.Identifier(self.on_conflict)
+        )
+        with self._conn_lock, get_metrics().time(STAGE_UPSERT), self._transaction() as cur:
+            cur.execute(statement, (list(keys),))
+        return len(keys)
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        """
+        Cursor en una transacción: commit al salir, rollback si algo falla.
+        Sin el rollback la conexión queda abortada y todos los lotes
+        siguientes fallan con InFailedSqlTransaction en vez del error real.
+        """
+        try:
+            with self._conn.cursor() as cur:
+                yield cur
+            self._conn.commit()
+        except BaseException:
+            try:
+                self._conn.rollback()
+            except psycopg.Error:
+                pass  # conexión caída: el error que importa es el original
+            raise
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def make_loader(supabase, table: str, on_conflict: str = "id_producto", chunk_size: int = 500, bulk: bool = False, db_url: str | None = None):
+    """
+    Elige el camino de carga:
+    - db_url: COPY directo a Postgres (PostgresCopyLoader),
+    - bulk: REST en paralelo con lotes auto-ajustados (ConcurrentRestLoader),
+    - si no, REST secuencial en chunks fijos (RestLoader).
+    """
+    if db_url:
+        return PostgresCopyLoader(db_url, table, on_conflict)
+    if bulk:
+        return ConcurrentRestLoader(supabase, table, on_conflict, chunk_size=chunk_size)
+    return RestLoader(supabase, table, on_conflict, chunk_size=chunk_size)
@@ -0,0 +1,97 @@
+import json
+import os
+import threading
+from collections import deque
+
+
+class RunCheckpoint:
+    """
+    Checkpoint local de una corrida de precios, para poder retomarla:
+    - cursor: último id_producto (en orden de envío) tal que todos los
+      anteriores ya terminaron,
+    - done: ids terminados después del cursor (se podan al avanzar el cursor).
+
+    Con ordered=False (modo incremental: el orden de envío sale del
+    historial y cambia entre corridas, así que un cursor no sirve para
+    retomar) no se lleva cursor y done guarda todos los ids terminados.
+
+    Un producto "termina" cuando su fila quedó guardada en Supabase o cuando
+    su ficha no cambió (caché); los errores HTTP/de red y las fichas sin
+    precios no terminan, así se reintentan al retomar. Se guarda de forma
+    atómica (archivo temporal + os.replace).
+    """
+
+    def __init__(self, path: str, resume: bool = False, ordered: bool = True):
+        self.path = path
+        self.ordered = ordered
+        self.cursor = None
+        self.done: set = set()
+        self._in_order: deque = deque()
+        self._lock = threading.Lock()
+
+        if resume and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self.cursor = data.get("cursor")
+                self.done = set(data.get("done", []))
+            except (OSError, ValueError):
+                print("⚠ Checkpoint ilegible, se parte de cero: {}".format(path))
+
+    def pending(self, rows, cursor_applied: bool = False):
+        """
+        Filtra (de forma perezosa) las filas ya terminadas en la corrida anterior.
+        Si el lector ya aplicó el cursor (cursor_applied=True), solo se
+        descartan los IDs del checkpoint; si no, `rows` debe ser una lista en el
+        mismo orden que la corrida anterior y se omite todo hasta el cursor.
+        """
+        if self.cursor is not None and not cursor_applied:
+            ids = [str(row.get("id_producto")) for row in rows]
+            if self.cursor in ids:
+                skip = ids.index(self.cursor) + 1
+                rows = rows[skip:]
+                print("✓ Retomando después de {} productos ya procesados".format(skip))
+            else:
+                # Cambió el catálogo o el orden: solo se omiten los IDs guardados
+                print("⚠ Cursor {} no encontrado; solo se omiten los IDs del checkpoint".format(self.cursor))
+
+        for row in rows:
+            if str(row.get("id_producto")) not in self.done:
+                yield row
+
+    def submitted(self, id_producto) -> None:
+        """
+        Registra el orden de envío (necesario para avanzar el cursor).
+        """
+        if not self.ordered:
+            return
+        with self._lock:
+            self._in_order.append(str(id_producto))
+
+    def completed(self, ids) -> None:
+        with self._lock:
+            self.done.update(str(i) for i in ids)
+            # Avanza el cursor mientras el primero en orden ya terminó
+            while self._in_order and self._in_order[0] in self.done:
+                self.cursor = self._in_order.popleft()
+                self.done.discard(self.cursor)
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            data = {"cursor": self.cursor, "done": sorted(self.done)}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def finish(self) -> None:
+        """
+        La corrida terminó completa: se borra el checkpoint.
+        """
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,52 @@
+"""
+Punto de entrada único de los scrapers de Convenio Marco:
+
+    python -m cm_cli listado    [opciones]   (proyectoMP.py)
+    python -m cm_cli precios    [opciones]   (proyectoMPlvl2.py)
+    python -m cm_cli refrescar  [opciones]   (refresh_precios_region.py)
+    python -m cm_cli pipeline   [opciones]   (pipeline.py)
+    python -m cm_cli historial  serie|movers (price_history.py)
+    python -m cm_cli indice     [opciones]   (price_index.py)
+
+Cada subcomando importa su módulo recién cuando se elige, y cada módulo
+carga sus dependencias pesadas (pandas, supabase, psycopg, pyarrow) solo en
+el camino que las usa: `refrescar` no paga pandas, `--help` no paga nada.
+Los scripts siguen funcionando solos (`python proyectoMP.py`).
+"""
+import importlib
+import sys
+
+# subcomando -> (módulo, función que recibe argv y prog, descripción)
+COMMANDS = {
+    "listado": ("proyectoMP", "cli", "listado de productos a cm_productos"),
+    "precios": ("proyectoMPlvl2", "cli", "precios mínimos por región a cm_precios_minimos"),
+    "refrescar": ("refresh_precios_region", "cli", "refresco de cm_precios_region"),
+    "pipeline": ("pipeline", "cli", "listado y fichas en una sola corrida"),
+    "historial": ("price_history", "main", "consultas al historial de precios en Parquet"),
+    "indice": ("price_index", "cli", "API local de consultas sobre precios por región"),
+}
+
+
+def usage() -> str:
+    lines = ["uso: python -m cm_cli <subcomando> [opciones]", "", "subcomandos:"]
+    for name, (module, _, description) in COMMANDS.items():
+        lines.append("  {:<11} {} ({}.py)".format(name, description, module))
+    lines.append("")
+    lines.append("Ayuda de cada uno: python -m cm_cli <subcomando> --help")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0 if argv else 2
+    name, rest = argv[0], argv[1:]
+    if name not in COMMANDS:
+        print("✗ Subcomando desconocido: {}\n".format(name), file=sys.stderr)
+        print(usage(), file=sys.stderr)
+        return 2
+    module_name, function, _ = COMMANDS[name]
+    entry = getattr(importlib.import_module(module_name), function)
+    entry(rest, prog="python -m cm_cli " + name)
+    return 0
@@ -0,0 +1,5 @@
+import sys
+
+from cm_cli import main
+
+sys.exit(main())
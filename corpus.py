@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import threading
+import zipfile
+from urllib.parse import urlsplit
+
+# Headers que vale la pena conservar para reproducir las respuestas
+_KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Retry-After")
+
+
+def request_key(url: str) -> str:
+    """
+    Clave de una respuesta en el corpus: path + query (sin host), para poder
+    servirla desde cualquier origen.
+    """
+    parts = urlsplit(url)
+    return parts.path + ("?" + parts.query if parts.query else "")
+
+
+class CorpusWriter:
+    """
+    Graba respuestas reales (listados y fichas) en un corpus comprimido:
+    un .zip con un archivo por respuesta y un manifest con URL, status y
+    headers. Si el corpus ya existe se agregan respuestas (cada corrida deja su
+    propio manifest-N.json), así el listado y las fichas pueden grabarse en
+    procesos distintos. Thread-safe; se cierra con close().
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        mode = "a" if os.path.exists(path) else "w"
+        self._zip = zipfile.ZipFile(path, mode, compression=zipfile.ZIP_DEFLATED, compresslevel=6)
+        existing = [n for n in self._zip.namelist() if n.startswith("manifest-")]
+        self._manifest_name = "manifest-{}.json".format(len(existing))
+        self._known = set(n for n in self._zip.namelist() if n.startswith("responses/"))
+        self._manifest: dict = {}
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def record(self, url: str, status: int, headers, body: bytes) -> None:
+        key = request_key(url)
+        name = "responses/" + hashlib.sha1(key.encode("utf-8")).hexdigest()
+        kept = {h: headers[h] for h in _KEPT_HEADERS if h in headers}
+        with self._lock:
+            if self._closed or name in self._known:
+                return
+            self._zip.writestr(name, body)
+            self._known.add(name)
+            self._manifest[key] = {"url": url, "status": status, "headers": kept, "file": name}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._zip.writestr(self._manifest_name, json.dumps(self._manifest, ensure_ascii=False))
+            self._zip.close()
+        print("✓ Corpus grabado: {} respuestas en {}".format(len(self._manifest), self.path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class CorpusReader:
+    """
+    Lee un corpus grabado por CorpusWriter. Los cuerpos se descomprimen
+    a pedido y se guardan en memoria.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._zip = zipfile.ZipFile(path, "r")
+        self.manifest: dict = {}
+        for name in sorted(n for n in self._zip.namelist() if n.startswith("manifest-")):
+            self.manifest.update(json.loads(self._zip.read(name)))
+        self._bodies: dict = {}
+        self._lock = threading.Lock()
+
+    def origins(self) -> set:
+        """
+        Orígenes (esquema + host) de las URLs grabadas.
+        """
+        origins = set()
+        for entry in self.manifest.values():
+            parts = urlsplit(entry["url"])
+            origins.add("{}://{}".format(parts.scheme, parts.netloc))
+        return origins
+
+    def get(self, key: str):
+        """
+        Retorna (status, headers, cuerpo) o None si la respuesta no está.
+        """
+        entry = self.manifest.get(key)
+        if entry is None:
+            return None
+        with self._lock:
+            body = self._bodies.get(key)
+            if body is None:
+                body = self._zip.read(entry["file"])
+                self._bodies[key] = body
+        return entry["status"], entry["headers"], body
@@ -0,0 +1,238 @@
+import glob
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+# Resultados posibles de ResponseCache.check()
+CACHE_MISS = "miss"  # contenido nuevo o distinto: hay que parsear y guardar
+CACHE_HIT = "hit"  # 200 pero mismo hash de contenido que la corrida anterior
+CACHE_REVALIDATED = "revalidated"  # el servidor respondió 304 Not Modified
+
+# Temporales de BodySpool más viejos que esto son restos de una corrida caída
+STALE_SPOOL_SECONDS = 24 * 3600
+
+
+def content_hash(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+class BodySpool:
+    """
+    Cuerpo de una ficha escrito comprimido a disco a medida que se lee (modo
+    streaming), con su hash calculado en el camino. Queda en un archivo
+    temporal hasta que ResponseCache.save() lo mueve a su lugar.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hash = None
+        self._hasher = hashlib.sha256()
+        self._file = gzip.open(path, "wb", compresslevel=6)
+
+    def write(self, chunk: bytes) -> None:
+        self._hasher.update(chunk)
+        self._file.write(chunk)
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+            self.hash = self._hasher.hexdigest()
+
+    def discard(self) -> None:
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class ResponseCache:
+    """
+    Caché persistente de fichas de producto, indexada por link:
+    - guarda ETag, Last-Modified y hash del contenido (más el HTML comprimido),
+    - arma los headers If-None-Match / If-Modified-Since de la siguiente corrida,
+    - desaloja por tamaño (primero lo usado hace más tiempo).
+
+    Las entradas nuevas quedan pendientes hasta save(), que se llama después
+    de guardar en Supabase: si la corrida se cae antes, no se marca como
+    "sin cambios" algo que nunca llegó a la base. Mientras tanto el cuerpo
+    ya está comprimido en un temporal en disco; en memoria solo queda la
+    metadata.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(directory, "index.json")
+        os.makedirs(directory, exist_ok=True)
+
+        self._entries: dict = {}
+        self._pending: dict = {}
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                print("⚠ Índice de caché ilegible, se parte de cero: {}".format(self.index_path))
+                self._entries = {}
+        self._remove_stale_spools()
+
+    def _remove_stale_spools(self) -> None:
+        cutoff = time.time() - STALE_SPOOL_SECONDS
+        for path in glob.glob(os.path.join(self.directory, "*", ".*.tmp")):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _key(link: str) -> str:
+        return hashlib.sha1(link.encode("utf-8")).hexdigest()
+
+    def _body_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".html.gz")
+
+    def conditional_headers(self, link: str) -> dict:
+        """
+        Headers condicionales para revalidar la ficha contra la corrida anterior.
+        """
+        with self._lock:
+            entry = self._entries.get(self._key(link))
+        if not entry:
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def check(self, link: str, status: int, body: bytes | None = None, body_hash: str | None = None) -> str:
+        """
+        Clasifica una respuesta como CACHE_REVALIDATED (304), CACHE_HIT
+        (mismo hash que la vez anterior) o CACHE_MISS (hay que parsear).
+        En modo streaming se pasa body_hash (ver BodySpool) en vez de body.
+        """
+        key = self._key(link)
+        if body_hash is None and body is not None:
+            body_hash = content_hash(body)
+        with self._lock:
+            entry = self._entries.get(key)
+            if status == 304 and entry:
+                entry["last_used"] = time.time()
+                result = CACHE_REVALIDATED
+            elif status == 200 and entry and body_hash is not None and entry.get("hash") == body_hash:
+                entry["last_used"] = time.time()
+                result = CACHE_HIT
+            else:
+                result = CACHE_MISS
+            self._counts[result] += 1
+        return result
+
+    def put(self, link: str, body: bytes, etag: str | None = None, last_modified: str | None = None) -> None:
+        """
+        Registra la ficha recién parseada. El cuerpo se escribe comprimido a
+        un temporal en el momento (igual que en modo streaming) y queda
+        pendiente hasta save().
+        """
+        spool = self.spool(link)
+        try:
+            spool.write(body)
+            spool.close()
+        except BaseException:
+            spool.discard()
+            raise
+        self.put_spooled(link, spool, etag=etag, last_modified=last_modified)
+
+    def spool(self, link: str) -> BodySpool:
+        """
+        BodySpool para leer la ficha de link en streaming.
+        """
+        key = self._key(link)
+        path = self._body_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return BodySpool(os.path.join(os.path.dirname(path), ".{}.{}.tmp".format(key, threading.get_ident())))
+
+    def put_spooled(self, link: str, spool: BodySpool, etag: str | None = None, last_modified: str | None = None) -> None:
+        """
+        Como put(), con el cuerpo ya comprimido en disco por un BodySpool.
+        """
+        with self._lock:
+            previous = self._pending.get(self._key(link))
+            if previous is not None and previous["spool_path"] != spool.path:
+                try:
+                    os.remove(previous["spool_path"])
+                except OSError:
+                    pass
+            self._pending[self._key(link)] = {
+                "link": link,
+                "etag": etag,
+                "last_modified": last_modified,
+                "hash": spool.hash,
+                "spool_path": spool.path,
+            }
+
+    def _evict(self) -> int:
+        total = sum(e.get("size", 0) for e in self._entries.values())
+        if total <= self.max_bytes:
+            return 0
+        evicted = 0
+        for key, entry in sorted(self._entries.items(), key=lambda kv: kv[1].get("last_used", 0)):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._body_path(key))
+            except OSError:
+                pass
+            total -= entry.get("size", 0)
+            del self._entries[key]
+            evicted += 1
+        return evicted
+
+    def save(self) -> None:
+        """
+        Escribe las entradas pendientes, desaloja por tamaño y guarda el índice
+        de forma atómica (archivo temporal + os.replace).
+        """
+        with self._lock:
+            now = time.time()
+            for key, pending in self._pending.items():
+                path = self._body_path(key)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(pending.pop("spool_path"), path)
+                pending["size"] = os.path.getsize(path)
+                pending["last_used"] = now
+                self._entries[key] = pending
+            self._pending.clear()
+
+            evicted = self._evict()
+            if evicted:
+                self._counts["evicted"] += evicted
+
+            tmp_path = self.index_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.index_path)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._counts)
+
+    def print_stats(self) -> None:
+        stats = self.stats()
+        print(
+            "Caché HTTP: {} hit | {} miss | {} revalidados (304) | {} desalojados".format(
+                stats.get(CACHE_HIT, 0),
+                stats.get(CACHE_MISS, 0),
+                stats.get(CACHE_REVALIDATED, 0),
+                stats.get("evicted", 0),
+            )
+        )
@@ -0,0 +1,282 @@
+import atexit
+import os
+import random
+import threading
+import time
+from collections import Counter
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from adaptive_concurrency import (
+    OUTCOME_OK,
+    OUTCOME_SERVER_ERROR,
+    OUTCOME_THROTTLED,
+)
+
+try:
+    import brotli  # noqa: F401  (urllib3 lo usa para decodificar "br")
+
+    _ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    _ACCEPT_ENCODING = "gzip, deflate"
+
+
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/91.0.4472.124 Safari/537.36"
+    ),
+    "Accept-Encoding": _ACCEPT_ENCODING,
+    "Connection": "keep-alive",
+}
+
+# Códigos que vale la pena reintentar (rate limit y errores del servidor)
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Interpreta el header Retry-After (segundos o fecha HTTP) y retorna
+    cuántos segundos esperar, o None si no viene o no se puede leer.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class HttpFetcher:
+    """
+    Capa única de descarga compartida por ambos scrapers:
+    - una requests.Session con pool de conexiones por host y keep-alive,
+    - negociación gzip/brotli,
+    - reintentos con backoff exponencial con jitter que respeta Retry-After,
+    - contadores por código de estado,
+    - opcionalmente, un AdaptiveConcurrency que decide cuántos requests
+      pueden estar en vuelo según latencia y errores observados,
+    - opcionalmente, un recorder (corpus.CorpusWriter) que graba cada
+      respuesta 200 para reproducir la corrida sin conexión (con stream=True,
+      al terminar de leer el cuerpo).
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 8,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        timeout: float = 30,
+        controller=None,
+        recorder=None,
+    ):
+        self.pool_size = pool_size
+        self.controller = controller
+        self.recorder = recorder
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=max(1, pool_size),
+            pool_block=True,
+            max_retries=0,  # los reintentos los manejamos nosotros
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def _count(self, key) -> None:
+        with self._lock:
+            self._counts[key] += 1
+
+    def _backoff(self, attempt: int, retry_after: float | None) -> float:
+        if retry_after is not None:
+            return min(self.backoff_max, retry_after)
+        # "Full jitter": espera aleatoria entre 0 y base * 2^intento
+        ceiling = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def get(
+        self,
+        url: str,
+        headers: dict | None = None,
+        timeout: float | None = None,
+        stream: bool = False,
+        bucket=None,
+    ):
+        """
+        GET con reintentos. Retorna la última respuesta obtenida (puede no ser 200
+        si se agotaron los reintentos). Si todos los intentos fallan por red,
+        relanza la última excepción.
+        Con stream=True el cuerpo no se descarga: quien llama lo lee por
+        chunks (iter_content) y cierra la respuesta.
+        Con un bucket (rate_limiter.TokenBucket), cada intento, reintentos
+        incluidos, consume un token antes de salir.
+        """
+        timeout = timeout if timeout is not None else self.timeout
+        last_exc = None
+
+        for attempt in range(self.max_retries + 1):
+            if bucket is not None:
+                bucket.acquire()
+            try:
+                response = self._send(url, headers, timeout, stream)
+            except requests.Timeout as e:
+                self._count("timeout")
+                last_exc = e
+                retry_after = None
+            except requests.ConnectionError as e:
+                self._count("connection_error")
+                last_exc = e
+                retry_after = None
+            else:
+                self._count(response.status_code)
+                if response.status_code not in RETRY_STATUSES:
+                    if self.recorder is not None and response.status_code == 200:
+                        if stream:
+                            self._record_stream(url, response)
+                        else:
+                            self.recorder.record(url, 200, response.headers, response.content)
+                    return response
+                if attempt == self.max_retries:
+                    return response
+                last_exc = None
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                response.close()
+
+            if attempt == self.max_retries:
+                break
+            self._count("retry")
+            time.sleep(self._backoff(attempt, retry_after))
+
+        raise last_exc
+
+    def _record_stream(self, url: str, response) -> None:
+        """
+        Graba una respuesta abierta con stream=True sin leerla aquí: envuelve
+        iter_content para guardar los chunks que consume quien llama y grabar
+        el cuerpo cuando termina de leerlo. Si la lectura se corta a medias,
+        no se graba nada.
+        """
+        iter_content = response.iter_content
+        recorder = self.recorder
+
+        def recording_iter_content(chunk_size=1, decode_unicode=False):
+            chunks = []
+            for chunk in iter_content(chunk_size, decode_unicode):
+                chunks.append(chunk.encode(response.encoding or "utf-8") if isinstance(chunk, str) else chunk)
+                yield chunk
+            recorder.record(url, 200, response.headers, b"".join(chunks))
+
+        response.iter_content = recording_iter_content
+
+    def _send(self, url: str, headers: dict | None, timeout: float, stream: bool = False):
+        if self.controller is None:
+            return self.session.get(url, headers=headers, timeout=timeout, stream=stream)
+
+        # Con control adaptativo, cada intento ocupa un cupo y reporta su resultado
+        with self.controller.slot() as slot:
+            response = self.session.get(url, headers=headers, timeout=timeout, stream=stream)
+            if response.status_code == 429:
+                slot.outcome = OUTCOME_THROTTLED
+                slot.retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            elif response.status_code >= 500:
+                slot.outcome = OUTCOME_SERVER_ERROR
+            else:
+                slot.outcome = OUTCOME_OK
+            return response
+
+    def stats(self) -> dict:
+        """
+        Copia de los contadores: códigos HTTP, timeouts, errores de conexión
+        y reintentos.
+        """
+        with self._lock:
+            return dict(self._counts)
+
+    def print_stats(self) -> None:
+        print_http_stats(self.stats())
+
+
+def print_http_stats(stats: dict) -> None:
+    """
+    Imprime los contadores de un fetcher (códigos HTTP, 429, 5xx, timeouts...).
+    """
+    if not stats:
+        return
+    codes = {k: v for k, v in stats.items() if isinstance(k, int)}
+    rate_limited = codes.get(429, 0)
+    server_errors = sum(v for k, v in codes.items() if 500 <= k < 600)
+    print("Respuestas HTTP por código: {}".format(dict(sorted(codes.items()))))
+    print(
+        "  429: {} | 5xx: {} | timeouts: {} | errores de conexión: {} | reintentos: {}".format(
+            rate_limited,
+            server_errors,
+            stats.get("timeout", 0),
+            stats.get("connection_error", 0),
+            stats.get("retry", 0),
+        )
+    )
+
+
+_fetcher = None
+_fetcher_lock = threading.Lock()
+_UNSET = object()
+
+
+def get_fetcher(pool_size=_UNSET, controller=_UNSET) -> HttpFetcher:
+    """
+    Retorna el HttpFetcher compartido del proceso, creándolo la primera vez
+    con un pool del tamaño indicado (normalmente, el número de workers) y,
+    si se entrega, un controlador de concurrencia adaptativo.
+
+    Sin argumentos retorna el fetcher que ya exista. Si se piden un
+    pool_size o un controller distintos a los del fetcher actual (p. ej. el
+    listado y luego las fichas en el mismo proceso), se crea uno nuevo con
+    esos parámetros, que conserva el recorder del anterior.
+
+    Con CM_RECORD_CORPUS=ruta.zip se graban las respuestas en ese corpus
+    (se cierra al terminar el proceso).
+    """
+    global _fetcher
+    with _fetcher_lock:
+        if _fetcher is not None:
+            if (pool_size is _UNSET or pool_size == _fetcher.pool_size) and (
+                controller is _UNSET or controller is _fetcher.controller
+            ):
+                return _fetcher
+            recorder = _fetcher.recorder
+        else:
+            recorder = None
+            corpus_path = os.environ.get("CM_RECORD_CORPUS")
+            if corpus_path:
+                from corpus import CorpusWriter
+
+                recorder = CorpusWriter(corpus_path)
+                atexit.register(recorder.close)
+                print("✓ Grabando respuestas en {}".format(corpus_path))
+        _fetcher = HttpFetcher(
+            pool_size=8 if pool_size is _UNSET else pool_size,
+            controller=None if controller is _UNSET else controller,
+            recorder=recorder,
+        )
+        return _fetcher
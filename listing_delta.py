@@ -0,0 +1,294 @@
+import hashlib
+import json
+import os
+import random
+import time
+
+# Productos por página del listado (product_list_limit)
+PAGE_SIZE = 25
+
+# Campos del listado que entran en la huella de cada producto
+DIGEST_FIELDS = ("ID_Producto", "Nombre_Producto", "Numero_Proveedores", "Link_Producto")
+
+
+def product_digest(product: dict) -> str:
+    """
+    Huella de un producto del listado: ID, nombre, número de proveedores y
+    link. Una página "no cambió" solo si coinciden las huellas de todos sus
+    productos, así que un cambio de nombre o de proveedores también la marca.
+    """
+    key = "\x1f".join(str(product.get(field) or "").strip() for field in DIGEST_FIELDS)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+
+
+def product_digests(products: list[dict]) -> list[str]:
+    return [product_digest(p) for p in products]
+
+
+def listing_fields(product: dict) -> dict:
+    """
+    Campos del listado que guarda el índice (DIGEST_FIELDS, sin la página).
+    """
+    return {field: product.get(field) for field in DIGEST_FIELDS}
+
+
+class ListingIndex:
+    """
+    Índice local del listado de la última corrida completa (o delta): los
+    productos en el orden del listado (campos de DIGEST_FIELDS), con sus IDs,
+    el total y la huella de cada uno (product_digest).
+
+    Es lo que el modo delta compara contra el sitio para saber qué páginas
+    cambiaron sin volver a recorrerlas todas; con los campos completos puede
+    además reubicar en cm_productos los productos que cambian de página.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._set([])
+        self.total = 0
+        self.saved_at = None
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self.total = data["total"]
+                self.saved_at = data.get("saved_at")
+                # Los índices anteriores solo tenían IDs y huellas: no sirven
+                # (recorrido completo, que guarda el formato nuevo)
+                fields = data.get("fields", DIGEST_FIELDS)
+                self._set([dict(zip(fields, row)) for row in data.get("products", [])])
+            except (OSError, ValueError, KeyError, TypeError):
+                print("⚠ Índice del listado ilegible, se hará un recorrido completo: {}".format(path))
+                self._set([])
+                self.total, self.saved_at = 0, None
+
+    def _set(self, products: list[dict]) -> None:
+        self.products = products
+        self.ids = [p["ID_Producto"] for p in products]
+        self.digests = product_digests(products)
+
+    @property
+    def usable(self) -> bool:
+        return bool(self.products) and len(self.products) == self.total
+
+    def age_days(self, now: float | None = None) -> float:
+        if not self.saved_at:
+            return float("inf")
+        return ((now or time.time()) - self.saved_at) / 86400.0
+
+    def expected_page(self, page: int, shift: int = 0) -> list[str] | None:
+        """
+        Huellas que tendría la página `page` si el listado solo se hubiera
+        corrido `shift` posiciones (inserciones - eliminaciones antes de ella).
+        None si la página cae fuera del índice.
+        """
+        start = (page - 1) * PAGE_SIZE - shift
+        if start < 0 or start >= len(self.digests):
+            return None
+        return self.digests[start : start + PAGE_SIZE]
+
+    def page_matches(self, page: int, digests: list[str], shift: int = 0) -> bool:
+        expected = self.expected_page(page, shift)
+        return expected is not None and expected == digests
+
+    def save(self, products: list[dict]) -> None:
+        """
+        Guarda el listado nuevo (productos en orden) de forma atómica
+        (archivo temporal + os.replace).
+        """
+        self._set([listing_fields(p) for p in products])
+        self.total = len(self.products)
+        self.saved_at = time.time()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "saved_at": self.saved_at,
+                    "total": self.total,
+                    "fields": list(DIGEST_FIELDS),
+                    "products": [[p[field] for field in DIGEST_FIELDS] for p in self.products],
+                },
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, self.path)
+
+
+def listing_complete(pages: list[list[dict]], total_products: int) -> bool:
+    """
+    True si las páginas traen el listado entero (ninguna página intermedia
+    falló o vino corta), para poder guardarlo como índice.
+    """
+    ids = [p["ID_Producto"] for products in pages for p in products]
+    if len(ids) != total_products or len(set(ids)) != len(ids):
+        return False
+    return all(len(products) == PAGE_SIZE for products in pages[:-1])
+
+
+class DeltaResult:
+    def __init__(self, products, changed_pages, upserts, moved, deletes, pages_fetched):
+        self.products = products  # listado nuevo completo, en orden (listing_fields)
+        self.ids = [p["ID_Producto"] for p in products]
+        self.digests = product_digests(products)  # huella de cada producto de ids
+        self.changed_pages = changed_pages  # (primera, última) re-descargadas
+        self.upserts = upserts  # productos de las páginas cambiadas
+        self.moved = moved  # productos de después de la zona que cambiaron de página
+        self.deletes = deletes  # IDs que ya no están en el listado
+        self.pages_fetched = pages_fetched
+
+
+def delta_crawl(index: ListingIndex, total_products: int, fetch_pages, verify_pages: int = 3, rng=None):
+    """
+    Ubica la zona del listado que cambió desde el índice y descarga solo esas
+    páginas. fetch_pages(páginas) -> {página: productos} (las descarga en
+    paralelo; None o [] si una página falló).
+
+    El listado está ordenado por nombre: con d = total nuevo - total del
+    índice, las páginas antes del cambio coinciden con el índice tal cual y
+    las de después coinciden corridas d posiciones. Ambas condiciones son
+    monótonas, así que la primera página cambiada y la última se encuentran
+    por búsqueda binaria (~2·log2(páginas) descargas). Después se revisan
+    verify_pages páginas al azar fuera de la zona; si alguna no coincide (hubo
+    cambios en más de una zona) retorna None y hay que hacer el recorrido
+    completo.
+
+    Con d = 0 no hay corrimiento que buscar: solo se revisan la primera, la
+    última y verify_pages páginas al azar. Los cambios que no mueven el total
+    (tantas altas como bajas en una misma zona, o solo cambios de nombre o de
+    proveedores) pasan inadvertidos si no caen en una página revisada; los
+    recoge el recorrido completo periódico.
+
+    Antes de retornar, el listado reconstruido se contrasta con todas las
+    páginas descargadas (búsqueda, muestreo y zona cambiada): cada una debe
+    traer la cantidad de productos que le toca y coincidir con su tramo del
+    listado nuevo. Cualquier diferencia significa que el resultado está mal
+    (p. ej. una página cortada o un segundo cambio que la búsqueda no vio) y
+    retorna None: nunca se borra a partir de un listado inconsistente.
+
+    Los productos de después de la zona no se vuelven a descargar, pero con
+    d != 0 cambian de posición: los que quedan en otra página van en
+    DeltaResult.moved con su página nueva (cm_productos guarda la página).
+
+    Retorna DeltaResult, o None si no se puede resolver con el índice.
+    """
+    rng = rng or random.Random()
+    total_pages = (total_products + PAGE_SIZE - 1) // PAGE_SIZE
+    shift = total_products - index.total
+    fetched: dict = {}
+
+    def get(pages):
+        pending = [p for p in dict.fromkeys(pages) if p not in fetched]
+        if pending:
+            for page, products in fetch_pages(pending).items():
+                if not products:
+                    raise _PageFailed(page)
+                fetched[page] = products
+        return [product_digests(fetched[page]) for page in pages]
+
+    def unchanged_before(page):
+        return index.page_matches(page, get([page])[0])
+
+    def unchanged_after(page):
+        return index.page_matches(page, get([page])[0], shift)
+
+    try:
+        if shift == 0:
+            # Sin corrimiento no hay nada que buscar: solo muestreo
+            sample = _sample(rng, range(1, total_pages + 1), verify_pages, always=(1, total_pages))
+            for page, digests in zip(sample, get(sample)):
+                if not index.page_matches(page, digests):
+                    return None
+            if not _consistent(index.digests, fetched, total_products):
+                return None
+            return DeltaResult(list(index.products), None, [], [], [], len(fetched))
+
+        # Primera página que ya no coincide con el índice (prefijo intacto)
+        lo, hi = 1, total_pages + 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if unchanged_before(mid):
+                lo = mid + 1
+            else:
+                hi = mid
+        first = lo
+        # Última página que no coincide con el índice corrido (sufijo intacto)
+        lo, hi = first - 1, total_pages
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if unchanged_after(mid):
+                hi = mid - 1
+            else:
+                lo = mid
+        last = max(lo, first)
+        last = min(last, total_pages)
+
+        # Verificación: los bordes de la zona (la página anterior coincide con
+        # el índice tal cual y la siguiente con el índice corrido; casi
+        # siempre ya se descargaron en la búsqueda) y páginas al azar fuera
+        outside = [p for p in range(1, total_pages + 1) if p < first or p > last]
+        sample = _sample(rng, outside, verify_pages, always=(first - 1, last + 1))
+        for page, digests in zip(sample, get(sample)):
+            if not index.page_matches(page, digests, 0 if page < first else shift):
+                return None
+
+        changed = list(range(first, last + 1))
+        get(changed)
+    except _PageFailed as e:
+        print("⚠ Falló la página {} durante el recorrido delta".format(e.page))
+        return None
+
+    upserts = [p for page in changed for p in fetched[page]]
+    head_end = (first - 1) * PAGE_SIZE
+    tail_start = last * PAGE_SIZE - shift if last < total_pages else len(index.products)
+    tail = index.products[tail_start:]
+    products = index.products[:head_end] + [listing_fields(p) for p in upserts] + tail
+    ids = [p["ID_Producto"] for p in products]
+    if len(ids) != total_products or len(set(ids)) != len(ids):
+        return None
+    if not _consistent(product_digests(products), fetched, total_products):
+        return None
+
+    # Los productos de después de la zona no cambian, pero se corren `shift`
+    # posiciones: los que cruzan un borde de página necesitan su página nueva
+    moved = []
+    for offset, product in enumerate(tail):
+        new_page = (last * PAGE_SIZE + offset) // PAGE_SIZE + 1
+        if new_page != (tail_start + offset) // PAGE_SIZE + 1:
+            moved.append(dict(product, Pagina=new_page))
+
+    current = set(ids)
+    deletes = [i for i in index.ids if i not in current]
+    return DeltaResult(products, (first, last), upserts, moved, deletes, len(fetched))
+
+
+def _consistent(digests: list[str], fetched: dict, total_products: int) -> bool:
+    """
+    True si cada página descargada trae la cantidad de productos que le toca
+    según el total y coincide con su tramo del listado reconstruido.
+    """
+    for page, products in fetched.items():
+        start = (page - 1) * PAGE_SIZE
+        expected_count = min(PAGE_SIZE, total_products - start)
+        if len(products) != expected_count:
+            return False
+        if product_digests(products) != digests[start : start + PAGE_SIZE]:
+            return False
+    return True
+
+
+class _PageFailed(Exception):
+    def __init__(self, page):
+        super().__init__(page)
+        self.page = page
+
+
+def _sample(rng, pages, k, always=()):
+    pages = list(pages)
+    picked = [p for p in always if p in pages]
+    rest = [p for p in pages if p not in picked]
+    picked.extend(rng.sample(rest, min(k, len(rest))))
+    return picked
@@ -0,0 +1,239 @@
+import functools
+import importlib.util
+import os
+import re
+
+# Backends opcionales: se usa el más rápido disponible
+try:
+    from selectolax.lexbor import LexborHTMLParser as _SelectolaxParser
+except ImportError:
+    try:  # selectolax < 0.3.13 solo trae el backend Modest
+        from selectolax.parser import HTMLParser as _SelectolaxParser
+    except ImportError:
+        _SelectolaxParser = None
+
+try:
+    import lxml.html as _lxml_html
+    from lxml import etree as _lxml_etree
+except ImportError:
+    _lxml_html = None
+    _lxml_etree = None
+
+# bs4 es solo el respaldo y su importación es la más cara: se importa recién
+# si se llega a usar
+_HAS_BS4 = importlib.util.find_spec("bs4") is not None
+
+
+# Cada <li> de producto tiene las clases "item product product-item". Se
+# comparan como conjunto de clases (como un selector CSS), no como el texto
+# exacto del atributo: así los tres backends coinciden aunque cambien el
+# orden o los espacios
+_PRODUCT_CLASSES = ("item", "product", "product-item")
+
+# Regex precompiladas (compartidas por todos los backends)
+_SELLERS_RE = re.compile(r"(\d+)")  # "78 proveedores" -> "78"
+_PRODUCT_ID_RE = re.compile(r"ID\s+(\d+)")  # "ID 123456" -> "123456"
+
+
+def _build_record(page_num, name, link, sellers_text, id_text) -> dict:
+    """
+    Arma el registro de un producto del listado a partir de los textos crudos.
+    """
+    num_providers = ""
+    if sellers_text is not None:
+        match = _SELLERS_RE.search(sellers_text.strip())
+        if match:
+            num_providers = match.group(1)
+
+    product_id = ""
+    if id_text is not None:
+        match = _PRODUCT_ID_RE.search(id_text.strip())
+        if match:
+            product_id = match.group(1)
+
+    return {
+        "ID_Producto": product_id,
+        "Nombre_Producto": name.strip() if name is not None else "",
+        "Numero_Proveedores": num_providers,
+        "Link_Producto": link or "",
+        "Pagina": page_num,
+    }
+
+
+# --- BeautifulSoup (html.parser): el camino original, como respaldo ---
+
+def _parse_listing_bs4(content, page_num: int) -> list[dict]:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, "html.parser")
+    products_data: list[dict] = []
+
+    for product in soup.select(_CSS_PRODUCTS):
+        try:
+            name_elem = product.find("a", class_="product-item-link")
+            sellers_elem = product.find("div", class_="sellers-count")
+            id_elem = product.find("div", class_="product-id-top")
+            products_data.append(
+                _build_record(
+                    page_num,
+                    name_elem.get_text() if name_elem else None,
+                    name_elem.get("href", "") if name_elem else "",
+                    sellers_elem.get_text() if sellers_elem else None,
+                    id_elem.get_text() if id_elem else None,
+                )
+            )
+        except Exception as e:
+            print(f"Error al procesar un producto en página {page_num}: {e}")
+            continue
+
+    return products_data
+
+
+def _parse_total_bs4(content) -> int | None:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, "html.parser")
+    toolbar_spans = soup.find_all("span", class_="toolbar-number")
+    if len(toolbar_spans) >= 2:
+        return int(toolbar_spans[1].get_text().strip())
+    return None
+
+
+# --- lxml con XPath precompilados ---
+
+def _has_class(name: str) -> str:
+    return 'contains(concat(" ", normalize-space(@class), " "), " {} ")'.format(name)
+
+
+if _lxml_etree is not None:
+    _X_PRODUCTS = _lxml_etree.XPath("//li" + "".join("[{}]".format(_has_class(c)) for c in _PRODUCT_CLASSES))
+    _X_NAME = _lxml_etree.XPath(".//a[{}]".format(_has_class("product-item-link")))
+    _X_SELLERS = _lxml_etree.XPath(".//div[{}]".format(_has_class("sellers-count")))
+    _X_ID = _lxml_etree.XPath(".//div[{}]".format(_has_class("product-id-top")))
+    _X_TOOLBAR = _lxml_etree.XPath("//span[{}]".format(_has_class("toolbar-number")))
+
+
+def _first(xpath, node):
+    found = xpath(node)
+    return found[0] if found else None
+
+
+def _parse_listing_lxml(content, page_num: int) -> list[dict]:
+    tree = _lxml_html.fromstring(content)
+    products_data: list[dict] = []
+
+    for product in _X_PRODUCTS(tree):
+        try:
+            name_elem = _first(_X_NAME, product)
+            sellers_elem = _first(_X_SELLERS, product)
+            id_elem = _first(_X_ID, product)
+            products_data.append(
+                _build_record(
+                    page_num,
+                    name_elem.text_content() if name_elem is not None else None,
+                    name_elem.get("href", "") if name_elem is not None else "",
+                    sellers_elem.text_content() if sellers_elem is not None else None,
+                    id_elem.text_content() if id_elem is not None else None,
+                )
+            )
+        except Exception as e:
+            print(f"Error al procesar un producto en página {page_num}: {e}")
+            continue
+
+    return products_data
+
+
+def _parse_total_lxml(content) -> int | None:
+    toolbar_spans = _X_TOOLBAR(_lxml_html.fromstring(content))
+    if len(toolbar_spans) >= 2:
+        return int(toolbar_spans[1].text_content().strip())
+    return None
+
+
+# --- selectolax (Lexbor) con selectores CSS ---
+
+_CSS_PRODUCTS = "li." + ".".join(_PRODUCT_CLASSES)
+_CSS_NAME = "a.product-item-link"
+_CSS_SELLERS = "div.sellers-count"
+_CSS_ID = "div.product-id-top"
+_CSS_TOOLBAR = "span.toolbar-number"
+
+
+def _parse_listing_selectolax(content, page_num: int) -> list[dict]:
+    tree = _SelectolaxParser(content)
+    products_data: list[dict] = []
+
+    for product in tree.css(_CSS_PRODUCTS):
+        try:
+            name_elem = product.css_first(_CSS_NAME)
+            sellers_elem = product.css_first(_CSS_SELLERS)
+            id_elem = product.css_first(_CSS_ID)
+            products_data.append(
+                _build_record(
+                    page_num,
+                    name_elem.text(deep=True) if name_elem is not None else None,
+                    (name_elem.attributes.get("href") or "") if name_elem is not None else "",
+                    sellers_elem.text(deep=True) if sellers_elem is not None else None,
+                    id_elem.text(deep=True) if id_elem is not None else None,
+                )
+            )
+        except Exception as e:
+            print(f"Error al procesar un producto en página {page_num}: {e}")
+            continue
+
+    return products_data
+
+
+def _parse_total_selectolax(content) -> int | None:
+    toolbar_spans = _SelectolaxParser(content).css(_CSS_TOOLBAR)
+    if len(toolbar_spans) >= 2:
+        return int(toolbar_spans[1].text(deep=True).strip())
+    return None
+
+
+# Nombre -> (parse_listing, parse_total, disponible)
+BACKENDS = {
+    "selectolax": (_parse_listing_selectolax, _parse_total_selectolax, _SelectolaxParser is not None),
+    "lxml": (_parse_listing_lxml, _parse_total_lxml, _lxml_html is not None),
+    "bs4": (_parse_listing_bs4, _parse_total_bs4, _HAS_BS4),
+}
+
+
+def available_backends() -> list[str]:
+    return [name for name, (_, _, ok) in BACKENDS.items() if ok]
+
+
+@functools.lru_cache(maxsize=None)
+def _resolve_backend(name: str | None) -> str:
+    available = available_backends()
+    if not available:
+        raise RuntimeError("No hay parser HTML instalado (selectolax, lxml o beautifulsoup4).")
+    if name:
+        if name not in BACKENDS:
+            raise ValueError("Parser desconocido: {} (opciones: {})".format(name, ", ".join(BACKENDS)))
+        if name in available:
+            return name
+        print("⚠ Parser {} no instalado, se usa {}".format(name, available[0]))
+    return available[0]
+
+
+def get_backend(name: str | None = None) -> str:
+    """
+    Backend a usar: el pedido (o CM_LISTING_PARSER) si está instalado; si no,
+    el más rápido disponible (selectolax > lxml > bs4).
+    """
+    return _resolve_backend(name or os.environ.get("CM_LISTING_PARSER"))
+
+
+def parse_listing(content, page_num: int, backend: str | None = None) -> list[dict]:
+    """
+    Extrae los productos de una página del listado (bytes o str).
+    """
+    return BACKENDS[get_backend(backend)][0](content, page_num)
+
+
+def parse_total_products(content, backend: str | None = None) -> int | None:
+    """
+    Extrae el total de productos del toolbar del listado.
+    """
+    return BACKENDS[get_backend(backend)][1](content)
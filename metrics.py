@@ -0,0 +1,282 @@
+import bisect
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+# Etapas de una ficha de producto
+STAGE_FETCH = "fetch"
+STAGE_EXTRACT = "extract"
+STAGE_COMPUTE = "compute"
+STAGE_UPSERT = "upsert"
+
+# Límites superiores (segundos) de los buckets de los histogramas
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+class _Shard:
+    """
+    Histogramas y contadores de un solo thread: solo ese thread los escribe,
+    así el camino caliente no toma locks.
+    """
+
+    def __init__(self, n_buckets):
+        self.n_buckets = n_buckets
+        self.buckets: dict = {}  # etapa -> conteos por bucket (+1 por el "+Inf")
+        self.sums: Counter = Counter()
+        self.maxes: dict = {}
+        self.counters: Counter = Counter()
+
+    def observe(self, stage, seconds, pos):
+        counts = self.buckets.get(stage)
+        if counts is None:
+            counts = self.buckets[stage] = [0] * (self.n_buckets + 1)
+        counts[pos] += 1
+        self.sums[stage] += seconds
+        if seconds > self.maxes.get(stage, 0.0):
+            self.maxes[stage] = seconds
+
+
+def _quantile(bounds, counts, q):
+    """
+    Estima el cuantil q interpolando dentro del bucket (como histogram_quantile).
+    """
+    total = sum(counts)
+    if not total:
+        return 0.0
+    rank = q * total
+    seen = 0
+    for i, c in enumerate(counts):
+        if c and seen + c >= rank:
+            lower = bounds[i - 1] if i > 0 else 0.0
+            if i >= len(bounds):
+                return lower
+            return lower + (bounds[i] - lower) * (rank - seen) / c
+        seen += c
+    return bounds[-1]
+
+
+class _Timer:
+    __slots__ = ("metrics", "stage", "_start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self._start)
+        return False
+
+
+class RunMetrics:
+    """
+    Tiempos por etapa (fetch, extract, compute, upsert...) y contadores de una
+    corrida, agregados entre workers:
+    - cada thread escribe en su propio shard (threading.local), sin locks,
+    - snapshot() suma los shards al momento de reportar,
+    - export() deja un resumen JSON y, opcionalmente, un textfile de Prometheus,
+    - start_progress() escribe snapshots periódicos (JSON por línea) a un archivo.
+    """
+
+    def __init__(self, pipeline: str, buckets=DEFAULT_BUCKETS):
+        self.pipeline = pipeline
+        self.bounds = tuple(buckets)
+        self.started_at = time.time()
+        self._start = time.monotonic()
+        self._local = threading.local()
+        self._shards: list = []
+        self._shards_lock = threading.Lock()  # solo al crear el shard de un thread
+        self.gauges: dict = {}
+        self._progress = None
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard(len(self.bounds))
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def observe(self, stage: str, seconds: float) -> None:
+        self._shard().observe(stage, seconds, bisect.bisect_left(self.bounds, seconds))
+
+    def time(self, stage: str) -> _Timer:
+        """
+        Context manager: `with metrics.time(STAGE_FETCH): ...`.
+        """
+        return _Timer(self, stage)
+
+    def count(self, name: str, n: int = 1) -> None:
+        self._shard().counters[name] += n
+
+    def set_gauge(self, name: str, value) -> None:
+        self.gauges[name] = value
+
+    def snapshot(self) -> dict:
+        with self._shards_lock:
+            shards = list(self._shards)
+
+        buckets: dict = {}
+        sums: Counter = Counter()
+        maxes: dict = {}
+        counters: Counter = Counter()
+        for shard in shards:
+            for stage, counts in list(shard.buckets.items()):
+                merged = buckets.setdefault(stage, [0] * (len(self.bounds) + 1))
+                for i, c in enumerate(counts):
+                    merged[i] += c
+            sums.update(dict(shard.sums))
+            for stage, value in list(shard.maxes.items()):
+                maxes[stage] = max(maxes.get(stage, 0.0), value)
+            counters.update(dict(shard.counters))
+
+        elapsed = time.monotonic() - self._start
+        stages = {}
+        for stage, counts in buckets.items():
+            n = sum(counts)
+            top = maxes.get(stage, 0.0)
+            stages[stage] = {
+                "count": n,
+                "sum_s": sums[stage],
+                "mean_s": sums[stage] / n if n else 0.0,
+                # La interpolación no puede pasar del máximo observado
+                "p50_s": min(top, _quantile(self.bounds, counts, 0.50)),
+                "p95_s": min(top, _quantile(self.bounds, counts, 0.95)),
+                "p99_s": min(top, _quantile(self.bounds, counts, 0.99)),
+                "max_s": top,
+                "per_s": n / elapsed if elapsed > 0 else 0.0,
+                "buckets": counts,
+            }
+        return {
+            "pipeline": self.pipeline,
+            "started_at": self.started_at,
+            "ts": time.time(),
+            "elapsed_s": elapsed,
+            "stages": stages,
+            "counters": dict(counters),
+            "gauges": dict(self.gauges),
+        }
+
+    def print_summary(self, snapshot: dict | None = None) -> None:
+        snapshot = snapshot or self.snapshot()
+        print("Tiempos por etapa ({}, {:.1f}s):".format(self.pipeline, snapshot["elapsed_s"]))
+        for stage, s in snapshot["stages"].items():
+            print("  {:<10} n={:<7} total={:>8.1f}s p50={:.3f}s p95={:.3f}s p99={:.3f}s máx={:.3f}s".format(
+                stage, s["count"], s["sum_s"], s["p50_s"], s["p95_s"], s["p99_s"], s["max_s"]
+            ))
+        if snapshot["counters"]:
+            print("  contadores: {}".format(dict(sorted(snapshot["counters"].items()))))
+
+    def export(self, json_path: str | None = None, prom_path: str | None = None) -> dict:
+        """
+        Escribe el resumen final (JSON y/o textfile de Prometheus) y lo retorna.
+        """
+        self.stop_progress()
+        snapshot = self.snapshot()
+        if json_path:
+            _write_atomic(json_path, json.dumps(snapshot, ensure_ascii=False, indent=2))
+        if prom_path:
+            _write_atomic(prom_path, self.prometheus_text(snapshot))
+        return snapshot
+
+    def prometheus_text(self, snapshot: dict | None = None) -> str:
+        snapshot = snapshot or self.snapshot()
+        label = 'pipeline="{}"'.format(self.pipeline)
+        lines = [
+            "# HELP cm_scraper_stage_seconds Duración de cada etapa por producto.",
+            "# TYPE cm_scraper_stage_seconds histogram",
+        ]
+        for stage, s in snapshot["stages"].items():
+            cumulative = 0
+            for bound, c in zip(self.bounds + (float("inf"),), s["buckets"]):
+                cumulative += c
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append('cm_scraper_stage_seconds_bucket{{{},stage="{}",le="{}"}} {}'.format(
+                    label, stage, le, cumulative
+                ))
+            lines.append('cm_scraper_stage_seconds_sum{{{},stage="{}"}} {}'.format(label, stage, s["sum_s"]))
+            lines.append('cm_scraper_stage_seconds_count{{{},stage="{}"}} {}'.format(label, stage, s["count"]))
+        lines.append("# TYPE cm_scraper_events_total counter")
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append('cm_scraper_events_total{{{},event="{}"}} {}'.format(label, name, value))
+        lines.append("# TYPE cm_scraper_run_seconds gauge")
+        lines.append("cm_scraper_run_seconds{{{}}} {}".format(label, snapshot["elapsed_s"]))
+        lines.append("# TYPE cm_scraper_last_run_timestamp_seconds gauge")
+        lines.append("cm_scraper_last_run_timestamp_seconds{{{}}} {}".format(label, snapshot["ts"]))
+        return "\n".join(lines) + "\n"
+
+    def start_progress(self, path: str, interval: float = 30.0) -> None:
+        """
+        Cada `interval` segundos agrega un snapshot (sin buckets) a `path`,
+        una línea JSON por snapshot.
+        """
+        if self._progress is not None:
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                self._write_progress(path)
+            self._write_progress(path)
+
+        thread = threading.Thread(target=loop, name="metrics-progress", daemon=True)
+        self._progress = (stop, thread)
+        thread.start()
+
+    def stop_progress(self) -> None:
+        if self._progress is None:
+            return
+        stop, thread = self._progress
+        self._progress = None
+        stop.set()
+        thread.join()
+
+    def _write_progress(self, path: str) -> None:
+        snapshot = self.snapshot()
+        for s in snapshot["stages"].values():
+            del s["buckets"]
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(snapshot, ensure_ascii=False) + "\n")
+
+
+def _write_atomic(path: str, text: str) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+_metrics = None
+
+
+def new_run(pipeline: str) -> RunMetrics:
+    """
+    Empieza las métricas de una corrida (reemplaza las anteriores del proceso).
+    """
+    global _metrics
+    _metrics = RunMetrics(pipeline)
+    return _metrics
+
+
+def get_metrics() -> RunMetrics:
+    """
+    Métricas de la corrida en curso (las crea si nadie llamó a new_run).
+    """
+    global _metrics
+    if _metrics is None:
+        _metrics = RunMetrics("scraper")
+    return _metrics
@@ -0,0 +1,183 @@
+import json
+import re
+
+from proyectoMPlvl2 import _JSON_DECODER, _decode_legacy, _keys_pattern
+
+# Bytes por lectura del cuerpo de la ficha
+CHUNK_SIZE = 64 * 1024
+
+_BRACE_BYTES_RE = re.compile(rb"[{}]")
+_PRODUCT_ID_BYTES_RE = re.compile(rb'"productId"\s*:\s*"(\d+)"')
+# Lo que se guarda del final de cada chunk para encontrar productId partido
+_PRODUCT_ID_OVERLAP = 128
+
+
+class _BlobCapture:
+    """
+    Captura los bytes de un objeto JSON que empieza en la primera '{' después
+    de su clave, a medida que llegan los chunks.
+
+    No sigue strings byte a byte: cuenta llaves por chunk (en C) y, cuando la
+    cuenta vuelve a cero, valida el candidato con json.loads. Si el candidato
+    no es JSON válido (llaves dentro de strings, o un blob que solo entiende
+    el parseo legacy) sigue capturando hasta el final del documento, y ahí se
+    decodifica igual que extract_json_objects (raw_decode desde la llave y,
+    si falla, el parseo legacy).
+    """
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        self.parts: list[bytes] = []
+        self.started = False
+        self.done = False
+        self.value = None
+        self._depth = 0
+        self._until_eof = False
+
+    def feed(self, data: bytes, start: int = 0) -> None:
+        if self.done:
+            return
+        if not self.started:
+            start = data.find(b"{", start)
+            if start == -1:
+                return
+            self.started = True
+        if self._until_eof:
+            self.parts.append(data[start:] if start else data)
+            return
+
+        for match in _BRACE_BYTES_RE.finditer(data, start):
+            self._depth += 1 if match.group() == b"{" else -1
+            if self._depth == 0:
+                self.parts.append(data[start : match.end()])
+                self._try_candidate(data, match.end())
+                return
+        self.parts.append(data[start:] if start else data)
+
+    def _try_candidate(self, data: bytes, end: int) -> None:
+        blob = b"".join(self.parts)
+        self.parts = [blob]
+        try:
+            self.value = json.loads(blob.decode(self.encoding, errors="replace"))
+            self.done = True
+            self.parts = []
+        except ValueError:
+            # Puede ser JSON válido más largo (llaves en strings) o un blob
+            # legacy: se decide con el resto del documento
+            self._until_eof = True
+            self.parts.append(data[end:])
+
+    def finish(self):
+        """
+        Fin del documento: decodifica lo capturado si no se resolvió antes.
+        """
+        if self.done or not self.started:
+            return self.value
+        text = b"".join(self.parts).decode(self.encoding, errors="replace")
+        self.parts = []
+        self.done = True
+        try:
+            self.value, _ = _JSON_DECODER.raw_decode(text, 0)
+        except json.JSONDecodeError:
+            self.value = _decode_legacy(text, 0)
+        return self.value
+
+
+class ProductPage:
+    """
+    Lo que queda de una ficha leída en streaming: los objetos JSON pedidos
+    (ya decodificados), el productId y, si había caché, el spool con el
+    cuerpo comprimido en disco y su hash. El resto del HTML ya se descartó.
+    """
+
+    def __init__(self, blobs: dict, product_id, headers: dict, spool=None, size: int = 0):
+        self.blobs = blobs
+        self.product_id = product_id
+        self.headers = headers
+        self.spool = spool
+        self.size = size
+
+    @property
+    def body_hash(self):
+        return self.spool.hash if self.spool is not None else None
+
+    def discard(self) -> None:
+        if self.spool is not None:
+            self.spool.discard()
+            self.spool = None
+
+
+class ProductPageReader:
+    """
+    Lee el cuerpo de una ficha por chunks y extrae solo los objetos JSON de
+    key_names (misma semántica que extract_json_objects: primera aparición de
+    cada clave, objeto desde la '{' siguiente) y el productId. Cada chunk se
+    suelta apenas se procesa: la memoria por ficha es la de los blobs, no la
+    del HTML completo (ni su copia como str).
+    """
+
+    def __init__(self, key_names, encoding: str | None = None, spool=None):
+        self.key_names = tuple(key_names)
+        self.encoding = encoding or "utf-8"
+        self.spool = spool
+        self.size = 0
+        self._keys_re = re.compile(_keys_pattern(self.key_names).pattern.encode("ascii"))
+        self._overlap = max(len(k) for k in self.key_names) - 1
+        self._captures: dict = {}
+        self._carry = b""
+        self._pid_carry = b""
+        self.product_id = None
+
+    def feed(self, chunk: bytes) -> None:
+        if not chunk:
+            return
+        self.size += len(chunk)
+        if self.spool is not None:
+            self.spool.write(chunk)
+
+        for capture in self._captures.values():
+            capture.feed(chunk)
+
+        if len(self._captures) < len(self.key_names):
+            window = self._carry + chunk
+            for match in self._keys_re.finditer(window):
+                key = match.group().decode("ascii")
+                if key not in self._captures:
+                    capture = self._captures[key] = _BlobCapture(self.encoding)
+                    capture.feed(window, match.end())
+            self._carry = window[-self._overlap :] if self._overlap else b""
+
+        if self.product_id is None:
+            window = self._pid_carry + chunk
+            match = _PRODUCT_ID_BYTES_RE.search(window)
+            if match:
+                self.product_id = match.group(1).decode("ascii")
+                self._pid_carry = b""
+            else:
+                self._pid_carry = window[-_PRODUCT_ID_OVERLAP:]
+
+    def close(self, headers: dict | None = None) -> ProductPage:
+        blobs = dict.fromkeys(self.key_names)
+        for key, capture in self._captures.items():
+            blobs[key] = capture.finish()
+        if self.spool is not None:
+            self.spool.close()
+        return ProductPage(blobs, self.product_id, headers or {}, self.spool, self.size)
+
+
+def read_product_page(response, key_names, spool=None, chunk_size: int = CHUNK_SIZE) -> ProductPage:
+    """
+    Consume una respuesta de requests abierta con stream=True y retorna la
+    ProductPage. Cierra la respuesta (la conexión vuelve al pool).
+    """
+    reader = ProductPageReader(key_names, encoding=response.encoding, spool=spool)
+    try:
+        for chunk in response.iter_content(chunk_size):
+            reader.feed(chunk)
+    except Exception:
+        if spool is not None:
+            spool.discard()
+        raise
+    finally:
+        response.close()
+    return reader.close({k: response.headers.get(k) for k in ("ETag", "Last-Modified")})
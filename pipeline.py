@@ -0,0 +1,433 @@
+import argparse
+import os
+import queue
+import threading
+import time
+
+from bulk_loader import make_loader
+from http_cache import ResponseCache
+from http_session import get_fetcher, print_http_stats
+from listing_delta import PAGE_SIZE
+from metrics import new_run
+from proyectoMP import build_product_records, get_total_products, listing_url, scrape_products_page
+from proyectoMPlvl2 import fetch_product_page, polite_pause, price_row_from_response
+from rate_limiter import TokenBucket
+from scrape_priority import ScrapeHistory
+from streaming_upsert import UNCHANGED, BatchUpserter
+from supabase_client import get_supabase_client
+
+# Marca de fin de cola: cada etapa la propaga a la siguiente al terminar
+_FIN = object()
+
+
+class StageStats:
+    """
+    Contadores de una etapa: ítems procesados y tiempo de sus threads
+    trabajando, esperando entrada (la etapa anterior no da abasto) y
+    esperando lugar en la cola de salida (la etapa siguiente no da abasto).
+    """
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy_s = 0.0
+        self.wait_in_s = 0.0
+        self.wait_out_s = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, items=0, busy=0.0, wait_in=0.0, wait_out=0.0):
+        with self._lock:
+            self.items += items
+            self.busy_s += busy
+            self.wait_in_s += wait_in
+            self.wait_out_s += wait_out
+
+    def snapshot(self, elapsed: float) -> dict:
+        with self._lock:
+            capacity = elapsed * self.workers if elapsed > 0 else 0.0
+            return {
+                "items": self.items,
+                "por_segundo": self.items / elapsed if elapsed > 0 else 0.0,
+                "ocupado_pct": 100.0 * self.busy_s / capacity if capacity else 0.0,
+                "espera_entrada_pct": 100.0 * self.wait_in_s / capacity if capacity else 0.0,
+                "espera_salida_pct": 100.0 * self.wait_out_s / capacity if capacity else 0.0,
+            }
+
+
+class StageQueue:
+    """
+    queue.Queue acotada (backpressure: put bloquea si está llena) que anota
+    el tiempo de espera en las StageStats de quien pone y de quien saca, y
+    muestrea su profundidad para el reporte.
+    """
+
+    def __init__(self, name: str, maxsize: int):
+        self.name = name
+        self.maxsize = maxsize
+        self._queue = queue.Queue(maxsize)
+        self.samples = 0
+        self.depth_sum = 0
+        self.depth_max = 0
+
+    def put(self, item, stats: StageStats) -> None:
+        start = time.perf_counter()
+        self._queue.put(item)
+        stats.add(wait_out=time.perf_counter() - start)
+
+    def get(self, stats: StageStats):
+        start = time.perf_counter()
+        item = self._queue.get()
+        stats.add(wait_in=time.perf_counter() - start)
+        return item
+
+    def close(self, consumers: int) -> None:
+        """
+        Avisa el fin a cada uno de los threads que consumen la cola.
+        """
+        for _ in range(consumers):
+            self._queue.put(_FIN)
+
+    def sample(self) -> int:
+        depth = self._queue.qsize()
+        self.samples += 1
+        self.depth_sum += depth
+        self.depth_max = max(self.depth_max, depth)
+        return depth
+
+    def snapshot(self) -> dict:
+        return {
+            "capacidad": self.maxsize,
+            "actual": self._queue.qsize(),
+            "media": self.depth_sum / self.samples if self.samples else 0.0,
+            "maxima": self.depth_max,
+        }
+
+
+def _start_stage(stats: StageStats, work, on_done):
+    """
+    Lanza stats.workers threads con `work` y, cuando terminan todos, llama a
+    on_done (que propaga el fin a la etapa siguiente).
+    """
+    threads = [
+        threading.Thread(target=work, name="{}-{}".format(stats.name, i), daemon=True)
+        for i in range(stats.workers)
+    ]
+    for t in threads:
+        t.start()
+
+    def close():
+        for t in threads:
+            t.join()
+        on_done()
+
+    closer = threading.Thread(target=close, name="{}-fin".format(stats.name), daemon=True)
+    closer.start()
+    return closer
+
+
+def run_pipeline(
+    listing_rps: float = 1.0,
+    listing_in_flight: int = 4,
+    detail_workers: int = 8,
+    compute_workers: int = 2,
+    queue_size: int = 200,
+    max_pages: int | None = None,
+    cache_dir: str | None = None,
+    cache_max_mb: int = 512,
+    history_path: str | None = None,
+    changed_ids_path: str | None = None,
+    price_history_dir: str | None = None,
+    bulk: bool = False,
+    db_url: str | None = None,
+    metrics_json: str | None = None,
+    metrics_prom: str | None = None,
+    progress_path: str | None = None,
+    report_interval: float = 30.0,
+    stream_pages: bool = False,
+) -> int:
+    """
+    Listado y fichas en una sola corrida, como etapas concurrentes unidas por
+    colas acotadas:
+
+        listado -> [fichas] -> descarga -> [calculo] -> calculo -> [guardar] -> guardado
+
+    - listado: páginas del listado (listing_in_flight threads, listing_rps
+      req/s); cada producto pasa a la cola de fichas apenas se parsea la
+      página, sin esperar a cm_productos,
+    - descarga: fichas de producto (detail_workers threads, caché HTTP),
+    - calculo: precios por región (compute_workers threads),
+    - guardado: un thread que hace upsert de cm_productos y de
+      cm_precios_minimos por lotes.
+
+    Si una etapa es más lenta, su cola de entrada se llena y las anteriores
+    esperan (backpressure): la memoria queda acotada por queue_size. Cada
+    report_interval segundos se imprime la profundidad de las colas y al final
+    el throughput de cada etapa, para ver cuál es el cuello de botella.
+    Con stream_pages=True la descarga extrae los objetos JSON mientras lee la
+    ficha (page_stream) y a la cola de cálculo pasan solo esos objetos, no
+    el HTML completo.
+    Retorna cuántas filas se guardaron en cm_precios_minimos.
+    """
+    metrics = new_run("pipeline")
+    started = time.monotonic()
+
+    print("=" * 70)
+    print("PIPELINE LISTADO + FICHAS")
+    print("=" * 70)
+
+    fetcher = get_fetcher(pool_size=listing_in_flight + detail_workers)
+    total_products = get_total_products(listing_url(1))
+    if not total_products:
+        print("✗ No se pudo obtener el total de productos. Verifica la URL o la conexión.")
+        return 0
+    total_pages = (total_products + PAGE_SIZE - 1) // PAGE_SIZE
+    if max_pages:
+        total_pages = min(total_pages, max_pages)
+    print("✓ {} productos en {} páginas".format(total_products, total_pages))
+    metrics.set_gauge("productos_total", total_products)
+    if progress_path:
+        metrics.start_progress(progress_path, report_interval)
+
+    supabase = None if db_url else get_supabase_client()
+    products_loader = make_loader(supabase, "cm_productos", "id_producto", chunk_size=500, bulk=bulk, db_url=db_url)
+    prices_loader = make_loader(supabase, "cm_precios_minimos", chunk_size=200, bulk=bulk, db_url=db_url)
+    price_history = None
+    if price_history_dir:
+        from price_history import open_price_history
+
+        price_history = open_price_history(price_history_dir)
+    sink = BatchUpserter(
+        supabase,
+        "cm_precios_minimos",
+        chunk_size=1000 if (bulk or db_url) else 200,
+        loader=prices_loader,
+        changed_ids_path=changed_ids_path,
+        price_history=price_history,
+    )
+    cache = ResponseCache(cache_dir, max_bytes=cache_max_mb * 1024 * 1024) if cache_dir else None
+    history = ScrapeHistory(history_path) if history_path else None
+
+    listado = StageStats("listado", max(1, listing_in_flight))
+    descarga = StageStats("descarga", max(1, detail_workers))
+    calculo = StageStats("calculo", max(1, compute_workers))
+    guardado = StageStats("guardado", 1)
+    stages = (listado, descarga, calculo, guardado)
+    fichas_q = StageQueue("fichas", queue_size)
+    calculo_q = StageQueue("calculo", max(1, queue_size // 4))
+    guardar_q = StageQueue("guardar", queue_size * 5)
+    queues = (fichas_q, calculo_q, guardar_q)
+
+    bucket = TokenBucket(listing_rps)
+    pages = iter(range(1, total_pages + 1))
+    pages_lock = threading.Lock()
+    seen: set = set()
+    seen_lock = threading.Lock()
+    enqueued = [0]
+
+    def listing_work():
+        while True:
+            with pages_lock:
+                page = next(pages, None)
+            if page is None:
+                return
+            t0 = time.perf_counter()
+            try:
+                _, registros = build_product_records(scrape_products_page(page, bucket))
+            except Exception as e:
+                print("✗ Error en página {}: {}".format(page, e))
+                registros = []
+            listado.add(items=1, busy=time.perf_counter() - t0)
+            if not registros:
+                continue
+            guardar_q.put(("cm_productos", registros), listado)
+            for row in registros:
+                with seen_lock:
+                    # Un producto puede repetirse entre páginas si el listado cambia
+                    if row["id_producto"] in seen:
+                        continue
+                    seen.add(row["id_producto"])
+                    enqueued[0] += 1
+                    index = enqueued[0]
+                # Copia: la fila original va tal cual a cm_productos
+                fichas_q.put(dict(row, _index=index), listado)
+
+    def detail_work():
+        while True:
+            row = fichas_q.get(descarga)
+            if row is _FIN:
+                return
+            t0 = time.perf_counter()
+            response = fetch_product_page(row, fetcher, total_products, cache, history, stream_pages)
+            polite_pause(fetcher)
+            descarga.add(items=1, busy=time.perf_counter() - t0)
+            if response is not None and response is not UNCHANGED:
+                calculo_q.put((row, response), descarga)
+            else:
+                guardar_q.put(("cm_precios_minimos", (row["id_producto"], None)), descarga)
+
+    def compute_work():
+        while True:
+            item = calculo_q.get(calculo)
+            if item is _FIN:
+                return
+            row, response = item
+            t0 = time.perf_counter()
+            try:
+                row_data = price_row_from_response(row, response, cache, history)
+            except Exception as e:
+                print(" ✗ Error procesando ID {}: {}".format(row.get("id_producto"), e))
+                metrics.count("error")
+                row_data = None
+                if stream_pages:
+                    response.discard()
+            calculo.add(items=1, busy=time.perf_counter() - t0)
+            guardar_q.put(("cm_precios_minimos", (row["id_producto"], row_data)), calculo)
+
+    def upsert_work():
+        productos: list[dict] = []
+        while True:
+            item = guardar_q.get(guardado)
+            if item is _FIN:
+                break
+            table, payload = item
+            t0 = time.perf_counter()
+            try:
+                if table == "cm_productos":
+                    productos.extend(payload)
+                    if len(productos) >= 500:
+                        metrics.count("productos_guardados", products_loader.write(productos))
+                        productos = []
+                else:
+                    sink.add(*payload)
+            except Exception as e:
+                print("✗ Error guardando en {}: {}".format(table, e))
+            guardado.add(items=1, busy=time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        if productos:
+            metrics.count("productos_guardados", products_loader.write(productos))
+        sink.flush()
+        guardado.add(busy=time.perf_counter() - t0)
+
+    closers = [
+        _start_stage(guardado, upsert_work, lambda: None),
+        _start_stage(calculo, compute_work, lambda: guardar_q.close(1)),
+        _start_stage(descarga, detail_work, lambda: calculo_q.close(calculo.workers)),
+        _start_stage(listado, listing_work, lambda: fichas_q.close(descarga.workers)),
+    ]
+
+    # Monitor: profundidad de las colas y avance de cada etapa
+    last_report = time.monotonic()
+    while closers[0].is_alive():
+        closers[0].join(timeout=0.5)
+        depths = {q.name: q.sample() for q in queues}
+        metrics.set_gauge("colas", depths)
+        if time.monotonic() - last_report >= report_interval:
+            last_report = time.monotonic()
+            elapsed = last_report - started
+            print("⏱ colas {} | {}".format(
+                " ".join("{}={}/{}".format(q.name, depths[q.name], q.maxsize) for q in queues),
+                " ".join("{} {:.1f}/s".format(s.name, s.snapshot(elapsed)["por_segundo"]) for s in stages),
+            ))
+
+    elapsed = time.monotonic() - started
+    products_loader.close()
+    prices_loader.close()
+    if price_history is not None:
+        price_history.close()
+        price_history.print_stats()
+    if cache is not None:
+        cache.save()
+        cache.print_stats()
+    if history is not None:
+        history.save()
+
+    report = {s.name: s.snapshot(elapsed) for s in stages}
+    colas = {q.name: q.snapshot() for q in queues}
+    metrics.set_gauge("etapas", report)
+    metrics.set_gauge("colas", colas)
+    print_pipeline_report(report, colas, elapsed)
+    print_http_stats(fetcher.stats())
+    products_loader.print_stats()
+    prices_loader.print_stats()
+    metrics.print_summary(metrics.export(metrics_json, metrics_prom))
+    print("✓ Listo: {} filas guardadas/actualizadas en cm_precios_minimos".format(sink.saved))
+    return sink.saved
+
+
+def print_pipeline_report(report: dict, colas: dict, elapsed: float) -> None:
+    print("\n" + "=" * 70)
+    print("ETAPAS DEL PIPELINE ({:.1f}s)".format(elapsed))
+    print("=" * 70)
+    print("{:<10} {:>8} {:>9} {:>9} {:>14} {:>13}".format(
+        "etapa", "ítems", "ítems/s", "ocupado", "esp. entrada", "esp. salida"
+    ))
+    for name, s in report.items():
+        print("{:<10} {:>8} {:>9.1f} {:>8.0f}% {:>13.0f}% {:>12.0f}%".format(
+            name, s["items"], s["por_segundo"], s["ocupado_pct"], s["espera_entrada_pct"], s["espera_salida_pct"]
+        ))
+    print("{:<10} {:>10} {:>8} {:>8}".format("cola", "capacidad", "media", "máxima"))
+    for name, q in colas.items():
+        print("{:<10} {:>10} {:>8.1f} {:>8}".format(name, q["capacidad"], q["media"], q["maxima"]))
+    # La etapa más ocupada es la que frena a las demás
+    cuello = max(report, key=lambda name: report[name]["ocupado_pct"])
+    print("→ Cuello de botella probable: {} ({:.0f}% ocupado)".format(cuello, report[cuello]["ocupado_pct"]))
+
+
+def cli(argv=None, prog=None):
+    """
+    Línea de comandos del pipeline (también `python -m cm_cli pipeline`).
+    """
+    parser = argparse.ArgumentParser(prog=prog, description="Listado y fichas en una sola corrida (pipeline con colas acotadas)")
+    parser.add_argument("--listing-rps", type=float, default=float(os.environ.get("CM_LISTADO_RPS", "1.0")),
+                        help="requests/segundo del listado")
+    parser.add_argument("--listing-in-flight", type=int, default=int(os.environ.get("CM_LISTADO_EN_VUELO", "4")),
+                        help="páginas del listado en vuelo")
+    parser.add_argument("--detail-workers", type=int, default=8, help="threads que descargan fichas")
+    parser.add_argument("--compute-workers", type=int, default=2, help="threads que calculan precios")
+    parser.add_argument("--queue-size", type=int, default=200, help="capacidad de la cola de fichas")
+    parser.add_argument("--max-pages", type=int, default=None, help="máximo de páginas del listado")
+    parser.add_argument("--cache-dir", default=os.environ.get("CM_HTTP_CACHE_DIR"),
+                        help="directorio de la caché HTTP de fichas")
+    parser.add_argument("--cache-max-mb", type=int, default=512, help="tamaño máximo de la caché HTTP en MB")
+    parser.add_argument("--history-path", default=os.environ.get("CM_SCRAPE_HISTORY"),
+                        help="historial local de revisiones por producto")
+    parser.add_argument("--changed-ids-path", default=os.environ.get("CM_CHANGED_IDS", ".cache/ids_modificados.txt"),
+                        help="archivo donde anotar los IDs guardados (para refresh_precios_region.py)")
+    parser.add_argument("--price-history-dir", default=os.environ.get("CM_PRICE_HISTORY_DIR"),
+                        help="directorio del historial de precios en Parquet")
+    parser.add_argument("--bulk", action="store_true", help="subir los lotes por REST en paralelo")
+    parser.add_argument("--db-url", default=os.environ.get("CM_DB_URL"), help="URL de Postgres para cargar por COPY")
+    parser.add_argument("--metrics-json", default=os.environ.get("CM_METRICS_JSON"))
+    parser.add_argument("--metrics-prom", default=os.environ.get("CM_METRICS_PROM"))
+    parser.add_argument("--progress-path", default=os.environ.get("CM_PROGRESS_PATH"))
+    parser.add_argument("--report-interval", type=float, default=30.0,
+                        help="segundos entre reportes de colas y throughput")
+    parser.add_argument("--stream-pages", action="store_true", default=os.environ.get("CM_STREAM_FICHAS") == "1",
+                        help="leer las fichas por chunks y extraer al vuelo (menos memoria en la cola de cálculo)")
+    args = parser.parse_args(argv)
+
+    run_pipeline(
+        listing_rps=args.listing_rps,
+        listing_in_flight=args.listing_in_flight,
+        detail_workers=args.detail_workers,
+        compute_workers=args.compute_workers,
+        queue_size=args.queue_size,
+        max_pages=args.max_pages,
+        cache_dir=args.cache_dir,
+        cache_max_mb=args.cache_max_mb,
+        history_path=args.history_path,
+        changed_ids_path=args.changed_ids_path,
+        price_history_dir=args.price_history_dir,
+        bulk=args.bulk,
+        db_url=args.db_url,
+        metrics_json=args.metrics_json,
+        metrics_prom=args.metrics_prom,
+        progress_path=args.progress_path,
+        report_interval=args.report_interval,
+        stream_pages=args.stream_pages,
+    )
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,331 @@
+import argparse
+import datetime
+import os
+import threading
+import time
+import uuid
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pafs
+    import pyarrow.parquet as pq
+except ImportError:  # el historial de precios es opcional
+    pa = None
+
+# Filas por archivo Parquet: los archivos chicos hacen lentas las consultas,
+# los grandes se pierden enteros si la corrida se corta antes de escribirlos
+ROWS_PER_FILE = 200_000
+ROWS_PER_GROUP = 20_000
+
+if pa is not None:
+    # Formato largo: una fila por producto × región × corrida. Así el filtro
+    # por id_producto/región usa las estadísticas de cada row group
+    SCHEMA = pa.schema([
+        ("capturado_en", pa.timestamp("s", tz="UTC")),
+        ("id_producto", pa.string()),
+        ("region", pa.string()),
+        ("precio", pa.int64()),
+        ("precio_minimo_global", pa.int64()),
+        ("region_mejor_precio", pa.string()),
+    ])
+    PARTITIONING = ds.partitioning(pa.schema([("run_date", pa.date32())]), flavor="hive")
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError("El historial de precios requiere pyarrow (pip install pyarrow).")
+
+
+class PriceHistoryWriter:
+    """
+    Historial append-only de los precios calculados en cada corrida, en
+    Parquet particionado por fecha (root/run_date=AAAA-MM-DD/part-*.parquet).
+
+    Nunca reescribe archivos: cada corrida (o shard) agrega archivos con un
+    nombre propio, escritos de forma atómica (archivo temporal + os.replace).
+    Las filas se ordenan por id_producto y región antes de escribir, para que
+    las consultas descarten row groups completos por estadísticas.
+    """
+
+    def __init__(self, root: str, run_date: datetime.date | None = None, rows_per_file: int = ROWS_PER_FILE):
+        _require_pyarrow()
+        self.root = root
+        self.captured_at = int(time.time())
+        self.run_date = run_date or datetime.datetime.fromtimestamp(self.captured_at, datetime.timezone.utc).date()
+        self.rows_per_file = rows_per_file
+        self.rows_written = 0
+        self.files_written = 0
+        self._prefix = "part-{}-{}".format(self.captured_at, uuid.uuid4().hex[:8])
+        self._columns: dict = {name: [] for name in ("id_producto", "region", "precio", "precio_minimo_global", "region_mejor_precio")}
+        self._lock = threading.Lock()
+
+    @property
+    def partition_dir(self) -> str:
+        return os.path.join(self.root, "run_date={}".format(self.run_date.isoformat()))
+
+    def append(self, rows: list[dict]) -> None:
+        """
+        Agrega filas de cm_precios_minimos (con precios_region) al buffer y
+        escribe un archivo cada rows_per_file filas.
+        """
+        with self._lock:
+            cols = self._columns
+            for row in rows:
+                precios = row.get("precios_region") or {}
+                for region, precio in precios.items():
+                    cols["id_producto"].append(str(row["id_producto"]))
+                    cols["region"].append(region)
+                    cols["precio"].append(int(precio))
+                    cols["precio_minimo_global"].append(row.get("precio_minimo_global"))
+                    cols["region_mejor_precio"].append(row.get("region_mejor_precio"))
+            if len(cols["id_producto"]) >= self.rows_per_file:
+                self._write_file()
+
+    def close(self) -> None:
+        with self._lock:
+            self._write_file()
+
+    def _write_file(self) -> None:
+        n = len(self._columns["id_producto"])
+        if not n:
+            return
+        table = pa.table(
+            {"capturado_en": pa.array([self.captured_at] * n, pa.timestamp("s", tz="UTC")), **self._columns},
+            schema=SCHEMA,
+        ).sort_by([("id_producto", "ascending"), ("region", "ascending")])
+        self._columns = {name: [] for name in self._columns}
+
+        os.makedirs(self.partition_dir, exist_ok=True)
+        name = "{}-{:04d}.parquet".format(self._prefix, self.files_written)
+        path = os.path.join(self.partition_dir, name)
+        # Con "." adelante el dataset lo ignora si la corrida muere a medio escribir
+        tmp_path = os.path.join(self.partition_dir, "." + name + ".tmp")
+        pq.write_table(table, tmp_path, row_group_size=ROWS_PER_GROUP, compression="zstd")
+        os.replace(tmp_path, path)
+        self.rows_written += n
+        self.files_written += 1
+
+    def print_stats(self) -> None:
+        print("✓ Historial de precios: {} filas en {} archivos ({})".format(
+            self.rows_written, self.files_written, self.partition_dir
+        ))
+
+
+def open_price_history(root: str | None, run_date: datetime.date | None = None):
+    """
+    PriceHistoryWriter para root, o None si no hay root o falta pyarrow
+    (la corrida sigue sin historial).
+    """
+    if not root:
+        return None
+    if pa is None:
+        print("⚠ pyarrow no está instalado: esta corrida no se guarda en el historial de precios")
+        return None
+    return PriceHistoryWriter(root, run_date)
+
+
+class PriceHistory:
+    """
+    Consultas sobre el historial. Lee con pyarrow.dataset y memory map: el
+    filtro por fecha descarta particiones completas, el de id_producto/región
+    descarta row groups por estadísticas, y solo se leen las columnas pedidas.
+    """
+
+    def __init__(self, root: str):
+        _require_pyarrow()
+        self.root = root
+
+    def _dataset(self):
+        if not os.path.isdir(self.root):
+            return None
+        return ds.dataset(
+            self.root,
+            schema=SCHEMA.append(pa.field("run_date", pa.date32())),
+            format="parquet",
+            partitioning=PARTITIONING,
+            filesystem=pafs.LocalFileSystem(use_mmap=True),
+            ignore_prefixes=[".", "_"],
+        )
+
+    def _read(self, columns, filter_):
+        dataset = self._dataset()
+        if dataset is None:
+            return pa.table({c: pa.array([], SCHEMA.field(c).type if c != "run_date" else pa.date32()) for c in columns})
+        return dataset.to_table(columns=columns, filter=filter_)
+
+    def price_series(self, id_producto, region: str | None = None, since=None, until=None) -> list[dict]:
+        """
+        Serie de precios de un producto, ordenada por captura. Con region, el
+        precio en esa región; sin region, el mínimo global (y su región).
+        """
+        filter_ = pc.field("id_producto") == str(id_producto)
+        if region is not None:
+            filter_ &= pc.field("region") == region
+        filter_ = _date_filter(filter_, since, until)
+        if region is not None:
+            table = self._read(["run_date", "capturado_en", "precio"], filter_)
+        else:
+            table = self._read(["run_date", "capturado_en", "precio_minimo_global", "region_mejor_precio"], filter_)
+            # Una fila por región en cada corrida: basta una por captura
+            grouped = table.group_by(["run_date", "capturado_en"], use_threads=False).aggregate([
+                ("precio_minimo_global", "min"),
+                ("region_mejor_precio", "first"),
+            ])
+            table = pa.table({
+                "run_date": grouped["run_date"],
+                "capturado_en": grouped["capturado_en"],
+                "precio": grouped["precio_minimo_global_min"],
+                "region": grouped["region_mejor_precio_first"],
+            })
+        return table.sort_by("capturado_en").to_pylist()
+
+    def biggest_movers(self, since, region: str | None = None, limit: int = 20, until=None) -> list[dict]:
+        """
+        Productos (y región) con mayor variación porcentual desde `since`:
+        entre el precio vigente al empezar el período (la última captura
+        anterior a `since`, o la primera del período si no hay) y la última
+        captura del período. Con la caché HTTP un producto sin cambios no se
+        vuelve a capturar, así que un solo cambio deja una sola captura en el
+        período. Ignora los que no tienen dos capturas para comparar.
+        """
+        columns = ["id_producto", "region", "capturado_en", "precio"]
+        filter_ = _date_filter(None, since, until)
+        if region is not None:
+            filter_ &= pc.field("region") == region
+        table = self._read(columns, filter_)
+        if not table.num_rows:
+            return []
+        baseline = self._last_before(_to_date(since), table.select(["id_producto", "region"]), region)
+        table = pa.concat_tables([baseline.cast(table.schema), table])
+        table = table.sort_by("capturado_en")
+        grouped = table.group_by(["id_producto", "region"], use_threads=False).aggregate([
+            ("precio", "first"),
+            ("precio", "last"),
+            ("capturado_en", "count"),
+        ])
+        grouped = grouped.filter(pc.greater(grouped["capturado_en_count"], 1))
+        first = grouped["precio_first"]
+        last = grouped["precio_last"]
+        cambio = pc.subtract(last, first)
+        pct = pc.divide(pc.cast(cambio, pa.float64()), pc.cast(first, pa.float64()))
+        result = pa.table({
+            "id_producto": grouped["id_producto"],
+            "region": grouped["region"],
+            "precio_inicial": first,
+            "precio_final": last,
+            "cambio": cambio,
+            "cambio_pct": pct,
+            "abs_pct": pc.abs(pct),
+        })
+        top = pc.select_k_unstable(result, limit, [("abs_pct", "descending")])
+        return result.take(top).drop_columns(["abs_pct"]).to_pylist()
+
+
+    def _last_before(self, date, keys, region=None):
+        """
+        Última captura anterior a `date` de cada (id_producto, región) de
+        `keys`. Recorre las particiones de la más nueva a la más vieja y
+        para cuando encontró todas: un producto que se captura seguido no
+        obliga a leer el historial completo.
+        """
+        columns = ["id_producto", "region", "capturado_en", "precio"]
+        missing = keys.group_by(["id_producto", "region"], use_threads=False).aggregate([])
+        found = []
+        for run_date in self._run_dates(until=date):
+            if not missing.num_rows:
+                break
+            filter_ = pc.field("run_date") == run_date
+            if region is not None:
+                filter_ &= pc.field("region") == region
+            part = self._read(columns, filter_)
+            part = part.join(missing, ["id_producto", "region"], join_type="inner", use_threads=False)
+            if not part.num_rows:
+                continue
+            last = part.sort_by("capturado_en").group_by(["id_producto", "region"], use_threads=False).aggregate([
+                ("capturado_en", "last"),
+                ("precio", "last"),
+            ])
+            found.append(pa.table({
+                "id_producto": last["id_producto"],
+                "region": last["region"],
+                "capturado_en": last["capturado_en_last"],
+                "precio": last["precio_last"],
+            }))
+            missing = missing.join(last.select(["id_producto", "region"]), ["id_producto", "region"], join_type="left anti", use_threads=False)
+        if not found:
+            return self._read(columns, pc.scalar(False))
+        return pa.concat_tables(found)
+
+    def _run_dates(self, until):
+        """
+        Fechas de las particiones anteriores a `until`, de la más nueva a la más vieja.
+        """
+        dates = []
+        for name in os.listdir(self.root) if os.path.isdir(self.root) else ():
+            if name.startswith("run_date="):
+                try:
+                    dates.append(datetime.date.fromisoformat(name[len("run_date="):]))
+                except ValueError:
+                    continue
+        return sorted((d for d in dates if d < until), reverse=True)
+
+
+def _to_date(value):
+    if value is None or isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(str(value))
+
+
+def _date_filter(filter_, since, until):
+    since, until = _to_date(since), _to_date(until)
+    for expr in (
+        pc.field("run_date") >= since if since is not None else None,
+        pc.field("run_date") <= until if until is not None else None,
+    ):
+        if expr is not None:
+            filter_ = expr if filter_ is None else filter_ & expr
+    return filter_ if filter_ is not None else pc.scalar(True)
+
+
+def main(argv=None, prog=None):
+    parser = argparse.ArgumentParser(prog=prog, description="Consultas al historial de precios")
+    parser.add_argument(
+        "--root",
+        default=os.environ.get("CM_PRICE_HISTORY_DIR", ".cache/historial_precios"),
+        help="directorio del historial (por defecto: $CM_PRICE_HISTORY_DIR)",
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    serie = sub.add_parser("serie", help="serie de precios de un producto")
+    serie.add_argument("id_producto")
+    serie.add_argument("--region", help="región (por defecto: mínimo global)")
+    serie.add_argument("--since", help="desde (AAAA-MM-DD)")
+    movers = sub.add_parser("movers", help="mayores variaciones de precio desde una fecha")
+    movers.add_argument("--since", required=True, help="desde (AAAA-MM-DD)")
+    movers.add_argument("--region")
+    movers.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    history = PriceHistory(args.root)
+    if args.command == "serie":
+        rows = history.price_series(args.id_producto, args.region, since=args.since)
+        if not rows:
+            print("⚠ Sin capturas para {}".format(args.id_producto))
+        for row in rows:
+            print("{}  {}  ${}{}".format(
+                row["run_date"], row["capturado_en"].strftime("%H:%M"), row["precio"],
+                "  ({})".format(row["region"]) if row.get("region") else "",
+            ))
+    else:
+        rows = history.biggest_movers(args.since, args.region, args.limit)
+        if not rows:
+            print("⚠ Sin productos con cambios de precio desde {}".format(args.since))
+        for row in rows:
+            print("{:<12} {:<30} ${:>10} -> ${:>10} {:>+8.1%}".format(
+                row["id_producto"], row["region"][:30], row["precio_inicial"], row["precio_final"], row["cambio_pct"]
+            ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,584 @@
+import argparse
+import heapq
+import itertools
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, bisect_right
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from price_model import normalize_region_name
+
+INDEX_COLUMNS = "id_producto,nombre_producto,link_producto,precio_minimo_global,region_mejor_precio,precios_region"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def name_tokens(text: str) -> set[str]:
+    """
+    Tokens normalizados de un nombre: minúsculas, sin tildes, solo letras y
+    dígitos ("Café Molido 250 g" -> {"cafe", "molido", "250", "g"}).
+    """
+    nfkd_form = unicodedata.normalize("NFKD", text or "")
+    cleaned = "".join(c for c in nfkd_form if not unicodedata.combining(c)).lower()
+    return set(_TOKEN_RE.findall(cleaned))
+
+
+def region_key(region_name: str) -> str:
+    # "Región de Valparaíso", "Valparaiso" y "valparaíso" -> "valparaiso"
+    return normalize_region_name(region_name).lower()
+
+
+class SortedPairs:
+    """
+    Pares (valor, ID) ordenados por valor, en bloques de arrays paralelos de
+    a lo más 2 * BLOCK elementos (valores e IDs), con el máximo de cada
+    bloque aparte. Ubicar un valor es bisect sobre los máximos y luego
+    dentro del bloque; insertar o borrar solo mueve un bloque, así que cuesta
+    O(BLOCK) y no O(n) como en un único array.
+    """
+
+    BLOCK = 512
+
+    def __init__(self):
+        self._values: list[list[int]] = []
+        self._ids: list[list[str]] = []
+        self._maxes: list[int] = []
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def insert(self, value: int, id_producto: str) -> None:
+        if not self._values:
+            self._values.append([value])
+            self._ids.append([id_producto])
+            self._maxes.append(value)
+            self._len = 1
+            return
+        b = min(bisect_right(self._maxes, value), len(self._maxes) - 1)
+        values, ids = self._values[b], self._ids[b]
+        pos = bisect_right(values, value)
+        values.insert(pos, value)
+        ids.insert(pos, id_producto)
+        self._maxes[b] = values[-1]
+        self._len += 1
+        if len(values) > 2 * self.BLOCK:
+            # Se parte el bloque en dos
+            self._values[b : b + 1] = [values[: self.BLOCK], values[self.BLOCK :]]
+            self._ids[b : b + 1] = [ids[: self.BLOCK], ids[self.BLOCK :]]
+            self._maxes[b : b + 1] = [values[self.BLOCK - 1], values[-1]]
+
+    def extend(self, pairs: list[tuple[int, str]]) -> None:
+        """
+        Inserta varios (valor, id). Con lotes grandes respecto de lo que ya
+        hay (carga inicial, sync) se reordena todo de una vez.
+        """
+        if len(pairs) * 8 < self._len:
+            for value, id_producto in pairs:
+                self.insert(value, id_producto)
+            return
+        merged = [pair for block in zip(self._values, self._ids) for pair in zip(*block)]
+        merged.extend(pairs)
+        merged.sort()
+        values = [v for v, _ in merged]
+        ids = [i for _, i in merged]
+        self._values = [values[i : i + self.BLOCK] for i in range(0, len(values), self.BLOCK)]
+        self._ids = [ids[i : i + self.BLOCK] for i in range(0, len(ids), self.BLOCK)]
+        self._maxes = [block[-1] for block in self._values]
+        self._len = len(values)
+
+    def remove(self, value: int, id_producto: str) -> None:
+        # Valores repetidos pueden quedar repartidos en bloques contiguos
+        b = bisect_left(self._maxes, value)
+        while b < len(self._values):
+            values, ids = self._values[b], self._ids[b]
+            lo = bisect_left(values, value)
+            hi = bisect_right(values, value, lo)
+            try:
+                pos = ids.index(id_producto, lo, hi)
+            except ValueError:
+                if hi < len(values):
+                    break
+                b += 1
+                continue
+            del values[pos]
+            del ids[pos]
+            self._len -= 1
+            if values:
+                self._maxes[b] = values[-1]
+            else:
+                del self._values[b], self._ids[b], self._maxes[b]
+            return
+        raise ValueError("{} no está en el índice con valor {}".format(id_producto, value))
+
+    def remove_many(self, pairs: list[tuple[int, str]]) -> None:
+        for value, id_producto in pairs:
+            self.remove(value, id_producto)
+
+    def iter_ids(self, min_value=None, max_value=None):
+        """
+        IDs con valor en [min_value, max_value], de menor a mayor valor.
+        """
+        b = bisect_left(self._maxes, min_value) if min_value is not None else 0
+        for values, ids in zip(self._values[b:], self._ids[b:]):
+            lo = bisect_left(values, min_value) if min_value is not None else 0
+            if max_value is not None and values[-1] > max_value:
+                yield from ids[lo : bisect_right(values, max_value)]
+                return
+            yield from ids[lo:]
+
+    def iter_ids_desc(self):
+        for ids in reversed(self._ids):
+            yield from reversed(ids)
+
+
+class _Entry:
+    __slots__ = ("nombre", "link", "precios", "tokens", "minimo", "spread")
+
+    def __init__(self, nombre, link, precios, tokens):
+        self.nombre = nombre
+        self.link = link
+        self.precios = precios  # {clave de región: precio}
+        self.tokens = tokens
+        self.minimo = min(precios.values()) if precios else None
+        # máx - mín entre regiones (None con menos de 2)
+        self.spread = max(precios.values()) - self.minimo if len(precios) >= 2 else None
+
+
+class PriceIndex:
+    """
+    Índice en memoria de los precios por región de cm_precios_minimos:
+
+    - por región, los precios ordenados (SortedPairs) para "los más baratos
+      de la región X bajo $Y" con bisect,
+    - un índice invertido token normalizado del nombre -> IDs, para filtrar
+      por texto,
+    - las diferencias entre regiones (máx - mín) ordenadas, para el top-N,
+    - el mínimo de cada producto ordenado, para búsquedas por texto.
+
+    Se actualiza fila a fila (append, con la misma interfaz que
+    price_history.PriceHistoryWriter, así BatchUpserter lo alimenta a
+    medida que guarda lotes): un producto que vuelve a llegar se saca de
+    las estructuras y se vuelve a insertar, sin reconstruir nada. Las
+    consultas y las actualizaciones se serializan con un lock.
+    """
+
+    def __init__(self):
+        self._entries: dict[str, _Entry] = {}
+        self._regions: dict[str, SortedPairs] = {}
+        self._region_names: dict[str, str] = {}  # clave -> nombre como viene
+        self._tokens: dict[str, set] = {}
+        self._spreads = SortedPairs()
+        self._minimums = SortedPairs()
+        self._lock = threading.RLock()
+        self.updated_at = None
+        self.updates = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # --- Actualización ---
+
+    def append(self, rows: list[dict]) -> None:
+        """
+        Agrega o reemplaza productos (filas de cm_precios_minimos).
+        """
+        # Si un producto viene repetido en el lote, queda la última fila
+        latest = {str(row["id_producto"]): row for row in rows}
+        with self._lock:
+            removals: dict = {}
+            inserts: dict = {}
+            for id_producto, row in latest.items():
+                previous = self._entries.pop(id_producto, None)
+                if previous is not None:
+                    self._unlink(id_producto, previous, removals)
+                self._link(id_producto, row, inserts)
+            # Los arrays ordenados se tocan una vez por lote
+            for target, pairs in removals.items():
+                target.remove_many(pairs)
+            for target, pairs in inserts.items():
+                target.extend(pairs)
+            self.updated_at = time.time()
+
+    def remove(self, ids) -> int:
+        removed = 0
+        with self._lock:
+            removals: dict = {}
+            for id_producto in ids:
+                entry = self._entries.pop(str(id_producto), None)
+                if entry is not None:
+                    self._unlink(str(id_producto), entry, removals)
+                    removed += 1
+            for target, pairs in removals.items():
+                target.remove_many(pairs)
+            self.updated_at = time.time()
+        return removed
+
+    def sync(self, rows) -> tuple[int, int]:
+        """
+        Deja el índice igual a `rows` (la tabla completa): solo toca los
+        productos que cambiaron y saca los que ya no están.
+        Retorna (actualizados, eliminados).
+        """
+        seen = set()
+        changed = []
+        # La lectura (que puede ser por red) va sin el lock: las consultas
+        # siguen respondiendo con el índice anterior mientras tanto
+        for row in rows:
+            id_producto = str(row["id_producto"])
+            seen.add(id_producto)
+            entry = self._entries.get(id_producto)
+            if entry is None or entry.nombre != (row.get("nombre_producto") or "") or entry.precios != self._prices_of(row):
+                changed.append(row)
+        with self._lock:
+            self.append(changed)
+            removed = self.remove([i for i in self._entries if i not in seen])
+        return len(changed), removed
+
+    def _prices_of(self, row) -> dict:
+        precios = row.get("precios_region") or {}
+        if isinstance(precios, str):
+            precios = json.loads(precios)
+        result = {}
+        for region, precio in precios.items():
+            try:
+                precio = int(precio)
+            except (TypeError, ValueError):
+                continue
+            if precio > 0:
+                key = region_key(region)
+                self._region_names.setdefault(key, region)
+                result[key] = precio
+        return result
+
+    def _link(self, id_producto: str, row: dict, inserts: dict) -> None:
+        # Las inserciones en los arrays ordenados se anotan en inserts
+        # (SortedPairs -> [(valor, id)]) y se hacen por lote
+        nombre = row.get("nombre_producto") or ""
+        entry = _Entry(nombre, row.get("link_producto") or "", self._prices_of(row), name_tokens(nombre))
+        self._entries[id_producto] = entry
+        for key, precio in entry.precios.items():
+            pairs = self._regions.get(key)
+            if pairs is None:
+                pairs = self._regions[key] = SortedPairs()
+            inserts.setdefault(pairs, []).append((precio, id_producto))
+        for token in entry.tokens:
+            self._tokens.setdefault(token, set()).add(id_producto)
+        if entry.minimo is not None:
+            inserts.setdefault(self._minimums, []).append((entry.minimo, id_producto))
+        if entry.spread is not None:
+            inserts.setdefault(self._spreads, []).append((entry.spread, id_producto))
+        self.updates += 1
+
+    def _unlink(self, id_producto: str, entry: _Entry, removals: dict) -> None:
+        for key, precio in entry.precios.items():
+            removals.setdefault(self._regions[key], []).append((precio, id_producto))
+        for token in entry.tokens:
+            ids = self._tokens.get(token)
+            if ids is not None:
+                ids.discard(id_producto)
+                if not ids:
+                    del self._tokens[token]
+        if entry.minimo is not None:
+            removals.setdefault(self._minimums, []).append((entry.minimo, id_producto))
+        if entry.spread is not None:
+            removals.setdefault(self._spreads, []).append((entry.spread, id_producto))
+
+    # --- Consultas ---
+
+    def resolve_region(self, region_name: str) -> str | None:
+        """
+        Clave de la región pedida: nombre exacto normalizado o, si no, la
+        única región que lo contiene ("metropolitana").
+        """
+        key = region_key(region_name)
+        if key in self._regions:
+            return key
+        matches = [k for k in self._regions if key and key in k]
+        return matches[0] if len(matches) == 1 else None
+
+    def regions(self) -> list[dict]:
+        with self._lock:
+            return [
+                {"region": self._region_names[key], "productos": len(pairs)}
+                for key, pairs in sorted(self._regions.items())
+            ]
+
+    def _matching(self, query: str) -> set | None:
+        # IDs con todos los tokens de la consulta (None si no hay consulta)
+        tokens = name_tokens(query) if query else set()
+        if not tokens:
+            return None
+        sets = sorted((self._tokens.get(t, set()) for t in tokens), key=len)
+        return set(sets[0]).intersection(*sets[1:])
+
+    def cheapest(self, region: str, max_price=None, min_price=None, query: str | None = None, limit: int = 20) -> list[dict]:
+        """
+        Productos más baratos de una región, opcionalmente con precio en
+        [min_price, max_price] y con todos los tokens de `query` en el nombre.
+        Lanza KeyError si la región no existe.
+        """
+        with self._lock:
+            key = self.resolve_region(region)
+            if key is None:
+                raise KeyError(region)
+            ids = self._first(
+                self._regions[key], min_price, max_price, self._matching(query), limit, lambda e: e.precios.get(key)
+            )
+            return [self._result(i, key) for i in ids]
+
+    def _first(self, pairs: SortedPairs, min_value, max_value, candidates, limit: int, value_of) -> list[str]:
+        """
+        Los primeros `limit` IDs de pairs con valor en [min_value, max_value]
+        que están en candidates (todos si candidates es None).
+        value_of(entry) es el valor del producto en ese array (None si no está).
+        """
+        if candidates is None:
+            return list(itertools.islice(pairs.iter_ids(min_value, max_value), limit))
+        if not candidates:
+            return []
+        if limit * len(self._entries) < len(candidates) ** 2:
+            # Candidatos frecuentes: recorriendo en orden aparecen pronto
+            matching = (i for i in pairs.iter_ids(min_value, max_value) if i in candidates)
+            return list(itertools.islice(matching, limit))
+        # Pocos candidatos: se ordenan ellos en vez de recorrer el array
+        found = []
+        for i in candidates:
+            value = value_of(self._entries[i])
+            if value is None or (min_value is not None and value < min_value):
+                continue
+            if max_value is None or value <= max_value:
+                found.append((value, i))
+        return [i for _, i in heapq.nsmallest(limit, found)]
+
+    def biggest_spreads(self, limit: int = 20, region: str | None = None, query: str | None = None) -> list[dict]:
+        """
+        Top-N productos con mayor diferencia de precio entre regiones
+        (precio más caro - más barato). Con region, solo productos que
+        tienen precio en ella; con query, filtrados por nombre.
+        """
+        with self._lock:
+            key = None
+            if region:
+                key = self.resolve_region(region)
+                if key is None:
+                    raise KeyError(region)
+            candidates = self._matching(query)
+            results = []
+            for i in self._spreads.iter_ids_desc():
+                if candidates is not None and i not in candidates:
+                    continue
+                entry = self._entries[i]
+                if key is not None and key not in entry.precios:
+                    continue
+                cheapest = min(entry.precios, key=entry.precios.get)
+                dearest = max(entry.precios, key=entry.precios.get)
+                results.append({
+                    "id_producto": i,
+                    "nombre_producto": entry.nombre,
+                    "diferencia": entry.spread,
+                    "precio_min": entry.precios[cheapest],
+                    "region_min": self._region_names[cheapest],
+                    "precio_max": entry.precios[dearest],
+                    "region_max": self._region_names[dearest],
+                })
+                if len(results) == limit:
+                    break
+            return results
+
+    def search(self, query: str, limit: int = 20) -> list[dict]:
+        """
+        Productos con todos los tokens de query, del más barato (mínimo
+        global) al más caro.
+        """
+        with self._lock:
+            candidates = self._matching(query) or set()
+            ids = self._first(self._minimums, None, None, candidates, limit, lambda e: e.minimo)
+            return [self._result(i) for i in ids]
+
+    def product(self, id_producto: str) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(str(id_producto))
+            if entry is None:
+                return None
+            result = self._result(str(id_producto))
+            result["precios_region"] = {self._region_names[k]: p for k, p in entry.precios.items()}
+            return result
+
+    def _result(self, id_producto: str, key: str | None = None) -> dict:
+        entry = self._entries[id_producto]
+        if key is None and entry.precios:
+            key = min(entry.precios, key=entry.precios.get)
+        return {
+            "id_producto": id_producto,
+            "nombre_producto": entry.nombre,
+            "link_producto": entry.link,
+            "region": self._region_names.get(key),
+            "precio": entry.precios.get(key),
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "productos": len(self._entries),
+                "regiones": len(self._regions),
+                "tokens": len(self._tokens),
+                "actualizaciones": self.updates,
+                "actualizado_en": self.updated_at,
+            }
+
+
+def load_price_index(supabase, index: PriceIndex | None = None, page_size: int = 1000) -> PriceIndex:
+    """
+    Arma (o sincroniza) el índice desde cm_precios_minimos, con la lectura
+    keyset de product_reader.
+    """
+    from product_reader import iter_productos
+
+    index = index if index is not None else PriceIndex()
+    rows = iter_productos(supabase, columns=INDEX_COLUMNS, page_size=page_size, table="cm_precios_minimos")
+    updated, removed = index.sync(rows)
+    print("✓ Índice de precios: {} productos ({} actualizados, {} eliminados)".format(len(index), updated, removed))
+    return index
+
+
+def _int_param(params, name, default=None):
+    value = params.get(name, [None])[0]
+    if value in (None, ""):
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError("parámetro {} inválido: {}".format(name, value)) from None
+
+
+class PriceIndexServer:
+    """
+    API HTTP local (JSON, solo GET) sobre un PriceIndex:
+
+        /baratos?region=Valparaíso&max=5000&min=&q=arroz&limit=20
+        /diferencias?limit=20&region=&q=
+        /buscar?q=arroz grado 1&limit=20
+        /producto?id=1234567
+        /regiones
+        /estado
+
+    Cada respuesta trae "ms": el tiempo de la consulta en el índice.
+    """
+
+    def __init__(self, index: PriceIndex, host: str = "127.0.0.1", port: int = 0):
+        self.index = index
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.origin = "http://{}:{}".format(*self.httpd.server_address[:2])
+
+    def _query(self, path: str, params: dict):
+        index = self.index
+        q = params.get("q", [None])[0]
+        limit = min(_int_param(params, "limit", 20), 1000)
+        if path == "/baratos":
+            region = params.get("region", [None])[0]
+            if not region:
+                raise ValueError("falta el parámetro region")
+            return index.cheapest(region, _int_param(params, "max"), _int_param(params, "min"), q, limit)
+        if path == "/diferencias":
+            return index.biggest_spreads(limit, params.get("region", [None])[0], q)
+        if path == "/buscar":
+            if not q:
+                raise ValueError("falta el parámetro q")
+            return index.search(q, limit)
+        if path == "/producto":
+            found = index.product(params.get("id", [""])[0])
+            if found is None:
+                raise KeyError(params.get("id", [""])[0])
+            return found
+        if path == "/regiones":
+            return index.regions()
+        if path == "/estado":
+            return index.stats()
+        return None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                start = time.perf_counter()
+                try:
+                    data = server._query(url.path, parse_qs(url.query))
+                    status = 404 if data is None else 200
+                    body = {"error": "ruta desconocida"} if data is None else {"resultado": data}
+                except KeyError as e:
+                    status, body = 404, {"error": "no encontrado: {}".format(e.args[0])}
+                except ValueError as e:
+                    status, body = 400, {"error": str(e)}
+                body["ms"] = round((time.perf_counter() - start) * 1000, 3)
+                payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        print("✓ API del índice de precios en {}".format(self.origin))
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def shutdown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def cli(argv=None, prog=None):
+    """
+    Línea de comandos del servicio de consultas (también `python -m cm_cli indice`).
+    """
+    parser = argparse.ArgumentParser(prog=prog, description="API local de consultas sobre precios por región")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("CM_INDICE_PUERTO", "8766")))
+    parser.add_argument(
+        "--refresh-minutes",
+        type=float,
+        default=None,
+        help="cada cuántos minutos volver a leer cm_precios_minimos (solo se actualiza lo que cambió)",
+    )
+    args = parser.parse_args(argv)
+
+    from supabase_client import get_supabase_client
+
+    supabase = get_supabase_client()
+    index = load_price_index(supabase)
+    server = PriceIndexServer(index, args.host, args.port).start()
+    try:
+        while True:
+            if args.refresh_minutes:
+                time.sleep(args.refresh_minutes * 60)
+                try:
+                    load_price_index(supabase, index)
+                except Exception as e:
+                    print("⚠ No se pudo actualizar el índice: {}".format(e))
+            else:
+                time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,186 @@
+import functools
+import math
+import threading
+import unicodedata
+from array import array
+
+# IDs de región internados: "13" -> 0, "5" -> 1, ... (compartidos entre fichas;
+# el sitio tiene 16 regiones, así que los índices quedan chicos y estables)
+_REGION_INDEX: dict = {}
+_REGION_INDEX_LOCK = threading.Lock()
+
+
+def region_index(region_id) -> int:
+    """
+    Índice entero (0..n) de un ID de región, asignado la primera vez que aparece.
+    Las fichas se calculan en varios threads: la asignación va con lock para
+    que dos regiones nuevas a la vez no reciban el mismo índice.
+    """
+    idx = _REGION_INDEX.get(region_id)
+    if idx is None:
+        with _REGION_INDEX_LOCK:
+            idx = _REGION_INDEX.get(region_id)
+            if idx is None:
+                idx = _REGION_INDEX[region_id] = len(_REGION_INDEX)
+    return idx
+
+
+@functools.lru_cache(maxsize=65536)
+def _parse_price_str(value: str) -> int:
+    clean_val = value.replace(",", "").replace("$", "").strip()
+    if not clean_val:
+        return 0
+    try:
+        return int(float(clean_val))
+    except ValueError:
+        return 0
+
+
+def parse_price(value) -> int:
+    """
+    Convierte un precio (ej: '15,167.00') a entero (15167); 0 si no se puede.
+    Los strings se parsean una sola vez (los mismos precios se repiten
+    entre proveedores y regiones).
+    """
+    if not value:
+        return 0
+    if isinstance(value, str):
+        return _parse_price_str(value)
+    try:
+        return int(float(value))
+    except (ValueError, TypeError):
+        return 0
+
+
+@functools.lru_cache(maxsize=256)
+def normalize_region_name(region_name: str) -> str:
+    """
+    Nombre de región sin tildes ni prefijos, con "_" (memoizado: son pocas).
+    """
+    nfkd_form = unicodedata.normalize("NFKD", region_name)
+    cleaned = "".join([c for c in nfkd_form if not unicodedata.combining(c)])
+    cleaned = cleaned.replace("Region de ", "").replace("Region del ", "")
+    return cleaned.replace(" ", "_").replace("-", "_").replace(".", "")
+
+
+def _parse_many(raws: list):
+    """
+    Parsea en bloque precios tipo '15,167.00': un solo replace sobre el texto
+    unido y map(float) en C. Retorna un array de floats, o None si algún valor
+    no es un string limpio (vacío, número, NaN...) y hay que ir uno por uno.
+    """
+    try:
+        joined = "\0".join(raws)
+        prices = array("d", map(float, joined.replace(",", "").replace("$", "").split("\0")))
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(math.fsum(prices)):
+        return None
+    return prices
+
+
+def compile_offers(offer_prices, product_id) -> dict:
+    """
+    Aplana offerPrices[proveedor][producto][región]["special_price"] del
+    producto en una tabla {índice de región: {proveedor: precio}}, con los
+    precios ya parseados y solo los mayores que 0.
+    """
+    offers: dict = {}
+    if not offer_prices or not product_id or not isinstance(offer_prices, dict):
+        return offers
+    product_id = str(product_id)
+    keys = []
+    raws = []
+    for provider_id, provider_offers in offer_prices.items():
+        if not isinstance(provider_offers, dict):
+            continue
+        product_offers = provider_offers.get(product_id)
+        if not isinstance(product_offers, dict):
+            continue
+        for region_id, region_offer in product_offers.items():
+            if not isinstance(region_offer, dict):
+                continue
+            raw = region_offer.get("special_price")
+            if raw:
+                keys.append((region_id, provider_id))
+                raws.append(raw)
+    if not raws:
+        return offers
+
+    parsed = _parse_many(raws)
+    specials = [int(p) for p in parsed] if parsed is not None else [parse_price(raw) for raw in raws]
+    indexes: dict = {}
+    for (region_id, provider_id), special in zip(keys, specials):
+        if special > 0:
+            idx = indexes.get(region_id)
+            if idx is None:
+                idx = indexes[region_id] = region_index(str(region_id))
+            offers.setdefault(idx, {})[str(provider_id)] = special
+    return offers
+
+
+def _region_min_slow(providers, region_offers) -> int:
+    # Proveedor por proveedor, con el parseo tolerante de parse_price
+    best = 0
+    for provider_id, data in providers.items():
+        if not isinstance(data, dict):
+            continue
+        price = 0
+        if region_offers:
+            price = region_offers.get(provider_id, 0)
+        if not price:
+            price = parse_price(data.get("price", "0"))
+        if price > 0 and (best == 0 or price < best):
+            best = price
+    return best
+
+
+def _region_min(providers, region_offers) -> int:
+    """
+    Precio mínimo (entero, 0 si no hay) de los proveedores de una región.
+
+    Camino rápido: todos los precios se parsean en bloque (_parse_many).
+    Cualquier otra cosa (falta price, números, vacíos, NaN) cae al recorrido
+    proveedor por proveedor.
+    """
+    try:
+        prices = _parse_many([data["price"] for data in providers.values()])
+    except (KeyError, TypeError):
+        prices = None
+    if prices is None:
+        return _region_min_slow(providers, region_offers)
+
+    if region_offers:
+        # Los proveedores con oferta usan su special_price en vez del precio base
+        candidates = [p for pid, p in zip(providers, prices) if pid not in region_offers]
+        candidates.extend(price for pid, price in region_offers.items() if pid in providers)
+    else:
+        candidates = prices
+    # int() trunca igual que el parseo original: válido si el entero es > 0
+    validos = [p for p in candidates if p >= 1]
+    return int(min(validos)) if validos else 0
+
+
+def min_price_by_region(json_prices, offer_prices, product_id, region_names_map) -> dict:
+    """
+    Precio mínimo por región: special_price de offerPrices si existe (> 0),
+    si no el precio de jsonResult. Las ofertas se aplanan una vez por ficha
+    (por índice de región internado) y los precios de cada región se parsean
+    en bloque a un array, así el mínimo sale de una pasada en C.
+    Retorna {nombre de región: precio}.
+    """
+    if not json_prices:
+        return {}
+
+    offers = compile_offers(offer_prices, product_id)
+    precios_finales = {}
+
+    for region_id, providers in json_prices.items():
+        if not isinstance(providers, dict):
+            continue
+        best = _region_min(providers, offers.get(region_index(str(region_id))))
+        if best:
+            nombre = region_names_map.get(region_id, "Region_ID_{}".format(region_id))
+            precios_finales[nombre] = best
+
+    return precios_finales
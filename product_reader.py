@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+
+PRODUCT_COLUMNS = "id_producto,nombre_producto,numero_proveedores,link_producto"
+
+
+def count_productos(supabase, table="cm_productos") -> int | None:
+    """
+    Total de filas de la tabla (solo para mostrar progreso).
+    """
+    try:
+        resp = supabase.table(table).select("id_producto", count="exact").limit(1).execute()
+        return resp.count
+    except Exception as e:
+        print("⚠ No se pudo contar {}: {}".format(table, e))
+        return None
+
+
+def iter_productos(supabase, columns=PRODUCT_COLUMNS, page_size=1000, after=None, table="cm_productos"):
+    """
+    Lee la tabla por páginas con paginación keyset sobre id_producto
+    (WHERE id_producto > último ORDER BY id_producto LIMIT page_size), sin el
+    tope silencioso de un único .limit(). La página siguiente se pide en
+    segundo plano mientras se procesa la actual.
+
+    Se detiene con la primera página vacía: así no importa si PostgREST
+    recorta page_size a su propio máximo de filas.
+    """
+
+    def fetch(cursor):
+        query = supabase.table(table).select(columns).order("id_producto").limit(page_size)
+        if cursor is not None:
+            query = query.gt("id_producto", cursor)
+        return query.execute().data or []
+
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        future = prefetcher.submit(fetch, after)
+        while True:
+            page = future.result()
+            if not page:
+                return
+            # Prefetch de la siguiente página mientras se consumen las filas
+            future = prefetcher.submit(fetch, page[-1]["id_producto"])
+            yield from page
+
+
+class IndexedRows:
+    """
+    Envuelve un iterable de filas: agrega "_index" (1..N) para los logs y
+    recuerda si se consumió completo (para saber si la corrida terminó).
+    """
+
+    def __init__(self, rows):
+        self._rows = rows
+        self.exhausted = False
+
+    def __iter__(self):
+        for idx, row in enumerate(self._rows, start=1):
+            row["_index"] = idx
+            yield row
+        self.exhausted = True
@@ -1,158 +1,272 @@
 import os
-import re
 import time
-import requests
-import pandas as pd
-from bs4 import BeautifulSoup
-from supabase import create_client, Client
+from concurrent.futures import ThreadPoolExecutor
 
-# URL base
-base_url = "https://conveniomarco2.mercadopublico.cl/alimentos2/alimentos"
+from adaptive_concurrency import AdaptiveConcurrency
+from bulk_loader import make_loader
+from http_session import get_fetcher
+from listing_delta import PAGE_SIZE, ListingIndex, delta_crawl, listing_complete
+from listing_parser import parse_listing, parse_total_products
+from metrics import STAGE_FETCH, get_metrics, new_run
+from rate_limiter import TokenBucket
+from supabase_client import get_supabase_client
 
+# URL base (CM_BASE_URL permite apuntar a un servidor local, p. ej. benchmarks.replay)
+base_url = os.environ.get(
+    "CM_BASE_URL", "https://conveniomarco2.mercadopublico.cl/alimentos2/alimentos"
+)
 
-def get_supabase_client() -> Client:
+
+def listing_url(page_num: int) -> str:
     """
-    Crea el cliente de Supabase usando SUPABASE_URL y SUPABASE_KEY
-    desde variables de entorno.
+    URL de una página del listado (25 productos, ordenados por nombre).
     """
-    url = os.environ.get("SUPABASE_URL")
-    key = os.environ.get("SUPABASE_KEY")
-    if not url or not key:
-        raise RuntimeError(
-            "Faltan SUPABASE_URL o SUPABASE_KEY en las variables de entorno."
-        )
-    return create_client(url, key)
+    return (
+        f"{base_url}?p={page_num}"
+        f"&product_list_limit={PAGE_SIZE}&product_list_mode=list&product_list_order=name"
+    )
 
 
 def get_total_products(url: str) -> int | None:
     """
     Extrae el total de productos de la página.
     """
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/91.0.4472.124 Safari/537.36"
-        )
-    }
-
     try:
-        response = requests.get(url, headers=headers, timeout=30)
+        response = get_fetcher().get(url, timeout=30)
         response.raise_for_status()
-        soup = BeautifulSoup(response.content, "html.parser")
-
-        # Buscar el span con clase "toolbar-number" que contiene el total
-        toolbar_spans = soup.find_all("span", class_="toolbar-number")
-        if len(toolbar_spans) >= 2:
-            # El segundo span contiene el total
-            return int(toolbar_spans[1].get_text().strip())
+        # El segundo span "toolbar-number" contiene el total
+        return parse_total_products(response.content)
     except Exception as e:
         print(f"Error al obtener total de productos: {e}")
         return None
 
-    return None
 
-
-def scrape_products_page(page_num: int) -> list[dict]:
+def scrape_products_page(page_num: int, bucket=None) -> list[dict]:
     """
     Extrae información de productos de una página específica.
+    El parser HTML se elige en listing_parser (CM_LISTING_PARSER).
+    Con un bucket (TokenBucket), cada intento de descarga, reintentos
+    incluidos, consume un token.
     """
-    url = (
-        f"{base_url}?p={page_num}"
-        "&product_list_limit=25&product_list_mode=list&product_list_order=name"
-    )
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/91.0.4472.124 Safari/537.36"
-        )
-    }
-
-    products_data: list[dict] = []
+    url = listing_url(page_num)
+    metrics = get_metrics()
 
     try:
         print(f"Extrayendo página {page_num}...")
-        response = requests.get(url, headers=headers, timeout=30)
+        with metrics.time(STAGE_FETCH):
+            response = get_fetcher().get(url, timeout=30, bucket=bucket)
         response.raise_for_status()
-        soup = BeautifulSoup(response.content, "html.parser")
-
-        # Encontrar todos los productos con class="item product product-item"
-        products = soup.find_all("li", class_="item product product-item")
-
-        for product in products:
-            try:
-                # Nombre del producto
-                product_name_elem = product.find("a", class_="product-item-link")
-                product_name = (
-                    product_name_elem.get_text().strip() if product_name_elem else ""
-                )
-
-                # Link del producto
-                product_link = (
-                    product_name_elem.get("href", "") if product_name_elem else ""
-                )
-
-                # Número de proveedores (desde div con class="sellers-count")
-                sellers_elem = product.find("div", class_="sellers-count")
-                num_providers = ""
-                if sellers_elem:
-                    sellers_text = sellers_elem.get_text().strip()
-                    # Extraer solo el número (ej: "78 proveedores" -> "78")
-                    match = re.search(r"(\d+)", sellers_text)
-                    if match:
-                        num_providers = match.group(1)
-
-                # ID del producto (desde div con class="product-id-top")
-                product_id_elem = product.find("div", class_="product-id-top")
-                product_id = ""
-                if product_id_elem:
-                    id_text = product_id_elem.get_text().strip()
-                    match = re.search(r"ID\s+(\d+)", id_text)
-                    if match:
-                        product_id = match.group(1)
-
-                products_data.append(
-                    {
-                        "ID_Producto": product_id,
-                        "Nombre_Producto": product_name,
-                        "Numero_Proveedores": num_providers,
-                        "Link_Producto": product_link,
-                        "Pagina": page_num,
-                    }
-                )
-            except Exception as e:
-                print(f"Error al procesar un producto en página {page_num}: {e}")
-                continue
-
-        return products_data
+        # Productos con class="item product product-item"
+        with metrics.time("parse"):
+            products = parse_listing(response.content, page_num)
+        metrics.count("productos_extraidos", len(products))
+        return products
 
     except Exception as e:
         print(f"Error al procesar página {page_num}: {e}")
+        metrics.count("paginas_con_error")
         return []
 
 
-def main():
+# Columnas del listado y su nombre en cm_productos
+LISTING_COLUMNS = {
+    "ID_Producto": "id_producto",
+    "Nombre_Producto": "nombre_producto",
+    "Numero_Proveedores": "numero_proveedores",
+    "Link_Producto": "link_producto",
+    "Pagina": "pagina",
+}
+
+
+def build_product_records(all_products: list[dict]) -> tuple["pd.DataFrame", list[dict]]:
+    """
+    Convierte los productos del listado en un DataFrame tipado y en los
+    registros para cm_productos, todo en forma columnar (sin iterrows):
+    - normaliza tipos (enteros compactos, texto sin espacios sobrantes),
+    - descarta filas sin ID y duplicados por ID (el listado puede repetir un
+      producto entre páginas si cambia durante el recorrido; se queda la última
+      aparición, igual que haría el upsert),
+    - arma los registros columna a columna con tolist().
+    pandas se importa aquí y no al cargar el módulo (arranque más rápido).
+    """
+    import pandas as pd
+
+    df = pd.DataFrame.from_records(all_products, columns=list(LISTING_COLUMNS))
+    if df.empty:
+        return df, []
+
+    df["ID_Producto"] = df["ID_Producto"].astype("string").str.strip()
+    df["Nombre_Producto"] = df["Nombre_Producto"].astype("string").str.strip().fillna("")
+    df["Link_Producto"] = df["Link_Producto"].astype("string").fillna("")
+    df["Numero_Proveedores"] = (
+        pd.to_numeric(df["Numero_Proveedores"], errors="coerce")
+        .fillna(0)
+        .astype("int32")
+    )
+    df["Pagina"] = pd.to_numeric(df["Pagina"], errors="coerce").fillna(0).astype("int32")
+
+    df = df[df["ID_Producto"].notna() & (df["ID_Producto"] != "")]
+    df = df.drop_duplicates(subset="ID_Producto", keep="last").reset_index(drop=True)
+
+    # Registros alineados con cm_productos: equivalente a to_dict("records"),
+    # pero columna a columna con tolist() (ya entrega tipos nativos de Python)
+    columns = list(LISTING_COLUMNS.values())
+    values = [df[col].tolist() for col in LISTING_COLUMNS]
+    registros = [dict(zip(columns, row)) for row in zip(*values)]
+    return df, registros
+
+
+def crawl_listing_pages(
+    pages: list[int],
+    requests_per_second: float = 1.0,
+    max_in_flight: int = 4,
+) -> list[list[dict]]:
+    """
+    Recorre páginas del listado en paralelo respetando un presupuesto global:
+    - requests_per_second: token bucket compartido por todos los workers.
+    - max_in_flight: máximo de requests simultáneos.
+    Retorna los productos de cada página en el mismo orden de `pages`.
+    """
+    bucket = TokenBucket(requests_per_second)
+    total = len(pages)
+    results: list[list[dict]] = [[] for _ in pages]
+
+    def fetch(pos: int) -> int:
+        results[pos] = scrape_products_page(pages[pos], bucket)
+        return pos
+
+    start = time.monotonic()
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as executor:
+        for pos in executor.map(fetch, range(total)):
+            done += 1
+            elapsed = time.monotonic() - start
+            rate = done / elapsed if elapsed > 0 else 0.0
+            print(
+                f" ✓ Página {pages[pos]}/{pages[-1]} completada - "
+                f"{len(results[pos])} productos extraídos "
+                f"({rate:.2f} páginas/s)"
+            )
+
+    elapsed = time.monotonic() - start
+    if total and elapsed > 0:
+        print(
+            f"✓ {total} páginas en {elapsed:.1f}s "
+            f"({total / elapsed:.2f} páginas/s, "
+            f"límite {requests_per_second} req/s, {max_in_flight} en vuelo)"
+        )
+    return results
+
+
+def run_delta(
+    index: ListingIndex,
+    total_products: int,
+    loader,
+    requests_per_second: float = 1.0,
+    max_in_flight: int = 4,
+    verify_pages: int = 3,
+) -> bool:
+    """
+    Modo delta: descarga solo las páginas del listado que cambiaron respecto
+    del índice local (ver listing_delta.delta_crawl), hace upsert de sus
+    productos (y de la página nueva de los que se corrieron de página) y
+    borra de cm_productos los que ya no aparecen.
+    Retorna False si el índice no alcanza y hay que recorrer todo.
+    """
+    def fetch_pages(pages):
+        return dict(zip(pages, crawl_listing_pages(pages, requests_per_second, max_in_flight)))
+
+    print(f"\n[2/3] Buscando cambios contra el índice ({index.total} productos)...\n")
+    result = delta_crawl(index, total_products, fetch_pages, verify_pages=verify_pages)
+    metrics = get_metrics()
+    if result is None:
+        print("⚠ El listado cambió en más de una zona (o falló una página): recorrido completo")
+        return False
+
+    total_pages = (total_products + PAGE_SIZE - 1) // PAGE_SIZE
+    metrics.count("paginas_delta", result.pages_fetched)
+    print("\n[3/3] Aplicando cambios en cm_productos...")
+    if result.changed_pages:
+        print("✓ Páginas cambiadas: {}-{}".format(*result.changed_pages))
+    else:
+        print("✓ Sin cambios en el listado")
+
+    # delta_crawl ya contrastó el listado reconstruido con todas las páginas
+    # descargadas (cantidades y huellas): si algo no cuadraba retornó None y
+    # no se llega a borrar nada
+    _, registros = build_product_records(result.upserts + result.moved)
+    metrics.count("filas_guardadas", loader.write(registros) if registros else 0)
+    if result.deletes:
+        metrics.count("filas_borradas", loader.delete(result.deletes))
+    index.save(result.products)
+
+    print("\n" + "=" * 60)
+    print("RESUMEN DE EXTRACCIÓN (DELTA)")
+    print("=" * 60)
+    print(f"Páginas descargadas: {result.pages_fetched} de {total_pages}")
+    print(f"Productos actualizados/insertados: {len(result.upserts)}")
+    print(f"Productos reubicados de página: {len(result.moved)}")
+    print(f"Productos eliminados del listado: {len(result.deletes)}")
+    return True
+
+
+def main(
+    requests_per_second: float = 1.0,
+    max_in_flight: int = 4,
+    adaptive: bool = False,
+    metrics_json: str | None = None,
+    metrics_prom: str | None = None,
+    progress_path: str | None = None,
+    bulk: bool = False,
+    db_url: str | None = None,
+    delta: bool = False,
+    index_path: str | None = None,
+    full_every_days: float = 7.0,
+    verify_pages: int = 3,
+):
+    """
+    Recorre el listado y guarda los productos en cm_productos.
+
+    Con delta e index_path, compara el listado contra el índice de la corrida
+    anterior y solo descarga las páginas que cambiaron (inserciones y borrados
+    en cm_productos en vez del upsert completo). Hace el recorrido completo si
+    no hay índice, si tiene más de full_every_days días o si los cambios no se
+    pueden ubicar; el recorrido completo vuelve a guardar el índice.
+    """
     # CONFIGURACIÓN: cuántas páginas máximo quieres recorrer
     MAX_PAGES_TEST = 999999  # Cambia este número si quieres limitar
 
+    # Tiempos por etapa (fetch, parse, upsert): resumen al final y, si se
+    # pide, snapshots de progreso cada 30s
+    metrics = new_run("listado")
+    if progress_path:
+        metrics.start_progress(progress_path)
+
     print("=" * 60)
     print("EXTRACCIÓN DE PRODUCTOS - CONVENIO MARCO ALIMENTOS")
     print("=" * 60)
     print("\nExtrayendo páginas")
     print("\n[1/3] Obteniendo total de productos...")
 
-    first_page_url = (
-        f"{base_url}?p=1"
-        "&product_list_limit=25&product_list_mode=list&product_list_order=name"
-    )
-    total_products = get_total_products(first_page_url)
+    # Sesión HTTP compartida: una conexión keep-alive por worker. Con control
+    # adaptativo, max_in_flight es el techo y el controlador ajusta el resto
+    controller = None
+    if adaptive:
+        controller = AdaptiveConcurrency(
+            min_limit=1,
+            max_limit=max_in_flight,
+            log_path=os.environ.get("CM_AIMD_LOG"),
+        )
+    fetcher = get_fetcher(pool_size=max_in_flight, controller=controller)
+
+    total_products = get_total_products(listing_url(1))
 
     if not total_products:
         print(
             "✗ No se pudo obtener el total de productos. "
             "Verifica la URL o la conexión."
         )
+        metrics.stop_progress()
         return
 
     print(f"✓ Total de productos encontrados: {total_products}")
@@ -165,73 +279,136 @@ def main():
     pages_to_extract = min(MAX_PAGES_TEST, total_pages)
     print(f"✓ Páginas a extraer en esta corrida: {pages_to_extract}")
 
+    supabase = None if db_url else get_supabase_client()
+    index = ListingIndex(index_path) if index_path else None
+
+    if delta and index is not None and pages_to_extract == total_pages:
+        if not index.usable:
+            print("⚠ Sin índice del listado: recorrido completo")
+        elif index.age_days() >= full_every_days:
+            print(f"⚠ Índice con más de {full_every_days:g} días: recorrido completo")
+        else:
+            loader = make_loader(supabase, "cm_productos", "id_producto", chunk_size=500, bulk=bulk, db_url=db_url)
+            try:
+                done = run_delta(index, total_products, loader, requests_per_second, max_in_flight, verify_pages)
+            finally:
+                loader.close()
+            if done:
+                fetcher.print_stats()
+                loader.print_stats()
+                metrics.print_summary(metrics.export(metrics_json, metrics_prom))
+                print("\n✓ Cambios aplicados en tabla cm_productos (Supabase)")
+                return
+
     # Paso 2: Extraer información de las páginas
     print(f"\n[2/3] Extrayendo información de {pages_to_extract} páginas...\n")
 
+    # Las páginas se piden en paralelo, pero con un presupuesto global de
+    # requests/segundo para no sobrecargar el servidor
     all_products: list[dict] = []
-    for page in range(1, pages_to_extract + 1):
-        products = scrape_products_page(page)
+    pages = list(range(1, pages_to_extract + 1))
+    page_results = crawl_listing_pages(pages, requests_per_second, max_in_flight)
+    for products in page_results:
         all_products.extend(products)
-        print(
-            f" ✓ Página {page}/{pages_to_extract} completada - "
-            f"{len(products)} productos extraídos"
-        )
-        # Pausa entre requests para no sobrecargar el servidor
-        time.sleep(2)
 
     # Paso 3: Crear DataFrame y guardar en Supabase
     print("\n[3/3] Procesando y guardando datos en Supabase...")
 
-    df = pd.DataFrame(all_products)
-    print(f"✓ Total de productos extraídos: {len(df)}")
+    total_extraidos = len(all_products)
+    print(f"✓ Total de productos extraídos: {total_extraidos}")
+
+    df, registros = build_product_records(all_products)
 
     if df.empty:
         print("✗ No se extrajeron productos, nada que guardar.")
+        metrics.stop_progress()
         return
 
-    # Normalizar tipos
-    df["Numero_Proveedores"] = (
-        pd.to_numeric(df["Numero_Proveedores"], errors="coerce")
-        .fillna(0)
-        .astype(int)
-    )
-    df["Pagina"] = pd.to_numeric(df["Pagina"], errors="coerce").fillna(0).astype(int)
-
-    # Crear registros alineados con cm_productos
-    registros: list[dict] = []
-    for _, row in df.iterrows():
-        registros.append(
-            {
-                "id_producto": str(row["ID_Producto"]),
-                "nombre_producto": row["Nombre_Producto"],
-                "numero_proveedores": int(row["Numero_Proveedores"]),
-                "link_producto": row["Link_Producto"],
-                "pagina": int(row["Pagina"]),
-            }
-        )
-
-    # Enviar a Supabase (upsert para que sea idempotente)
-    supabase = get_supabase_client()
-    chunk_size = 500
+    descartados = total_extraidos - len(df)
+    if descartados:
+        print(f"✓ {descartados} filas duplicadas o sin ID descartadas antes del upsert")
 
-    for i in range(0, len(registros), chunk_size):
-        chunk = registros[i : i + chunk_size]
-        supabase.table("cm_productos").upsert(
-            chunk,
-            on_conflict="id_producto",  # requiere UNIQUE en la tabla
-        ).execute()
+    # Enviar a Supabase (upsert para que sea idempotente; requiere UNIQUE en
+    # id_producto). Con bulk, lotes en paralelo; con db_url, COPY directo
+    loader = make_loader(supabase, "cm_productos", "id_producto", chunk_size=500, bulk=bulk, db_url=db_url)
+    try:
+        metrics.count("filas_guardadas", loader.write(registros))
+    finally:
+        loader.close()
+
+    # Índice para el próximo recorrido delta: solo si el listado vino entero
+    if index is not None:
+        if pages_to_extract == total_pages and listing_complete(page_results, total_products):
+            index.save([p for products in page_results for p in products])
+            print(f"✓ Índice del listado guardado ({index.total} productos)")
+        else:
+            print("⚠ Listado incompleto (páginas con error o cambios durante el recorrido): índice sin actualizar")
 
     # Resumen
     print("\n" + "=" * 60)
     print("RESUMEN DE EXTRACCIÓN")
     print("=" * 60)
-    print(f"Total de productos extraídos: {len(df)}")
-    print(f"Productos únicos (por ID): {df['ID_Producto'].nunique()}")
+    print(f"Total de productos extraídos: {total_extraidos}")
+    print(f"Productos únicos (por ID): {len(df)}")
     print(f"Páginas procesadas: {pages_to_extract} de {total_pages} disponibles")
     print("\nPrimeros 10 productos extraídos (solo en memoria):")
     print(df[["ID_Producto", "Nombre_Producto", "Numero_Proveedores"]].head(10))
+    fetcher.print_stats()
+    loader.print_stats()
+    metrics.print_summary(metrics.export(metrics_json, metrics_prom))
     print("\n✓ Datos guardados/actualizados en tabla cm_productos (Supabase)")
 
 
+def cli(argv=None, prog=None):
+    """
+    Línea de comandos del listado (también `python -m cm_cli listado`). Los
+    valores por defecto salen de las variables de entorno de siempre:
+    CM_LISTADO_RPS: requests/segundo permitidos contra el sitio
+    CM_LISTADO_EN_VUELO: máximo de páginas pidiéndose a la vez
+    CM_LISTADO_ADAPTATIVO=1: ajustar las páginas en vuelo (AIMD) según el sitio
+    CM_LISTADO_METRICS_JSON / CM_LISTADO_METRICS_PROM: resumen de tiempos por etapa
+    CM_LISTADO_PROGRESS: archivo JSONL con snapshots de progreso
+    CM_LISTADO_BULK=1: subir cm_productos en lotes paralelos auto-ajustados
+    CM_DB_URL: URL de Postgres para cargar por COPY en vez de la API REST
+    CM_LISTADO_DELTA=1: descargar solo las páginas que cambiaron (índice en CM_LISTADO_INDICE)
+    CM_LISTADO_COMPLETO_DIAS: días máximos entre recorridos completos en modo delta
+    """
+    import argparse
+
+    env = os.environ.get
+    parser = argparse.ArgumentParser(prog=prog, description="Listado de productos a cm_productos")
+    parser.add_argument("--rps", type=float, default=float(env("CM_LISTADO_RPS", "1.0")),
+                        help="requests/segundo permitidos contra el sitio")
+    parser.add_argument("--in-flight", type=int, default=int(env("CM_LISTADO_EN_VUELO", "4")),
+                        help="máximo de páginas pidiéndose a la vez")
+    parser.add_argument("--adaptive", action="store_true", default=env("CM_LISTADO_ADAPTATIVO") == "1",
+                        help="ajustar las páginas en vuelo (AIMD) según el sitio")
+    parser.add_argument("--metrics-json", default=env("CM_LISTADO_METRICS_JSON"))
+    parser.add_argument("--metrics-prom", default=env("CM_LISTADO_METRICS_PROM"))
+    parser.add_argument("--progress-path", default=env("CM_LISTADO_PROGRESS"))
+    parser.add_argument("--bulk", action="store_true", default=env("CM_LISTADO_BULK") == "1",
+                        help="subir cm_productos en lotes paralelos auto-ajustados")
+    parser.add_argument("--db-url", default=env("CM_DB_URL"), help="URL de Postgres para cargar por COPY")
+    parser.add_argument("--delta", action="store_true", default=env("CM_LISTADO_DELTA") == "1",
+                        help="descargar solo las páginas que cambiaron desde el índice")
+    parser.add_argument("--index-path", default=env("CM_LISTADO_INDICE", ".cache/indice_listado.json"))
+    parser.add_argument("--full-every-days", type=float, default=float(env("CM_LISTADO_COMPLETO_DIAS", "7")),
+                        help="días máximos entre recorridos completos en modo delta")
+    args = parser.parse_args(argv)
+    main(
+        requests_per_second=args.rps,
+        max_in_flight=args.in_flight,
+        adaptive=args.adaptive,
+        metrics_json=args.metrics_json,
+        metrics_prom=args.metrics_prom,
+        progress_path=args.progress_path,
+        bulk=args.bulk,
+        db_url=args.db_url,
+        delta=args.delta,
+        index_path=args.index_path,
+        full_every_days=args.full_every_days,
+    )
+
+
 if __name__ == "__main__":
-    main()
+    cli()
@@ -1,74 +1,107 @@
 import os
 import re
+import functools
+import itertools
 import json
 import time
-import unicodedata
-import requests
-import pandas as pd
-from supabase import create_client, Client
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
 
+from adaptive_concurrency import AdaptiveConcurrency
+from bulk_loader import make_loader
+from checkpoint import RunCheckpoint
+from http_cache import CACHE_MISS, ResponseCache
+from http_session import get_fetcher, print_http_stats
+from metrics import STAGE_COMPUTE, STAGE_EXTRACT, STAGE_FETCH, get_metrics, new_run
+from price_model import min_price_by_region, normalize_region_name, parse_price
+from product_reader import IndexedRows, count_productos, iter_productos
+from scrape_priority import ScrapeHistory, plan_incremental
+from sharding import filter_shard, parse_shard, shard_name, shard_path
+from streaming_upsert import UNCHANGED, BatchUpserter
+from supabase_client import get_supabase_client
 
-def get_supabase_client():
-    """
-    Crea el cliente de Supabase usando SUPABASE_URL y SUPABASE_KEY
-    desde variables de entorno.
-    """
-    url = os.environ.get("SUPABASE_URL")
-    key = os.environ.get("SUPABASE_KEY")
-    if not url or not key:
-        raise RuntimeError(
-            "Faltan SUPABASE_URL o SUPABASE_KEY en las variables de entorno."
-        )
-    return create_client(url, key)
 
+# Decodificador JSON reutilizable: raw_decode parsea desde un offset en C,
+# respetando strings y escapes, sin copiar el HTML.
+_JSON_DECODER = json.JSONDecoder()
+_BRACE_RE = re.compile(r"[{}]")
 
-def extract_json_object_by_key(html_content, key_name):
+# Claves que necesita cada ficha de producto
+PRODUCT_JSON_KEYS = ("region_names", "regionMapping", "jsonResult", "offerPrices")
+
+
+@functools.lru_cache(maxsize=32)
+def _keys_pattern(key_names):
+    # Las claves más largas primero, por si una es prefijo de otra
+    ordered = sorted(key_names, key=len, reverse=True)
+    return re.compile("|".join(re.escape(k) for k in ordered))
+
+
+def _decode_legacy(html_content, idx_open_brace):
     """
-    Extrae un objeto JSON desde HTML buscando una clave (por ejemplo 'jsonResult')
-    y encontrando la llave de cierre correspondiente.
+    Respaldo para blobs que no son JSON válido tal cual (comillas escapadas
+    o simples): cuenta llaves con una regex y aplica la limpieza original.
     """
-    idx_key = html_content.find(key_name)
-    if idx_key == -1:
-        idx_key = html_content.find('"{}"'.format(key_name))
-    if idx_key == -1:
+    depth = 0
+    idx_end_brace = -1
+    for match in _BRACE_RE.finditer(html_content, idx_open_brace):
+        depth += 1 if match.group() == "{" else -1
+        if depth == 0:
+            idx_end_brace = match.end()
+            break
+    if idx_end_brace == -1:
         return None
 
-    # Primera llave '{' después de la clave
-    idx_open_brace = html_content.find("{", idx_key)
-    if idx_open_brace == -1:
-        return None
+    json_str = html_content[idx_open_brace:idx_end_brace]
+    try:
+        json_str_clean = (
+            json_str.replace("\n", "")
+            .replace("\r", "")
+            .replace('\\"', '"')
+        )
+        return json.loads(json_str_clean)
+    except json.JSONDecodeError:
+        try:
+            return json.loads(json_str.replace("'", '"'))
+        except Exception:
+            return None
 
-    brace_count = 0
-    idx_end_brace = -1
-    # Límite de búsqueda para no congelar en HTML muy grande
-    search_limit = min(idx_open_brace + 500000, len(html_content))
-
-    for i in range(idx_open_brace, search_limit):
-        if html_content[i] == "{":
-            brace_count += 1
-        elif html_content[i] == "}":
-            brace_count -= 1
-        if brace_count == 0:
-            idx_end_brace = i + 1
-            break
 
-    if idx_end_brace != -1:
-        json_str = html_content[idx_open_brace:idx_end_brace]
+def extract_json_objects(html_content, key_names):
+    """
+    Extrae varios objetos JSON embebidos en el HTML con una sola pasada:
+    ubica la primera aparición de cada clave y decodifica el objeto que
+    empieza en la primera '{' posterior con json raw_decode.
+    Retorna {clave: objeto o None}.
+    """
+    key_names = tuple(key_names)
+    found = dict.fromkeys(key_names)
+    positions = {}
+
+    for match in _keys_pattern(key_names).finditer(html_content):
+        key = match.group()
+        if key not in positions:
+            positions[key] = match.end()
+            if len(positions) == len(key_names):
+                break
+
+    for key, idx_key in positions.items():
+        idx_open_brace = html_content.find("{", idx_key)
+        if idx_open_brace == -1:
+            continue
         try:
-            json_str_clean = (
-                json_str.replace("\n", "")
-                .replace("\r", "")
-                .replace('\\"', '"')
-            )
-            return json.loads(json_str_clean)
+            found[key], _ = _JSON_DECODER.raw_decode(html_content, idx_open_brace)
         except json.JSONDecodeError:
-            try:
-                return json.loads(json_str.replace("'", '"'))
-            except Exception:
-                pass
+            found[key] = _decode_legacy(html_content, idx_open_brace)
 
-    return None
+    return found
+
+
+def extract_json_object_by_key(html_content, key_name):
+    """
+    Extrae un objeto JSON desde HTML buscando una clave (por ejemplo 'jsonResult')
+    y encontrando la llave de cierre correspondiente.
+    """
+    return extract_json_objects(html_content, (key_name,))[key_name]
 
 
 def extract_product_id(html_content):
@@ -85,251 +118,784 @@ def clean_column_name(region_name):
     """
     Normaliza nombres de región (por compatibilidad con columnas tipo 'Precio_Region').
     """
-    nfkd_form = unicodedata.normalize("NFKD", region_name)
-    cleaned = "".join([c for c in nfkd_form if not unicodedata.combining(c)])
-    cleaned = cleaned.replace("Region de ", "").replace("Region del ", "")
-    cleaned = cleaned.replace(" ", "_").replace("-", "_").replace(".", "")
-    return "Precio_{}".format(cleaned)
+    return "Precio_{}".format(normalize_region_name(region_name))
 
 
 def clean_price_value(value):
     """
     Convierte un string de precio (ej: '15,167.00') a entero (15167).
     """
-    if not value:
-        return 0
-    try:
-        if isinstance(value, str):
-            clean_val = value.replace(",", "").replace("$", "").strip()
-            if not clean_val:
-                return 0
-            return int(float(clean_val))
-        else:
-            return int(float(value))
-    except (ValueError, TypeError):
-        return 0
+    return parse_price(value)
 
 
 def get_minimum_price_by_region_with_offers(json_prices, offer_prices, product_id, region_names_map):
     """
     Calcula precio mínimo por región, priorizando 'special_price' de offerPrices
-    si está disponible.
+    si está disponible (ver price_model: ofertas aplanadas e índices de región
+    internados, un solo recorrido por proveedor).
+    """
+    return min_price_by_region(json_prices, offer_prices, product_id, region_names_map)
+
+
+def parse_num_providers(row):
+    """
+    Parseo seguro de número de proveedores desde una fila de cm_productos.
+    """
+    try:
+        # None y NaN caen al except
+        return int(float(row.get("numero_proveedores", 0)))
+    except Exception:
+        return 0
+
+
+def timed_parse_product_prices(html):
+    """
+    Parte CPU de la ficha (sin I/O, se puede ejecutar en otro proceso):
+    - obtiene region_names/regionMapping, jsonResult y offerPrices,
+    - calcula precios mínimos por región.
+    Retorna (precios, segundos de extracción, segundos de cálculo); precios es
+    None si no hay jsonResult, o el dict {region: precio} (puede venir vacío).
+    Los tiempos vuelven con el resultado para registrarlos en el proceso padre.
     """
+    t0 = time.perf_counter()
+    blobs = extract_json_objects(html, PRODUCT_JSON_KEYS)
+    product_id_internal = extract_product_id(html)
+    t1 = time.perf_counter()
+    precios, compute_s = timed_prices_from_blobs(blobs, product_id_internal)
+    return precios, t1 - t0, compute_s
+
+
+def timed_prices_from_blobs(blobs, product_id_internal):
+    """
+    Cálculo de precios a partir de los objetos JSON ya extraídos de la ficha
+    (de extract_json_objects o de una ProductPage leída en streaming).
+    Retorna (precios, segundos de cálculo).
+    """
+    # 1. Metadatos de regiones
+    region_names_map = blobs["region_names"] or blobs["regionMapping"] or {}
+
+    # 2. Datos de precios
+    json_prices = blobs["jsonResult"]
+    offer_prices = blobs["offerPrices"]
+
     if not json_prices:
-        return {}
+        return None, 0.0
+
+    # 3. Cálculo de precios por región (incluyendo ofertas)
+    t0 = time.perf_counter()
+    precios = get_minimum_price_by_region_with_offers(
+        json_prices,
+        offer_prices,
+        product_id_internal,
+        region_names_map,
+    )
+    return precios, time.perf_counter() - t0
 
-    precios_finales = {}
 
-    # json_prices tiene keys = IDs de región
-    for region_id, providers in json_prices.items():
-        nombre_region_real = region_names_map.get(region_id, "Region_ID_{}".format(region_id))
+def parse_product_prices(html):
+    """
+    Como timed_parse_product_prices, sin los tiempos.
+    """
+    return timed_parse_product_prices(html)[0]
 
-        if not isinstance(providers, dict):
-            continue
 
-        lista_precios = []
+def record_parse_timings(metrics, extract_s, compute_s):
+    """
+    Registra los tiempos que retorna timed_parse_product_prices.
+    """
+    metrics.observe(STAGE_EXTRACT, extract_s)
+    if compute_s:
+        metrics.observe(STAGE_COMPUTE, compute_s)
 
-        for provider_id, data in providers.items():
-            if not isinstance(data, dict):
-                continue
 
-            # 1. Precio estándar desde jsonResult
-            price_raw = data.get("price", "0")
-            price_final = clean_price_value(price_raw)
+def build_price_row(row, precios_region):
+    """
+    Arma el dict para cm_precios_minimos a partir de la fila de cm_productos
+    y el resultado de parse_product_prices. Retorna None si no hay precios.
+    """
+    producto_id_csv = row.get("id_producto")
 
-            # 2. Revisar special_price en offerPrices
-            # Estructura: offerPrices[provider_id][product_id][region_id]['special_price']
-            if offer_prices and product_id:
-                try:
-                    provider_offers = offer_prices.get(str(provider_id))
-                    if provider_offers:
-                        product_offers = provider_offers.get(str(product_id))
-                        if product_offers:
-                            region_offer = product_offers.get(str(region_id))
-                            if region_offer:
-                                special_price_raw = region_offer.get("special_price")
-                                if special_price_raw:
-                                    special_price = clean_price_value(special_price_raw)
-                                    if special_price > 0:
-                                        price_final = special_price
-                except Exception:
-                    # En caso de error en estructura de offers, usar precio estándar
-                    pass
+    if precios_region is None:
+        print(" ⚠ No se encontró jsonResult para ID {}".format(producto_id_csv))
+        return None
+    if not precios_region:
+        print(" ⚠ Sin precios válidos encontrados para ID {}".format(producto_id_csv))
+        return None
 
-            if price_final > 0:
-                lista_precios.append(price_final)
+    precio_global = int(min(precios_region.values()))
+    mejor_region = min(precios_region, key=precios_region.get)
+    print(" ✓ Mínimo encontrado para {}: ${} ({})".format(producto_id_csv, precio_global, mejor_region))
+
+    return {
+        "id_producto": str(producto_id_csv),
+        "nombre_producto": row.get("nombre_producto", ""),
+        "numero_proveedores": parse_num_providers(row),
+        "link_producto": row.get("link_producto", ""),
+        "precio_minimo_global": precio_global,
+        "region_mejor_precio": mejor_region,
+        # JSON con precios por región: { "Region Metropolitana": 1234, ... }
+        "precios_region": precios_region,
+    }
 
-        if lista_precios:
-            precios_finales[nombre_region_real] = min(lista_precios)
 
-    return precios_finales
+def polite_pause(fetcher):
+    """
+    Pausa fija entre fichas por worker. Con control adaptativo de concurrencia
+    no hace falta: el controlador decide el ritmo según la respuesta del sitio.
+    """
+    if fetcher.controller is None:
+        time.sleep(0.2)
 
 
-def process_one_product(row, headers, total_count):
+def fetch_product_page(row, fetcher, total_count, cache=None, history=None, stream=False):
     """
-    Procesa un producto individual:
-    - hace request a la ficha,
-    - obtiene jsonResult y offerPrices,
-    - calcula precios mínimos por región,
-    - retorna un dict listo para guardar en Supabase.
+    Parte I/O de process_one_product: descarga la ficha (condicional si hay
+    caché). Retorna la respuesta 200 a procesar, UNCHANGED si la ficha no
+    cambió, o None si hubo un error HTTP o de red.
+
+    Con stream=True el cuerpo se lee por chunks (page_stream): se extraen los
+    objetos JSON al vuelo, el cuerpo va comprimido a disco si hay caché, y se
+    retorna una ProductPage en vez de la respuesta. Así un worker no retiene
+    el HTML completo (ni su copia decodificada) mientras calcula.
     """
     idx = row.get("_index", 0)
     producto_id_csv = row.get("id_producto")
     nombre = row.get("nombre_producto", "")
     link = row.get("link_producto", "")
-
-    # Parseo seguro de número de proveedores
-    try:
-        raw_prov = row.get("numero_proveedores", 0)
-        if pd.isna(raw_prov):
-            num_providers = 0
-        else:
-            num_providers = int(float(raw_prov))
-    except Exception:
-        num_providers = 0
+    metrics = get_metrics()
 
     print("[{}/{}] ID: {} | {}...".format(idx, total_count, producto_id_csv, nombre[:30]))
 
     try:
-        response = requests.get(link, headers=headers, timeout=15)
+        headers = cache.conditional_headers(link) if cache is not None else None
+        with metrics.time(STAGE_FETCH):
+            response = fetcher.get(link, headers=headers, timeout=15, stream=stream)
+        if stream and response.status_code == 200:
+            from page_stream import read_product_page
+
+            with metrics.time(STAGE_EXTRACT):
+                page = read_product_page(
+                    response, PRODUCT_JSON_KEYS, spool=cache.spool(link) if cache is not None else None
+                )
+            if cache is not None and cache.check(link, 200, body_hash=page.body_hash) != CACHE_MISS:
+                page.discard()
+                print(" = Sin cambios para ID {} (caché)".format(producto_id_csv))
+                metrics.count("sin_cambios")
+                if history is not None:
+                    history.record(producto_id_csv, None)
+                return UNCHANGED
+            return page
+        if stream:
+            response.close()
+
+        if cache is not None and response.status_code in (200, 304):
+            body = response.content if response.status_code == 200 else None
+            if cache.check(link, response.status_code, body) != CACHE_MISS:
+                print(" = Sin cambios para ID {} (caché)".format(producto_id_csv))
+                metrics.count("sin_cambios")
+                if history is not None:
+                    history.record(producto_id_csv, None)
+                return UNCHANGED
+
         if response.status_code != 200:
             print(" ⚠ Error HTTP {} para ID {}".format(response.status_code, producto_id_csv))
-            time.sleep(0.2)
+            metrics.count("error_http")
             return None
+        return response
 
-        html = response.text
-
-        # 1. Metadatos de regiones
-        region_names_map = extract_json_object_by_key(html, "region_names")
-        if not region_names_map:
-            region_names_map = extract_json_object_by_key(html, "regionMapping") or {}
-
-        product_id_internal = extract_product_id(html)
+    except Exception as e:
+        print(" ✗ Error procesando ID {}: {}".format(producto_id_csv, e))
+        metrics.count("error")
+    return None
 
-        # 2. Datos de precios
-        json_prices = extract_json_object_by_key(html, "jsonResult")
-        offer_prices = extract_json_object_by_key(html, "offerPrices")
 
-        if json_prices:
-            # 3. Cálculo de precios por región (incluyendo ofertas)
-            precios_region = get_minimum_price_by_region_with_offers(
-                json_prices,
-                offer_prices,
-                product_id_internal,
-                region_names_map,
+def price_row_from_response(row, response, cache=None, history=None):
+    """
+    Parte CPU de process_one_product: precios de la ficha descargada y fila
+    para cm_precios_minimos (None si no hay precios). Guarda la ficha en la
+    caché y registra la revisión en el historial.
+    `response` puede ser la respuesta de requests o una ProductPage (stream).
+    """
+    metrics = get_metrics()
+    streamed = not hasattr(response, "text")
+    if streamed:
+        # La extracción ya se midió mientras se leía el cuerpo
+        precios_region, compute_s = timed_prices_from_blobs(response.blobs, response.product_id)
+        if compute_s:
+            metrics.observe(STAGE_COMPUTE, compute_s)
+    else:
+        precios_region, extract_s, compute_s = timed_parse_product_prices(response.text)
+        record_parse_timings(metrics, extract_s, compute_s)
+    row_data = build_price_row(row, precios_region)
+    metrics.count("con_precio" if row_data is not None else "sin_precio")
+    if streamed:
+        if row_data is not None and response.spool is not None:
+            cache.put_spooled(
+                row.get("link_producto", ""),
+                response.spool,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
             )
-
-            if precios_region:
-                precio_global = int(min(precios_region.values()))
-                mejor_region = min(precios_region, key=precios_region.get)
-                print(" ✓ Mínimo encontrado para {}: ${} ({})".format(producto_id_csv, precio_global, mejor_region))
-
-                row_data = {
-                    "id_producto": str(producto_id_csv),
-                    "nombre_producto": nombre,
-                    "numero_proveedores": num_providers,
-                    "link_producto": link,
-                    "precio_minimo_global": precio_global,
-                    "region_mejor_precio": mejor_region,
-                    # JSON con precios por región: { "Region Metropolitana": 1234, ... }
-                    "precios_region": precios_region,
-                }
-
-                time.sleep(0.2)
-                return row_data
-            else:
-                print(" ⚠ Sin precios válidos encontrados para ID {}".format(producto_id_csv))
+            response.spool = None  # ahora es de la caché
         else:
-            print(" ⚠ No se encontró jsonResult para ID {}".format(producto_id_csv))
+            response.discard()
+    elif row_data is not None and cache is not None:
+        cache.put(
+            row.get("link_producto", ""),
+            response.content,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+    if row_data is not None and history is not None:
+        history.record(row.get("id_producto"), row_data["precio_minimo_global"])
+    return row_data
 
-    except Exception as e:
-        print(" ✗ Error procesando ID {}: {}".format(producto_id_csv, e))
 
-    time.sleep(0.2)
-    return None
+def process_one_product(row, fetcher, total_count, cache=None, history=None, stream=False):
+    """
+    Procesa un producto individual:
+    - hace request a la ficha (condicional si hay caché),
+    - obtiene jsonResult y offerPrices,
+    - calcula precios mínimos por región,
+    - retorna un dict listo para guardar en Supabase.
+    Si la ficha no cambió desde la corrida anterior (304 o mismo hash)
+    retorna UNCHANGED sin parsear: no hay nada nuevo que guardar. Retorna
+    None si hubo un error o la ficha no tiene precios.
+    Si hay history, registra la revisión para el modo incremental.
+    Con stream=True la ficha se lee por chunks (ver fetch_product_page).
+    """
+    row_data = None
+    response = fetch_product_page(row, fetcher, total_count, cache, history, stream)
+    if response is UNCHANGED:
+        row_data = UNCHANGED
+    elif response is not None:
+        try:
+            row_data = price_row_from_response(row, response, cache, history)
+        except Exception as e:
+            print(" ✗ Error procesando ID {}: {}".format(row.get("id_producto"), e))
+            get_metrics().count("error")
+            if stream:
+                response.discard()
+    polite_pause(fetcher)
+    return row_data
+
+
+def run_thread_engine(
+    rows, total_count, sink, max_workers=8, cache=None, history=None, deadline=None, controller=None, stream=False
+):
+    """
+    Motor por defecto: ThreadPoolExecutor con requests bloqueantes.
+    Con `controller` (AdaptiveConcurrency), max_workers es solo el techo de
+    threads: el controlador decide cuántos requests van en vuelo.
+    Los productos se envían al pool de a poco (ventana acotada), así se puede
+    cortar al llegar a `deadline` (time.monotonic()) sin encolar todo, y cada
+    resultado pasa al `sink` (BatchUpserter) apenas termina.
+    Retorna los contadores HTTP.
+    """
+    # Sesión HTTP compartida (pool de conexiones del tamaño del número de workers)
+    fetcher = get_fetcher(pool_size=max_workers, controller=controller)
 
+    def collect(done, pending):
+        for fut in done:
+            row = pending.pop(fut)
+            try:
+                data = fut.result()
+            except Exception as e:
+                print("✗ Error en thread: {}".format(e))
+                data = None
+            sink.add(row.get("id_producto"), data)
 
-def process_products_with_prices(max_products=3, max_workers=8):
+    # Paralelización con ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        for submitted, row in enumerate(rows):
+            if deadline is not None and time.monotonic() >= deadline:
+                print("⏱ Presupuesto de tiempo agotado: {} productos quedan para la próxima corrida".format(
+                    total_count - submitted
+                ))
+                break
+            if len(pending) >= max_workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done, pending)
+            sink.submitted(row.get("id_producto"))
+            fut = executor.submit(process_one_product, row, fetcher, total_count, cache, history, stream)
+            pending[fut] = row
+
+        done, _ = wait(pending)
+        collect(done, pending)
+
+    return fetcher.stats()
+
+
+def process_products_with_prices(
+    max_products=3,
+    max_workers=8,
+    engine="threads",
+    async_concurrency=200,
+    async_rps=20.0,
+    cache_dir=None,
+    cache_max_mb=512,
+    history_path=None,
+    incremental=False,
+    refresh_days=7,
+    budget_minutes=None,
+    max_requests=None,
+    checkpoint_path=None,
+    resume=False,
+    adaptive=False,
+    min_workers=2,
+    aimd_log=None,
+    metrics_json=None,
+    metrics_prom=None,
+    progress_path=None,
+    progress_interval=30.0,
+    bulk=False,
+    db_url=None,
+    changed_ids_path=None,
+    price_history_dir=None,
+    shard=None,
+    stream_pages=False,
+    index_port=None,
+):
     """
-    - Lee productos desde cm_productos en Supabase.
-    - Procesa en paralelo con ThreadPoolExecutor.
-    - Guarda resumen en cm_precios_minimos (Supabase).
+    - Lee productos desde cm_productos en Supabase, por páginas (keyset).
+    - Procesa en paralelo con ThreadPoolExecutor (engine="threads")
+      o con asyncio (engine="async").
+    - Si hay cache_dir, usa requests condicionales y omite las fichas sin cambios.
+    - En modo incremental, revisa primero los productos más valiosos según el
+      historial y corta al agotar el presupuesto (budget_minutes / max_requests).
+    - Con adaptive=True, el número de requests en vuelo se ajusta (AIMD) entre
+      min_workers y max_workers según latencia y errores del sitio.
+    - Guarda resumen en cm_precios_minimos (Supabase) en lotes, a medida que
+      terminan los productos, con checkpoint local para retomar (resume=True).
+    - Mide fetch/extract/compute/upsert por producto: resumen en metrics_json
+      (y textfile de Prometheus en metrics_prom); con progress_path escribe un
+      snapshot cada progress_interval segundos.
+    - Con bulk=True los lotes se suben por REST en paralelo con tamaño
+      auto-ajustado; con db_url, por COPY directo a Postgres.
+    - Con changed_ids_path, anota los IDs guardados para el refresco
+      incremental de cm_precios_region.
+    - Con price_history_dir, agrega los precios guardados (mínimo global,
+      mejor región y precio por región) al historial en Parquet particionado
+      por fecha (ver price_history.py): cm_precios_minimos solo tiene el último.
+    - Con shard=(i, N), procesa solo los productos de ese shard (CRC32 de
+      id_producto): cada shard usa sus propios archivos locales (checkpoint,
+      historial, caché, IDs cambiados, métricas) y escribe sus resultados
+      por su cuenta. Los límites de requests (max_workers, min_workers,
+      async_concurrency, async_rps) son el total de los N shards: cada uno
+      usa su parte (split_budget).
+    - Con stream_pages=True (solo engine="threads") las fichas se leen por
+      chunks y se extraen al vuelo, sin retener el HTML completo por worker.
+    - Con index_port, sirve durante la corrida la API de consultas de
+      price_index.py en ese puerto (+ i en el shard i): el índice parte de
+      cm_precios_minimos y se actualiza con cada lote guardado.
+    Retorna cuántas filas se guardaron.
     """
+    if shard is not None:
+        max_workers, min_workers, async_concurrency, async_rps = split_budget(
+            shard[1], max_workers, min_workers, async_concurrency, async_rps
+        )
+        checkpoint_path = shard_path(checkpoint_path, shard)
+        history_path = shard_path(history_path, shard)
+        changed_ids_path = shard_path(changed_ids_path, shard)
+        metrics_json = shard_path(metrics_json, shard)
+        metrics_prom = shard_path(metrics_prom, shard)
+        progress_path = shard_path(progress_path, shard)
+        aimd_log = shard_path(aimd_log, shard)
+        if cache_dir:
+            cache_dir = os.path.join(cache_dir, shard_name(shard))
+
+    metrics = new_run("precios" if shard is None else "precios-" + shard_name(shard))
+    started = time.monotonic()
+    deadline = started + budget_minutes * 60 if budget_minutes else None
+
     print("=" * 70)
     print("EXTRACCIÓN DE PRECIOS CON OFERTAS")
+    if shard is not None:
+        print("Shard {} de {}".format(*shard))
+        print("Presupuesto del shard: {} threads ({} mín. adaptativo) | async: {} en vuelo, {:.1f} req/s".format(
+            max_workers, min_workers, async_concurrency, async_rps
+        ))
     print("=" * 70)
 
     supabase = get_supabase_client()
 
-    # Leer productos desde cm_productos (limitado por max_products)
-    resp = (
-        supabase.table("cm_productos")
-        .select("id_producto,nombre_producto,numero_proveedores,link_producto")
-        .limit(max_products)
-        .execute()
+    history = ScrapeHistory(history_path) if history_path else None
+    checkpoint = None
+    if checkpoint_path:
+        checkpoint = RunCheckpoint(checkpoint_path, resume=resume, ordered=not incremental)
+
+    if incremental:
+        if history is None:
+            raise ValueError("El modo incremental requiere history_path.")
+        # El modo incremental necesita ver todo el catálogo (del shard) para priorizar
+        rows = iter_productos(supabase)
+        if shard is not None:
+            rows = filter_shard(rows, shard)
+        rows = list(itertools.islice(rows, max_products))
+        if not rows:
+            print("✗ No se encontraron productos en cm_productos.")
+            return 0
+        rows = plan_incremental(rows, history, refresh_days, max_requests)
+        if checkpoint is not None:
+            # El orden depende del historial y cambia entre corridas: el
+            # cursor no sirve, solo los IDs terminados (ordered=False)
+            rows = list(checkpoint.pending(rows, cursor_applied=True))
+        total_count = len(rows)
+    else:
+        # Lectura por páginas (keyset sobre id_producto): los workers empiezan
+        # con la primera página, sin esperar a cargar toda la tabla
+        after = checkpoint.cursor if checkpoint is not None else None
+        rows = iter_productos(supabase, after=after)
+        if shard is not None:
+            rows = filter_shard(rows, shard)
+        if checkpoint is not None:
+            rows = checkpoint.pending(rows, cursor_applied=True)
+        limit = max_products if max_requests is None else min(max_products, max_requests)
+        rows = itertools.islice(rows, limit)
+        catalog = count_productos(supabase)
+        if catalog and shard is not None:
+            catalog = -(-catalog // shard[1])  # aproximado: el hash reparte parejo
+        total_count = min(limit, catalog or limit)
+
+    rows = IndexedRows(rows)
+    print("✓ Procesando hasta {} productos...\n".format(total_count))
+    metrics.set_gauge("productos_total", total_count)
+    if progress_path:
+        metrics.start_progress(progress_path, progress_interval)
+
+    cache = None
+    if cache_dir:
+        cache = ResponseCache(cache_dir, max_bytes=cache_max_mb * 1024 * 1024)
+
+    # Upsert en cm_precios_minimos por lotes, a medida que terminan los productos.
+    # La carga masiva (REST en paralelo o COPY) rinde con lotes más grandes
+    sink_chunk = 1000 if (bulk or db_url) else 200
+    price_history = None
+    if price_history_dir:
+        from price_history import open_price_history
+
+        price_history = open_price_history(price_history_dir)
+    price_index = index_server = None
+    if index_port:
+        from price_index import PriceIndexServer, load_price_index
+
+        price_index = load_price_index(supabase)
+        index_server = PriceIndexServer(price_index, port=index_port + (shard[0] if shard else 0)).start()
+
+    loader = make_loader(supabase, "cm_precios_minimos", chunk_size=200, bulk=bulk, db_url=db_url)
+    sink = BatchUpserter(
+        supabase,
+        "cm_precios_minimos",
+        chunk_size=sink_chunk,
+        checkpoint=checkpoint,
+        loader=loader,
+        changed_ids_path=changed_ids_path,
+        price_history=price_history,
+        price_index=price_index,
     )
 
-    if not resp.data:
-        print("✗ No se encontraron productos en cm_productos.")
-        return None
+    if engine == "async":
+        if stream_pages:
+            print("⚠ --stream-pages no aplica al motor async: las fichas se leen completas")
+        from async_engine import run_async_engine
+
+        http_stats = run_async_engine(
+            rows,
+            total_count,
+            sink,
+            concurrency=async_concurrency,
+            requests_per_second=async_rps,
+            cache=cache,
+            history=history,
+            deadline=deadline,
+        )
+    else:
+        controller = None
+        if adaptive:
+            controller = AdaptiveConcurrency(
+                min_limit=min_workers,
+                max_limit=max_workers,
+                initial=min_workers,
+                log_path=aimd_log,
+            )
+        http_stats = run_thread_engine(
+            rows, total_count, sink, max_workers, cache, history, deadline, controller, stream_pages
+        )
 
-    rows = resp.data
-    total_count = len(rows)
-    print("✓ Procesando {} productos...\n".format(total_count))
+    sink.flush()
+    loader.close()
+    loader.print_stats()
+    if price_history is not None:
+        price_history.close()
+        price_history.print_stats()
+    if index_server is not None:
+        index_server.shutdown()
+    print_http_stats(http_stats)
+    metrics.set_gauge("http", {str(k): v for k, v in http_stats.items()})
+    metrics.print_summary(metrics.export(metrics_json, metrics_prom))
+
+    # La caché y el historial se persisten recién ahora que los precios
+    # quedaron en Supabase
+    if cache is not None:
+        cache.save()
+        cache.print_stats()
+    if history is not None:
+        history.save()
+    # En modo incremental el historial recién guardado ya anota lo revisado
+    # y la próxima corrida vuelve a priorizar: el checkpoint solo sirve para
+    # retomar una corrida caída, no para saltarse productos los días siguientes
+    if checkpoint is not None and (rows.exhausted or incremental):
+        checkpoint.finish()
+
+    if not sink.saved:
+        print("✗ No se generaron resultados.")
+        return 0
 
-    # Añadir índice 1..N para logs
-    for idx, row in enumerate(rows, start=1):
-        row["_index"] = idx
+    print("✓ Listo: {} filas guardadas/actualizadas en cm_precios_minimos en Supabase".format(sink.saved))
+    return sink.saved
 
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/91.0.4472.124 Safari/537.36"
-        )
-    }
 
-    resultados = []
+def _run_shard(shard, kwargs):
+    return process_products_with_prices(shard=shard, **kwargs)
 
-    # Paralelización con ThreadPoolExecutor
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [
-            executor.submit(process_one_product, row, headers, total_count)
-            for row in rows
-        ]
 
-        for fut in as_completed(futures):
-            try:
-                data = fut.result()
-                if data is not None:
-                    resultados.append(data)
-            except Exception as e:
-                print("✗ Error en thread: {}".format(e))
+def split_budget(total, max_workers, min_workers, async_concurrency, async_rps):
+    """
+    Reparte entre `total` shards el presupuesto de requests pensado para una
+    sola corrida (threads, piso adaptativo, concurrencia y req/s del motor
+    async): juntos cargan al sitio lo mismo que un solo proceso.
+    Retorna (max_workers, min_workers, async_concurrency, async_rps) por shard.
+    """
+    max_workers = max(1, max_workers // total)
+    min_workers = min(max_workers, max(1, min_workers // total))
+    return max_workers, min_workers, max(1, async_concurrency // total), async_rps / total
 
-    if not resultados:
-        print("✗ No se generaron resultados.")
-        return None
 
-    print("\n[4/4] Guardando {} productos en Supabase...".format(len(resultados)))
+def run_local_shards(total, **kwargs):
+    """
+    Corre los N shards en paralelo, uno por proceso (equivalente local a los
+    jobs en matriz de GitHub Actions). Cada shard toma su parte de los
+    límites de requests (ver process_products_with_prices). Retorna el total
+    de filas guardadas.
+    """
+    saved = 0
+    failed = []
+    with ProcessPoolExecutor(max_workers=total) as pool:
+        futures = {pool.submit(_run_shard, (i, total), kwargs): i for i in range(total)}
+        for future in as_completed(futures):
+            try:
+                saved += future.result() or 0
+            except Exception as e:
+                failed.append(futures[future])
+                print("✗ Shard {}/{} falló: {}".format(futures[future], total, e))
+    print("\n✓ {} shards terminados, {} filas guardadas en total".format(total - len(failed), saved))
+    if failed:
+        raise SystemExit(1)
+    return saved
 
-    # Opcional: DataFrame para inspección local
-    df_final = pd.DataFrame(resultados)
 
-    # Upsert en cm_precios_minimos
-    chunk_size = 200
-    for i in range(0, len(resultados), chunk_size):
-        chunk = resultados[i : i + chunk_size]
-        (
-            supabase.table("cm_precios_minimos")
-            .upsert(chunk, on_conflict="id_producto")
-            .execute()
-        )
+def cli(argv=None, prog=None):
+    """
+    Línea de comandos de la extracción de precios (también `python -m cm_cli precios`).
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(prog=prog, description="Extracción de precios con ofertas")
+    parser.add_argument(
+        "--engine",
+        choices=["threads", "async"],
+        default="threads",
+        help="motor de descarga de fichas (por defecto: threads)",
+    )
+    parser.add_argument(
+        "--async-concurrency",
+        type=int,
+        default=200,
+        help="fichas en vuelo con --engine async",
+    )
+    parser.add_argument(
+        "--async-rps",
+        type=float,
+        default=20.0,
+        help="requests/segundo máximos con --engine async",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=os.environ.get("CM_HTTP_CACHE_DIR"),
+        help="directorio de la caché HTTP de fichas (por defecto: $CM_HTTP_CACHE_DIR)",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=int,
+        default=512,
+        help="tamaño máximo de la caché HTTP en MB",
+    )
+    parser.add_argument(
+        "--history-path",
+        default=os.environ.get("CM_SCRAPE_HISTORY", ".cache/historial_scraping.json"),
+        help="historial local de revisiones por producto (para --incremental)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="revisar primero los productos más valiosos y dejar el resto para otras corridas",
+    )
+    parser.add_argument(
+        "--refresh-days",
+        type=float,
+        default=7,
+        help="todo producto se revisa al menos cada N días en modo incremental",
+    )
+    parser.add_argument(
+        "--budget-minutes",
+        type=float,
+        default=None,
+        help="dejar de encolar fichas después de N minutos",
+    )
+    parser.add_argument(
+        "--max-requests",
+        type=int,
+        default=None,
+        help="máximo de fichas a revisar en esta corrida",
+    )
+    parser.add_argument(
+        "--checkpoint-path",
+        default=os.environ.get("CM_CHECKPOINT_PATH", ".cache/checkpoint_precios.json"),
+        help="checkpoint local de la corrida (IDs terminados + cursor)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="retomar la corrida anterior omitiendo los productos ya terminados",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=8,
+        help="threads del motor threads (techo de concurrencia con --adaptive); con --shard o --local-shards, total entre shards",
+    )
+    parser.add_argument(
+        "--adaptive",
+        action="store_true",
+        help="ajustar requests en vuelo (AIMD) según latencia y 429/5xx/timeouts",
+    )
+    parser.add_argument(
+        "--min-workers",
+        type=int,
+        default=2,
+        help="piso de requests en vuelo con --adaptive",
+    )
+    parser.add_argument(
+        "--aimd-log",
+        default=os.environ.get("CM_AIMD_LOG"),
+        help="archivo JSONL donde registrar las decisiones del controlador",
+    )
+    parser.add_argument(
+        "--metrics-json",
+        default=os.environ.get("CM_METRICS_JSON"),
+        help="archivo donde dejar el resumen de tiempos por etapa (JSON)",
+    )
+    parser.add_argument(
+        "--metrics-prom",
+        default=os.environ.get("CM_METRICS_PROM"),
+        help="textfile de Prometheus con los mismos tiempos y contadores",
+    )
+    parser.add_argument(
+        "--progress-path",
+        default=os.environ.get("CM_PROGRESS_PATH"),
+        help="archivo JSONL donde escribir snapshots de progreso durante la corrida",
+    )
+    parser.add_argument(
+        "--progress-interval",
+        type=float,
+        default=30.0,
+        help="segundos entre snapshots de progreso",
+    )
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="subir los lotes por REST en paralelo, con tamaño auto-ajustado",
+    )
+    parser.add_argument(
+        "--db-url",
+        default=os.environ.get("CM_DB_URL"),
+        help="URL de Postgres: carga por COPY + INSERT ... ON CONFLICT (por defecto: $CM_DB_URL)",
+    )
+    parser.add_argument(
+        "--changed-ids-path",
+        default=os.environ.get("CM_CHANGED_IDS", ".cache/ids_modificados.txt"),
+        help="archivo donde anotar los IDs guardados (para refresh_precios_region.py)",
+    )
+    parser.add_argument(
+        "--price-history-dir",
+        default=os.environ.get("CM_PRICE_HISTORY_DIR"),
+        help="directorio del historial de precios en Parquet (requiere pyarrow; ver price_history.py)",
+    )
+    parser.add_argument(
+        "--stream-pages",
+        action="store_true",
+        default=os.environ.get("CM_STREAM_FICHAS") == "1",
+        help="leer las fichas por chunks y extraer al vuelo (menos memoria por worker; solo --engine threads)",
+    )
+    parser.add_argument(
+        "--index-port",
+        type=int,
+        default=None,
+        help="servir la API de consultas de precios (price_index.py) en este puerto durante la corrida",
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        default=os.environ.get("CM_SHARD") or None,
+        help="procesar solo el shard i/N del catálogo (p. ej. 0/4, para jobs en matriz); los límites de requests se reparten entre los N",
+    )
+    parser.add_argument(
+        "--local-shards",
+        type=int,
+        default=None,
+        help="correr N shards en procesos locales (los límites de requests se reparten entre ellos)",
+    )
+    args = parser.parse_args(argv)
+    if args.shard is not None and args.local_shards:
+        parser.error("--shard y --local-shards no se pueden combinar")
 
-    print("✓ Listo: datos guardados/actualizados en cm_precios_minimos en Supabase")
-    return df_final
+    # max_products: cuántos productos leer de cm_productos
+    # max_workers: cuántos threads en paralelo (no subir demasiado para no saturar el sitio)
+    run = process_products_with_prices
+    if args.local_shards:
+        run = functools.partial(run_local_shards, args.local_shards)
+    run(
+        max_products=999999,
+        max_workers=args.max_workers,
+        engine=args.engine,
+        async_concurrency=args.async_concurrency,
+        async_rps=args.async_rps,
+        cache_dir=args.cache_dir,
+        cache_max_mb=args.cache_max_mb,
+        history_path=args.history_path,
+        incremental=args.incremental,
+        refresh_days=args.refresh_days,
+        budget_minutes=args.budget_minutes,
+        max_requests=args.max_requests,
+        checkpoint_path=args.checkpoint_path,
+        resume=args.resume,
+        adaptive=args.adaptive,
+        min_workers=args.min_workers,
+        aimd_log=args.aimd_log,
+        metrics_json=args.metrics_json,
+        metrics_prom=args.metrics_prom,
+        progress_path=args.progress_path,
+        progress_interval=args.progress_interval,
+        bulk=args.bulk,
+        db_url=args.db_url,
+        changed_ids_path=args.changed_ids_path,
+        price_history_dir=args.price_history_dir,
+        stream_pages=args.stream_pages,
+        index_port=args.index_port,
+        **({} if args.local_shards else {"shard": args.shard}),
+    )
 
 
 if __name__ == "__main__":
-    # max_products: cuántos productos leer de cm_productos
-    # max_workers: cuántos threads en paralelo (no subir demasiado para no saturar el sitio)
-    process_products_with_prices(max_products=999999, max_workers=8)
+    cli()
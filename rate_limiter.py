@@ -0,0 +1,58 @@
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe para limitar requests por segundo.
+
+    - rate: tokens que se reponen por segundo (requests/segundo).
+    - capacity: ráfaga máxima permitida (por defecto, 1 segundo de tokens).
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        if rate <= 0:
+            raise ValueError("rate debe ser mayor que 0")
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._last
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._last = now
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """
+        Reserva tokens y retorna cuántos segundos hay que esperar antes de usarlos.
+        El saldo puede quedar negativo: así las esperas se reparten en orden.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """
+        Bloquea hasta que haya tokens disponibles. Retorna el tiempo esperado.
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens: float = 1.0) -> float:
+        """
+        Igual que acquire(), pero espera con asyncio.sleep sin bloquear el event loop.
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
@@ -1,21 +1,116 @@
+import argparse
+import glob
 import os
-from supabase import create_client, Client
+from sharding import shard_glob
+from supabase_client import get_supabase_client
 
-def get_supabase_client() -> Client:
-    url = os.environ.get("SUPABASE_URL")
-    key = os.environ.get("SUPABASE_KEY")
-    if not url or not key:
-        raise RuntimeError("Faltan SUPABASE_URL o SUPABASE_KEY en variables de entorno.")
-    return create_client(url, key)
+# IDs por llamada a refrescar_cm_precios_region_ids (cuerpo del request acotado)
+IDS_PER_CALL = 1000
 
-def main():
-    supabase = get_supabase_client()
-    print("Llamando función refrescar_cm_precios_region() ...")
-    resp = supabase.rpc("refrescar_cm_precios_region").execute()
+def changed_ids_files(path):
+    """
+    El archivo de IDs y los de cada shard (ids_modificados.shard-i-of-N.txt)
+    que existan.
+    """
+    if not path:
+        return []
+    paths = sorted(glob.glob(shard_glob(path)))
+    if os.path.exists(path):
+        paths.insert(0, path)
+    return paths
+
+def read_changed_ids(path):
+    """
+    IDs anotados por proyectoMPlvl2.py (uno por línea, sin repetir), juntando
+    los archivos de todos los shards, o None si no hay ningún archivo (no se
+    sabe qué cambió).
+    """
+    paths = changed_ids_files(path)
+    if not paths:
+        return None
+    ids = {}
+    for p in paths:
+        with open(p, encoding="utf-8") as f:
+            ids.update(dict.fromkeys(line.strip() for line in f if line.strip()))
+    return list(ids)
+
+def remove_changed_ids(path):
+    for p in changed_ids_files(path):
+        os.remove(p)
+
+def check(resp):
     if getattr(resp, "error", None):
         print(f"✗ Error al refrescar cm_precios_region: {resp.error}")
         raise SystemExit(1)
+
+def refresh_full(supabase):
+    print("Llamando función refrescar_cm_precios_region() ...")
+    check(supabase.rpc("refrescar_cm_precios_region").execute())
+
+def refresh_ids(supabase, ids):
+    print(f"Refrescando {len(ids)} productos con refrescar_cm_precios_region_ids() ...")
+    for i in range(0, len(ids), IDS_PER_CALL):
+        check(supabase.rpc("refrescar_cm_precios_region_ids", {"ids": ids[i : i + IDS_PER_CALL]}).execute())
+
+def main(ids_path=None, max_ids=5000, full=False):
+    """
+    Refresca cm_precios_region:
+    - solo los productos que cambiaron en la última corrida (ids_path), con
+      refrescar_cm_precios_region_ids en tandas de IDS_PER_CALL,
+    - reconstrucción completa (refrescar_cm_precios_region) si se pide con
+      full, si no hay archivo de IDs o si cambiaron más de max_ids productos,
+      y también si la función por IDs falla (p. ej. aún no está instalada en
+      la base: sql/refrescar_cm_precios_region.sql).
+    Los archivos de IDs (incluidos los de cada shard) se borran solo después
+    de refrescar.
+    """
+    ids = None if full else read_changed_ids(ids_path)
+    if ids is not None and not ids:
+        print("✓ Ningún producto cambió desde el último refresco, nada que hacer.")
+        remove_changed_ids(ids_path)
+        return
+
+    supabase = get_supabase_client()
+    # postgrest llega con supabase: se importa recién con el cliente creado
+    from postgrest import APIError
+
+    try:
+        if ids is None or len(ids) > max_ids:
+            if ids is not None:
+                print(f"{len(ids)} productos cambiaron (más de {max_ids}): reconstrucción completa")
+            refresh_full(supabase)
+        else:
+            try:
+                refresh_ids(supabase, ids)
+            except APIError as e:
+                print(f"⚠ refrescar_cm_precios_region_ids() falló ({e.message or e}): reconstrucción completa")
+                refresh_full(supabase)
+    except APIError as e:
+        print(f"✗ Error al refrescar cm_precios_region: {e.message or e}")
+        raise SystemExit(1)
+
+    remove_changed_ids(ids_path)
     print("✓ Tabla cm_precios_region refrescada correctamente.")
 
+def cli(argv=None, prog=None):
+    """
+    Línea de comandos del refresco (también `python -m cm_cli refrescar`).
+    """
+    parser = argparse.ArgumentParser(prog=prog, description="Refresco de cm_precios_region")
+    parser.add_argument(
+        "--ids-path",
+        default=os.environ.get("CM_CHANGED_IDS", ".cache/ids_modificados.txt"),
+        help="IDs guardados por proyectoMPlvl2.py desde el último refresco",
+    )
+    parser.add_argument(
+        "--max-ids",
+        type=int,
+        default=5000,
+        help="sobre esta cantidad de productos cambiados se reconstruye todo",
+    )
+    parser.add_argument("--full", action="store_true", help="forzar reconstrucción completa")
+    args = parser.parse_args(argv)
+    main(ids_path=args.ids_path, max_ids=args.max_ids, full=args.full)
+
 if __name__ == "__main__":
-    main()
+    cli()
@@ -0,0 +1,115 @@
+import json
+import math
+import os
+import threading
+import time
+
+SECONDS_PER_DAY = 86400.0
+
+
+class ScrapeHistory:
+    """
+    Historial local por producto, para el modo incremental:
+    - last_scraped: timestamp de la última ficha revisada con éxito,
+    - last_price: último precio mínimo global visto,
+    - scrapes / changes: cuántas veces se revisó y cuántas cambió el precio.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: dict = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                print("⚠ Historial de scraping ilegible, se parte de cero: {}".format(path))
+                self._entries = {}
+
+    def get(self, id_producto) -> dict | None:
+        with self._lock:
+            return self._entries.get(str(id_producto))
+
+    def record(self, id_producto, precio: int | None, now: float | None = None) -> None:
+        """
+        Registra una ficha revisada. precio=None significa "sin cambios"
+        (por ejemplo, la caché HTTP respondió 304).
+        """
+        now = now if now is not None else time.time()
+        key = str(id_producto)
+        with self._lock:
+            entry = self._entries.setdefault(key, {"scrapes": 0, "changes": 0, "last_price": None})
+            entry["scrapes"] += 1
+            entry["last_scraped"] = now
+            if precio is not None:
+                if entry["last_price"] is not None and entry["last_price"] != precio:
+                    entry["changes"] += 1
+                entry["last_price"] = precio
+
+    def save(self) -> None:
+        """
+        Guarda el historial de forma atómica (archivo temporal + os.replace).
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path)
+
+
+def priority_score(row: dict, entry: dict | None, now: float, refresh_days: float) -> float:
+    """
+    Puntaje de prioridad de un producto (mayor = se revisa antes):
+    - nunca revisado o con más de refresh_days sin revisar: prioridad máxima
+      (garantiza que todo producto se refresca al menos cada N días),
+    - si no, antigüedad relativa × volatilidad histórica del precio
+      × peso por número de proveedores.
+    """
+    if not entry or not entry.get("last_scraped"):
+        return float("inf")
+
+    age_days = (now - entry["last_scraped"]) / SECONDS_PER_DAY
+    if age_days >= refresh_days:
+        # Vencidos: primero los más atrasados
+        return 1e9 + age_days
+
+    staleness = age_days / refresh_days
+    # Frecuencia de cambio suavizada (Laplace) para no castigar productos nuevos
+    volatility = (entry.get("changes", 0) + 1) / (entry.get("scrapes", 0) + 2)
+    try:
+        providers = max(0, int(float(row.get("numero_proveedores") or 0)))
+    except (TypeError, ValueError):
+        providers = 0
+    providers_weight = 1 + math.log1p(providers)
+
+    return staleness * volatility * providers_weight
+
+
+def plan_incremental(rows: list[dict], history: ScrapeHistory, refresh_days: float = 7, max_requests: int | None = None) -> list[dict]:
+    """
+    Ordena los productos por prioridad descendente y, si hay presupuesto de
+    requests, deja solo la porción más valiosa. El resto queda para las
+    siguientes corridas.
+    """
+    now = time.time()
+    scored = [
+        (priority_score(row, history.get(row.get("id_producto")), now, refresh_days), pos, row)
+        for pos, row in enumerate(rows)
+    ]
+    scored.sort(key=lambda t: (-t[0], t[1]))
+    overdue = sum(1 for score, _, _ in scored if score >= 1e9)
+
+    plan = [row for _, _, row in scored]
+    if max_requests is not None:
+        plan = plan[:max_requests]
+
+    print("✓ Modo incremental: {} productos en la cola, {} vencidos (> {} días), {} en esta corrida".format(
+        len(rows), overdue, refresh_days, len(plan)
+    ))
+    if overdue > len(plan):
+        print("⚠ El presupuesto no alcanza para todos los vencidos: súbelo o agenda más corridas")
+    return plan
@@ -0,0 +1,56 @@
+import os
+import zlib
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """
+    "i/N" -> (i, N), con 0 <= i < N.
+    """
+    try:
+        index, total = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError("Shard inválido: {!r} (se espera i/N, p. ej. 0/4)".format(value))
+    if total < 1 or not 0 <= index < total:
+        raise ValueError("Shard inválido: {!r} (se espera 0 <= i < N)".format(value))
+    return index, total
+
+
+def shard_of(id_producto, total: int) -> int:
+    """
+    Shard de un producto: CRC32 de su id_producto módulo N. Estable entre
+    procesos y corridas (a diferencia de hash(), que cambia con PYTHONHASHSEED).
+    """
+    return zlib.crc32(str(id_producto).encode("utf-8")) % total
+
+
+def filter_shard(rows, shard: tuple[int, int]):
+    """
+    Deja pasar solo las filas del shard (i, N).
+    """
+    index, total = shard
+    for row in rows:
+        if shard_of(row.get("id_producto"), total) == index:
+            yield row
+
+
+def shard_name(shard: tuple[int, int]) -> str:
+    return "shard-{}-of-{}".format(*shard)
+
+
+def shard_path(path: str | None, shard: tuple[int, int] | None) -> str | None:
+    """
+    Ruta propia del shard para archivos locales (checkpoint, IDs cambiados,
+    historial, métricas): "dir/x.json" -> "dir/x.shard-0-of-4.json".
+    """
+    if not path or shard is None:
+        return path
+    base, ext = os.path.splitext(path)
+    return "{}.{}{}".format(base, shard_name(shard), ext)
+
+
+def shard_glob(path: str) -> str:
+    """
+    Patrón que encuentra los archivos por shard de `path` (ver shard_path).
+    """
+    base, ext = os.path.splitext(path)
+    return "{}.shard-*-of-*{}".format(base, ext)
@@ -0,0 +1,51 @@
+-- Esquema mínimo de las tablas que escriben los scripts, para probar contra
+-- un Postgres local (benchmarks/bench_bulk_load.py). Refleja las columnas que
+-- envían proyectoMP.py y proyectoMPlvl2.py; en Supabase las tablas ya existen.
+
+CREATE TABLE IF NOT EXISTS cm_productos (
+    id_producto text PRIMARY KEY,
+    nombre_producto text,
+    numero_proveedores integer,
+    link_producto text,
+    pagina integer
+);
+
+CREATE TABLE IF NOT EXISTS cm_precios_minimos (
+    id_producto text PRIMARY KEY,
+    nombre_producto text,
+    numero_proveedores integer,
+    link_producto text,
+    precio_minimo_global bigint,
+    region_mejor_precio text,
+    precios_region jsonb
+);
+
+-- cm_precios_region y su reconstrucción completa existen solo en Supabase;
+-- esta es una versión local equivalente para benchmarks/bench_refresh_region.py
+-- (la función incremental está en sql/refrescar_cm_precios_region.sql).
+CREATE TABLE IF NOT EXISTS cm_precios_region (
+    id_producto text NOT NULL,
+    nombre_producto text,
+    link_producto text,
+    region text NOT NULL,
+    precio bigint,
+    PRIMARY KEY (id_producto, region)
+);
+
+CREATE OR REPLACE FUNCTION refrescar_cm_precios_region()
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    filas integer;
+BEGIN
+    TRUNCATE cm_precios_region;
+    INSERT INTO cm_precios_region (id_producto, nombre_producto, link_producto, region, precio)
+    SELECT m.id_producto, m.nombre_producto, m.link_producto, r.key, r.value::numeric::bigint
+    FROM cm_precios_minimos m
+    CROSS JOIN LATERAL jsonb_each_text(m.precios_region) AS r
+    WHERE m.precios_region IS NOT NULL;
+    GET DIAGNOSTICS filas = ROW_COUNT;
+    RETURN filas;
+END;
+$$;
@@ -0,0 +1,34 @@
+-- Refresco incremental de cm_precios_region (una fila por producto y región)
+-- a partir de cm_precios_minimos.precios_region.
+--
+-- refrescar_cm_precios_region_ids(ids): solo los productos indicados; la usa
+--   refresh_precios_region.py con los IDs que guardó la última corrida. Si la
+--   función no existe o falla, el script cae a la reconstrucción completa de
+--   siempre, refrescar_cm_precios_region(), que ya vive en Supabase y este
+--   archivo no toca.
+--
+-- El DELETE/INSERT debe producir exactamente las filas que produce
+-- refrescar_cm_precios_region() para esos productos: antes de aplicarla,
+-- alinear la lista de columnas y el SELECT con la definición en la base
+-- (\sf refrescar_cm_precios_region). Las columnas de abajo son las del
+-- esquema local de pruebas (sql/esquema_local.sql).
+
+CREATE OR REPLACE FUNCTION refrescar_cm_precios_region_ids(ids text[])
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    filas integer;
+BEGIN
+    -- Regiones que el producto ya no tiene también deben desaparecer
+    DELETE FROM cm_precios_region WHERE id_producto = ANY (ids);
+    INSERT INTO cm_precios_region (id_producto, nombre_producto, link_producto, region, precio)
+    SELECT m.id_producto, m.nombre_producto, m.link_producto, r.key, r.value::numeric::bigint
+    FROM cm_precios_minimos m
+    CROSS JOIN LATERAL jsonb_each_text(m.precios_region) AS r
+    WHERE m.id_producto = ANY (ids)
+      AND m.precios_region IS NOT NULL;
+    GET DIAGNOSTICS filas = ROW_COUNT;
+    RETURN filas;
+END;
+$$;
@@ -0,0 +1,120 @@
+import os
+import threading
+
+from bulk_loader import RestLoader
+from metrics import get_metrics
+
+# Resultado de un producto cuya ficha no cambió (304 o mismo hash en la
+# caché): terminado, sin fila que guardar. None es "sin fila" por error HTTP,
+# de red o sin precios, y no cuenta como terminado en el checkpoint.
+UNCHANGED = object()
+
+
+class BatchUpserter:
+    """
+    Recibe resultados a medida que terminan los workers y los sube a Supabase
+    en lotes de chunk_size, en vez de acumular toda la corrida en memoria.
+
+    Después de cada lote guardado marca esos productos como terminados en el
+    checkpoint (si hay) y lo persiste. Los productos sin fila solo se marcan
+    si no cambiaron (UNCHANGED): los que fallaron se reintentan al retomar.
+
+    La escritura la hace `loader` (ver bulk_loader.make_loader); por defecto,
+    upsert REST secuencial en chunks de chunk_size.
+
+    Con changed_ids_path, agrega a ese archivo (un ID por línea) los productos
+    de cada lote guardado: refresh_precios_region.py los usa para refrescar
+    solo esos productos y borra el archivo al terminar.
+
+    Con price_history (price_history.PriceHistoryWriter), cada lote guardado
+    se agrega también al historial de precios en Parquet.
+
+    Con price_index (price_index.PriceIndex), cada lote guardado actualiza
+    el índice de consultas en memoria.
+    """
+
+    def __init__(self, supabase, table="cm_precios_minimos", chunk_size=200, checkpoint=None, on_conflict="id_producto", loader=None, changed_ids_path=None, price_history=None, price_index=None):
+        self.supabase = supabase
+        self.table = table
+        self.chunk_size = chunk_size
+        self.checkpoint = checkpoint
+        self.on_conflict = on_conflict
+        self.loader = loader or RestLoader(supabase, table, on_conflict, chunk_size=chunk_size)
+        self.changed_ids_path = changed_ids_path
+        self.price_history = price_history
+        self.price_index = price_index
+
+        self.processed = 0  # productos terminados (con o sin fila)
+        self.saved = 0  # filas guardadas en Supabase
+        self._buffer: list[dict] = []
+        self._no_row: list = []
+        self._lock = threading.Lock()
+        # Serializa los upserts para que el checkpoint avance en orden
+        self._flush_lock = threading.Lock()
+
+    def submitted(self, id_producto) -> None:
+        """
+        Los motores avisan cada producto que envían, en orden (para el cursor).
+        """
+        if self.checkpoint is not None:
+            self.checkpoint.submitted(id_producto)
+
+    def add(self, id_producto, row_data: dict | None) -> None:
+        """
+        Registra el resultado de un producto. row_data=UNCHANGED significa
+        que la ficha no cambió; None, que no hubo fila (error o sin precios).
+        """
+        with self._lock:
+            self.processed += 1
+            if row_data is None:
+                return
+            if row_data is UNCHANGED:
+                self._no_row.append(id_producto)
+                if len(self._no_row) < self.chunk_size:
+                    return
+                # Muchos productos sin fila seguidos (p. ej. caché): solo checkpoint
+                chunk = []
+            else:
+                self._buffer.append(row_data)
+                if len(self._buffer) < self.chunk_size:
+                    return
+                chunk, self._buffer = self._buffer, []
+            no_row, self._no_row = self._no_row, []
+        self._write(chunk, no_row)
+
+    def flush(self) -> None:
+        """
+        Sube lo que quede en el buffer (se llama al final de la corrida).
+        """
+        with self._lock:
+            chunk, self._buffer = self._buffer, []
+            no_row, self._no_row = self._no_row, []
+        self._write(chunk, no_row)
+
+    def _write(self, chunk: list[dict], no_row: list) -> None:
+        with self._flush_lock:
+            if chunk:
+                self.loader.write(chunk)
+                get_metrics().count("filas_guardadas", len(chunk))
+                if self.changed_ids_path:
+                    self._record_changed(chunk)
+                if self.price_history is not None:
+                    self.price_history.append(chunk)
+                if self.price_index is not None:
+                    self.price_index.append(chunk)
+                with self._lock:
+                    self.saved += len(chunk)
+                print("✓ Lote de {} filas guardado en {} ({} en total)".format(
+                    len(chunk), self.table, self.saved
+                ))
+            if self.checkpoint is not None and (chunk or no_row):
+                self.checkpoint.completed([row["id_producto"] for row in chunk])
+                self.checkpoint.completed(no_row)
+                self.checkpoint.save()
+
+    def _record_changed(self, chunk: list[dict]) -> None:
+        directory = os.path.dirname(self.changed_ids_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.changed_ids_path, "a", encoding="utf-8") as f:
+            f.write("".join("{}\n".format(row[self.on_conflict]) for row in chunk))
@@ -0,0 +1,21 @@
+import os
+
+
+def get_supabase_client():
+    """
+    Crea el cliente de Supabase usando SUPABASE_URL y SUPABASE_KEY
+    desde variables de entorno.
+
+    El paquete supabase (postgrest, realtime, auth, httpx...) se importa
+    recién aquí: los comandos y modos que no tocan Supabase (COPY directo,
+    consultas al historial, --help) arrancan sin pagar esa importación.
+    """
+    url = os.environ.get("SUPABASE_URL")
+    key = os.environ.get("SUPABASE_KEY")
+    if not url or not key:
+        raise RuntimeError(
+            "Faltan SUPABASE_URL o SUPABASE_KEY en las variables de entorno."
+        )
+    from supabase import create_client
+
+    return create_client(url, key)
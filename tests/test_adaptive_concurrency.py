@@ -0,0 +1,30 @@
+import json
+
+from adaptive_concurrency import AdaptiveConcurrency
+
+
+def run_window(controller):
+    for _ in range(controller.window):
+        with controller.slot():
+            pass
+
+
+def test_log_goes_to_a_new_directory(tmp_path):
+    log_path = tmp_path / "metricas" / "aimd.jsonl"
+    controller = AdaptiveConcurrency(min_limit=1, max_limit=4, window=2, log_path=str(log_path))
+
+    run_window(controller)
+
+    records = [json.loads(line) for line in log_path.read_text(encoding="utf-8").splitlines()]
+    assert [(r["action"], r["from"], r["to"]) for r in records] == [("aumento", 1, 2)]
+
+
+def test_log_errors_do_not_fail_requests(tmp_path):
+    # Un directorio en vez de archivo: open() falla con OSError
+    controller = AdaptiveConcurrency(min_limit=1, max_limit=4, window=2, log_path=str(tmp_path))
+
+    run_window(controller)
+    run_window(controller)
+
+    assert controller.limit == 3
+    assert controller.log_path is None
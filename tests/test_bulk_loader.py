@@ -0,0 +1,46 @@
+import os
+import uuid
+
+import pytest
+
+# Postgres de prueba, p. ej. CM_TEST_DB_URL=postgresql://localhost/cm_test
+DB_URL = os.environ.get("CM_TEST_DB_URL")
+pytestmark = pytest.mark.skipif(not DB_URL, reason="CM_TEST_DB_URL no está definida")
+
+
+@pytest.fixture
+def table():
+    psycopg = pytest.importorskip("psycopg")
+    name = "cm_prueba_{}".format(uuid.uuid4().hex[:8])
+    with psycopg.connect(DB_URL, autocommit=True) as conn:
+        conn.execute(
+            "CREATE TABLE {} (id_producto text PRIMARY KEY, nombre_producto text NOT NULL, pagina integer)".format(name)
+        )
+    yield name
+    with psycopg.connect(DB_URL, autocommit=True) as conn:
+        conn.execute("DROP TABLE {}".format(name))
+
+
+def count(table):
+    import psycopg
+
+    with psycopg.connect(DB_URL) as conn:
+        return conn.execute("SELECT count(*) FROM {}".format(table)).fetchone()[0]
+
+
+def test_failed_batch_does_not_poison_the_next(table):
+    import psycopg
+
+    from bulk_loader import PostgresCopyLoader
+
+    loader = PostgresCopyLoader(DB_URL, table)
+    try:
+        with pytest.raises(psycopg.errors.NotNullViolation):
+            loader.write([{"id_producto": "1", "nombre_producto": None, "pagina": 1}])
+        assert loader.write([{"id_producto": "2", "nombre_producto": "arroz", "pagina": 1}]) == 1
+        with pytest.raises(psycopg.errors.UndefinedFunction):
+            loader.delete([2])  # text = ANY(integer[]): falla en el servidor
+        assert loader.delete(["2"]) == 1
+    finally:
+        loader.close()
+    assert count(table) == 0
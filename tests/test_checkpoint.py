@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from checkpoint import RunCheckpoint
+from streaming_upsert import UNCHANGED, BatchUpserter
+
+
+class CrashingLoader:
+    """
+    Loader que guarda las primeras `fail_after` filas y después simula la
+    caída del proceso.
+    """
+
+    def __init__(self, fail_after):
+        self.fail_after = fail_after
+        self.rows = []
+
+    def write(self, chunk):
+        if len(self.rows) + len(chunk) > self.fail_after:
+            raise RuntimeError("caída simulada")
+        self.rows.extend(chunk)
+
+
+def run_until_crash(checkpoint, order, finished, loader):
+    """
+    Envía `order` como lo hacen los motores y termina solo `finished` (en
+    ese orden, un lote por producto); el siguiente lote cae.
+    """
+    sink = BatchUpserter(None, chunk_size=1, checkpoint=checkpoint, loader=loader)
+    for id_producto in order:
+        sink.submitted(id_producto)
+    for id_producto in finished:
+        sink.add(id_producto, {"id_producto": id_producto})
+    with pytest.raises(RuntimeError):
+        sink.add("caido", {"id_producto": "caido"})
+
+
+def ids(rows):
+    return [row["id_producto"] for row in rows]
+
+
+def test_incremental_resume_skips_only_finished(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    # Orden de envío del plan incremental: no es el orden de los IDs
+    run_until_crash(
+        RunCheckpoint(path, ordered=False), ["a", "b", "c", "d"], ["a", "b", "d"], CrashingLoader(3)
+    )
+
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == {"cursor": None, "done": ["a", "b", "d"]}
+
+    # La corrida siguiente re-planifica con otro orden (el historial no se guardó)
+    resumed = RunCheckpoint(path, resume=True, ordered=False)
+    replan = [{"id_producto": i} for i in ["b", "a", "c", "e", "d"]]
+    assert ids(resumed.pending(replan, cursor_applied=True)) == ["c", "e"]
+
+
+def test_keyset_resume_continues_after_cursor(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    run_until_crash(RunCheckpoint(path), ["a", "b", "c", "d"], ["a", "b", "d"], CrashingLoader(3))
+
+    resumed = RunCheckpoint(path, resume=True)
+    assert resumed.cursor == "b"
+    # iter_productos(after=cursor) ya entrega solo lo posterior al cursor
+    after_cursor = [{"id_producto": i} for i in ["c", "d", "e"]]
+    assert ids(resumed.pending(after_cursor, cursor_applied=True)) == ["c", "e"]
+
+
+def test_failed_products_are_retried(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    checkpoint = RunCheckpoint(path, ordered=False)
+    sink = BatchUpserter(None, chunk_size=10, checkpoint=checkpoint, loader=CrashingLoader(10))
+    sink.add("a", {"id_producto": "a"})
+    sink.add("b", UNCHANGED)
+    sink.add("c", None)  # error HTTP/de red o ficha sin precios
+    sink.flush()
+
+    resumed = RunCheckpoint(path, resume=True, ordered=False)
+    rows = [{"id_producto": i} for i in ["a", "b", "c"]]
+    assert ids(resumed.pending(rows, cursor_applied=True)) == ["c"]
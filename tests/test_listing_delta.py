@@ -0,0 +1,169 @@
+import random
+
+from listing_delta import PAGE_SIZE, ListingIndex, delta_crawl
+
+PAGES = 10
+
+
+def catalog(n=PAGES * PAGE_SIZE):
+    """
+    Listado ordenado por nombre: (nombre, id_producto, proveedores).
+    """
+    return [("producto {:05d}".format(i * 10), str(1000 + i), 3) for i in range(n)]
+
+
+def as_products(listing):
+    return [
+        {
+            "ID_Producto": id_producto,
+            "Nombre_Producto": name,
+            "Numero_Proveedores": providers,
+            "Link_Producto": "https://example.cl/p-{}.html".format(id_producto),
+            "Pagina": pos // PAGE_SIZE + 1,
+        }
+        for pos, (name, id_producto, providers) in enumerate(listing)
+    ]
+
+
+class FakeSite:
+    """
+    fetch_pages sobre un listado fijo; `broken` son páginas que fallan o
+    vienen cortas ({página: productos que trae}).
+    """
+
+    def __init__(self, listing, broken=None):
+        self.pages = {}
+        for product in as_products(listing):
+            self.pages.setdefault(product["Pagina"], []).append(product)
+        self.broken = broken or {}
+        self.fetched = []
+
+    def fetch_pages(self, pages):
+        self.fetched.extend(pages)
+        return {p: self.broken.get(p, self.pages.get(p, [])) for p in pages}
+
+
+def crawl(tmp_path, old, new, verify_pages=3, **site_kwargs):
+    index = ListingIndex(str(tmp_path / "indice.json"))
+    index.save(as_products(old))
+    site = FakeSite(new, **site_kwargs)
+    result = delta_crawl(
+        ListingIndex(index.path), len(new), site.fetch_pages, verify_pages=verify_pages, rng=random.Random(0)
+    )
+    return result, site
+
+
+def apply(old, result):
+    """
+    cm_productos después de la corrida delta: {id: página}.
+    """
+    table = {p["ID_Producto"]: p["Pagina"] for p in as_products(old)}
+    for product in result.upserts + result.moved:
+        table[product["ID_Producto"]] = product["Pagina"]
+    for id_producto in result.deletes:
+        del table[id_producto]
+    return table
+
+
+def pages_of(listing):
+    return {p["ID_Producto"]: p["Pagina"] for p in as_products(listing)}
+
+
+def test_single_insert_fixes_pages_after_the_zone(tmp_path):
+    old = catalog()
+    new = sorted(old + [("producto 00905", "9001", 2)])  # página 4
+
+    result, site = crawl(tmp_path, old, new)
+
+    assert result is not None
+    assert result.ids == [id_producto for _, id_producto, _ in new]
+    assert result.changed_pages[0] == 4
+    assert "9001" in {p["ID_Producto"] for p in result.upserts}
+    assert result.deletes == []
+    # Los productos que cruzan un borde de página quedan con su página nueva
+    assert result.moved
+    assert apply(old, result) == pages_of(new)
+    assert len(set(site.fetched)) < PAGES
+
+
+def test_single_delete(tmp_path):
+    old = catalog()
+    new = old[:130] + old[131:]  # página 6
+
+    result, _ = crawl(tmp_path, old, new)
+
+    assert result is not None
+    assert result.deletes == [old[130][1]]
+    assert result.changed_pages[0] == 6
+    assert apply(old, result) == pages_of(new)
+
+
+def test_changes_in_two_zones_fall_back_to_full_crawl(tmp_path):
+    old = catalog()
+    # Página 2: un alta y una baja (se compensan); página 8: un alta. La
+    # búsqueda solo ubica la zona de la página 8
+    new = sorted(old[:30] + old[31:] + [("producto 00405", "9001", 1), ("producto 01905", "9002", 1)])
+
+    result, _ = crawl(tmp_path, old, new, verify_pages=PAGES)
+
+    assert result is None
+
+
+def test_failed_page_falls_back_to_full_crawl(tmp_path):
+    old = catalog()
+    new = sorted(old + [("producto 00905", "9001", 2)])
+
+    result, _ = crawl(tmp_path, old, new, broken={4: []})
+
+    assert result is None
+
+
+def test_short_page_falls_back_to_full_crawl(tmp_path):
+    old = catalog()
+    new = sorted(old + [("producto 00905", "9001", 2)])
+    short = as_products(new)[3 * PAGE_SIZE : 4 * PAGE_SIZE - 1]
+
+    result, _ = crawl(tmp_path, old, new, broken={4: short})
+
+    assert result is None
+
+
+def test_rename_without_shift_is_detected(tmp_path):
+    old = catalog()
+    new = list(old)
+    # Mismo lugar en el orden (página 1, siempre revisada), otro nombre
+    name, id_producto, providers = new[10]
+    new[10] = (name + " nuevo", id_producto, providers)
+
+    result, _ = crawl(tmp_path, old, new)
+
+    assert result is None
+
+
+def test_provider_count_change_without_shift_is_detected(tmp_path):
+    old = catalog()
+    new = list(old)
+    name, id_producto, _ = new[-1]  # última página, siempre revisada
+    new[-1] = (name, id_producto, 7)
+
+    result, _ = crawl(tmp_path, old, new)
+
+    assert result is None
+
+
+def test_unchanged_listing(tmp_path):
+    old = catalog()
+
+    result, _ = crawl(tmp_path, old, list(old))
+
+    assert result is not None
+    assert result.upserts == result.moved == result.deletes == []
+    assert result.ids == [id_producto for _, id_producto, _ in old]
+
+
+def test_index_without_products_is_not_usable(tmp_path):
+    path = tmp_path / "indice.json"
+    # Formato anterior: solo IDs y huellas, sin los campos para reubicar productos
+    path.write_text('{"saved_at": 1, "total": 2, "ids": ["1", "2"], "digests": ["a", "b"]}', encoding="utf-8")
+
+    assert not ListingIndex(str(path)).usable
@@ -0,0 +1,48 @@
+import glob
+import os
+
+import pytest
+
+import listing_parser
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+# Cualquier listado guardado en tests/fixtures/listado_*.html se compara entre
+# backends (p. ej. una página real grabada con CM_RECORD_CORPUS)
+LISTING_PAGES = sorted(glob.glob(os.path.join(FIXTURES, "listado_*.html")))
+BACKENDS = listing_parser.available_backends()
+
+EXPECTED_ALIMENTOS = [
+    ("1823456", "Azúcar granulada IANSA 1 kg", "78"),
+    ("1823457", "Té & hierbas Supremo 100 bolsitas", "5"),
+    ("1823458", "Aceite maravilla Natura 1 L", "1"),
+    ("1823459", "Café grano Ñuñoa tostado 500 g", ""),
+]
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("path", LISTING_PAGES, ids=os.path.basename)
+def test_backends_agree_on_saved_listing(path):
+    content = read(path)
+    results = {name: listing_parser.parse_listing(content, 3, backend=name) for name in BACKENDS}
+    totals = {name: listing_parser.parse_total_products(content, backend=name) for name in BACKENDS}
+
+    reference = results[BACKENDS[0]]
+    assert reference, "el listado no tiene productos"
+    for name in BACKENDS[1:]:
+        assert results[name] == reference, name
+        assert totals[name] == totals[BACKENDS[0]], name
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_listing_fields(backend):
+    content = read(os.path.join(FIXTURES, "listado_alimentos.html"))
+    products = listing_parser.parse_listing(content, 3, backend=backend)
+
+    assert [(p["ID_Producto"], p["Nombre_Producto"], p["Numero_Proveedores"]) for p in products] == EXPECTED_ALIMENTOS
+    assert products[0]["Link_Producto"] == "https://conveniomarco2.mercadopublico.cl/alimentos2/p-1823456.html"
+    assert {p["Pagina"] for p in products} == {3}
+    assert listing_parser.parse_total_products(content, backend=backend) == 1287
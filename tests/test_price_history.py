@@ -0,0 +1,53 @@
+import datetime
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from price_history import PriceHistory, PriceHistoryWriter
+
+
+def capture(root, day, prices):
+    """
+    Una corrida del día `day` que capturó {id_producto: {región: precio}}.
+    """
+    writer = PriceHistoryWriter(root, run_date=datetime.date.fromisoformat(day))
+    writer.append([
+        {
+            "id_producto": id_producto,
+            "precios_region": precios,
+            "precio_minimo_global": min(precios.values()),
+            "region_mejor_precio": min(precios, key=precios.get),
+        }
+        for id_producto, precios in prices.items()
+    ])
+    writer.close()
+
+
+def test_movers_compare_against_the_last_capture_before_since(tmp_path):
+    root = str(tmp_path)
+    capture(root, "2026-09-01", {"a": {"RM": 1000}, "b": {"RM": 500}, "c": {"RM": 200}})
+    capture(root, "2026-09-20", {"a": {"RM": 900}})
+    # Con la caché HTTP, "a" y "b" solo se vuelven a capturar cuando cambian
+    capture(root, "2026-10-05", {"a": {"RM": 1200}})
+    capture(root, "2026-10-06", {"b": {"RM": 400}, "d": {"RM": 300}})
+    capture(root, "2026-10-07", {"d": {"RM": 330}})
+
+    movers = PriceHistory(root).biggest_movers("2026-10-01")
+
+    assert [(m["id_producto"], m["precio_inicial"], m["precio_final"]) for m in movers] == [
+        ("a", 900, 1200),
+        ("b", 500, 400),
+        ("d", 300, 330),
+    ]
+    assert movers[0]["cambio_pct"] == pytest.approx(1 / 3)
+
+
+def test_movers_filter_the_baseline_by_region(tmp_path):
+    root = str(tmp_path)
+    capture(root, "2026-09-01", {"a": {"RM": 1000, "Biobío": 100}})
+    capture(root, "2026-10-05", {"a": {"RM": 1100, "Biobío": 100}})
+
+    movers = PriceHistory(root).biggest_movers("2026-10-01", region="RM")
+
+    assert [(m["region"], m["precio_inicial"], m["precio_final"]) for m in movers] == [("RM", 1000, 1100)]
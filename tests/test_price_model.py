@@ -0,0 +1,69 @@
+import copy
+import random
+import threading
+import time
+
+import price_model
+from benchmarks._synthetic import make_product_page
+from benchmarks.bench_price_model import legacy_min_prices
+from price_model import min_price_by_region, region_index
+from proyectoMPlvl2 import PRODUCT_JSON_KEYS, extract_json_objects, extract_product_id
+
+
+def product_inputs(seed, n_providers=30):
+    html = make_product_page(str(2000 + seed), n_providers=n_providers, seed=seed, padding_kb=0)
+    blobs = extract_json_objects(html, PRODUCT_JSON_KEYS)
+    return blobs["jsonResult"], blobs["offerPrices"] or {}, extract_product_id(html), blobs["region_names"] or {}
+
+
+def test_compiled_model_matches_legacy():
+    for seed in range(20):
+        inputs = product_inputs(seed)
+        assert min_price_by_region(*copy.deepcopy(inputs)) == legacy_min_prices(*inputs)
+
+
+def test_compiled_model_matches_legacy_on_irregular_prices():
+    rnd = random.Random(7)
+    json_prices, offers, product_id, names = product_inputs(99, n_providers=10)
+    odd_values = ["", "0", "$ 1,200.50", " 350 ", "abc", 780, 12.9, None, "-5", "nan"]
+    for providers in json_prices.values():
+        for data in providers.values():
+            if rnd.random() < 0.3:
+                data["price"] = rnd.choice(odd_values)
+    for provider_offers in offers.values():
+        for region_offer in provider_offers.get(product_id, {}).values():
+            if rnd.random() < 0.3:
+                region_offer["special_price"] = rnd.choice(odd_values)
+    json_prices["99"] = "sin proveedores"
+    inputs = (json_prices, offers, product_id, names)
+    assert min_price_by_region(*copy.deepcopy(inputs)) == legacy_min_prices(*inputs)
+
+
+class SlowHashId(str):
+    """
+    ID de región que cede el GIL al calcular su hash: abre la ventana entre
+    leer el tamaño del índice y guardar la región nueva.
+    """
+
+    def __hash__(self):
+        time.sleep(0.001)
+        return str.__hash__(self)
+
+
+def test_region_index_is_unique_across_threads(monkeypatch):
+    monkeypatch.setattr(price_model, "_REGION_INDEX", {})
+    barrier = threading.Barrier(8)
+    results = [None] * 8
+
+    def assign(worker):
+        barrier.wait()
+        results[worker] = [region_index(SlowHashId("r{}-{}".format(worker, i))) for i in range(20)]
+
+    threads = [threading.Thread(target=assign, args=(w,)) for w in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    indexes = [idx for result in results for idx in result]
+    assert sorted(indexes) == list(range(len(indexes)))